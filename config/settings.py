@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'start_page.middleware.PerformanceMiddleware',
+    'start_page.middleware.AdmissionControlMiddleware',
+    'start_page.middleware.QueryBudgetMiddleware',
+    'start_page.middleware.SlowQueryMiddleware',
+    'start_page.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,13 +56,15 @@ MIDDLEWARE = [
     'start_page.middleware.UserSessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'start_page.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + замер времени рендера для Server-Timing
+        'BACKEND': 'start_page.instrumentation.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'start_page.context_processors.page_cache_csrf',
             ],
         },
     },
@@ -82,6 +91,58 @@ DATABASES = {
     }
 }
 
+# Продакшен-профиль SQLite (DJANGO_SQLITE_PRODUCTION=1):
+# - WAL: читатели не блокируют писателя и наоборот;
+# - busy_timeout: при занятой базе ждём, а не сразу падаем с "database is locked";
+# - synchronous=NORMAL: в режиме WAL безопасно и намного быстрее FULL;
+# - транзакции начинаются с BEGIN IMMEDIATE: блокировка на запись берётся сразу,
+#   без deadlock'а при повышении блокировки с чтения до записи;
+# - постоянные соединения, чтобы не открывать файл и не гонять PRAGMA на каждый запрос.
+SQLITE_PRODUCTION = os.environ.get('DJANGO_SQLITE_PRODUCTION') == '1'
+
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,              # мс
+    'mmap_size': 256 * 1024 * 1024,    # 256 МБ
+    'cache_size': -64 * 1024,          # отрицательное значение — в КиБ, т.е. 64 МБ
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': ';'.join(
+        f'PRAGMA {name}={value}' for name, value in SQLITE_PRODUCTION_PRAGMAS.items()
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 5,
+}
+
+if SQLITE_PRODUCTION:
+    DATABASES['default'].update({
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Реплики только для чтения: DJANGO_DB_REPLICAS=/path/replica1.sqlite3,/path/replica2.sqlite3
+# Чтение идёт на реплики через start_page.db_router.ReplicaRouter, запись — в default.
+DATABASE_REPLICAS = []
+
+for index, replica_name in enumerate(
+    filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica_{index}'
+    # в тестах реплика — зеркало default: отдельной тестовой базы у неё нет
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': replica_name.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+# сколько секунд после записи читать из основной базы (пока реплика догоняет)
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['start_page.db_router.ReplicaRouter']
+    MIDDLEWARE.insert(0, 'start_page.middleware.PrimaryPinningMiddleware')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -118,6 +179,44 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# бандлы статики по страницам: в продакшене каждый собирается в один
+# минифицированный файл с хэшем в имени (python manage.py build_assets)
+ASSET_BUNDLES = {
+    "main_page": {
+        "css": ["main_page/main_page.css"],
+        "js": ["main_page/main_page.js"],
+    },
+    "profile": {
+        "css": ["main_page/main_page.css", "main_page/profile.css"],
+        "js": ["main_page/profile.js"],
+    },
+    "login": {
+        "css": ["start_page/field_filling_errors.css", "start_page/password_reset.css"],
+        "js": ["start_page/password_reset.js"],
+    },
+    "signup": {
+        "css": ["start_page/field_filling_errors.css"],
+    },
+}
+
+# в разработке подключаем исходные файлы, в продакшене — собранные бандлы
+ASSET_BUNDLES_ENABLED = not DEBUG
+
+# отдавать собранную статику самим Django (с .br/.gz и immutable-кэшированием),
+# если перед приложением нет nginx/CDN
+SERVE_STATIC_ASSETS = not DEBUG
+
+if ASSET_BUNDLES_ENABLED:
+    STORAGES = {
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "start_page.assets.BundledManifestStaticFilesStorage",
+        },
+    }
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -125,6 +224,12 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = "start_page.CustomUser"
 
+# пользователь сессии берётся из кэша по версии (start_page.auth_backends),
+# а не SELECT-ом на каждый запрос
+AUTHENTICATION_BACKENDS = [
+    "start_page.auth_backends.CachedModelBackend",
+]
+
 
 # Auxiliary variables
 
@@ -137,12 +242,118 @@ ALLOWED_EMAIL_DOMAINS = [
     "mail.ru"
 ]
 
+# кэш (в том числе для страниц пользователя, см. start_page/page_cache.py).
+# Кэш обязан быть общим для всех воркеров: через него сбрасываются страницы
+# и закэшированные пользователи/права (версии в page_cache, auth_backends),
+# считается онлайн (presence) и ставятся блокировки Idempotency-Key.
+# В продакшене — Redis: DJANGO_REDIS_URL=redis://127.0.0.1:6379/1 (нужен пакет redis).
+# LocMemCache живёт в одном процессе — только для разработки и тестов;
+# при DJANGO_WORKERS > 1 с ним не пройдёт проверка start_page.E001.
+REDIS_URL = os.environ.get('DJANGO_REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "wb_project",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "wb_project",
+        }
+    }
+
+# сколько процессов-воркеров запускает сервер приложений (gunicorn/uvicorn -w)
+WORKER_PROCESSES = int(os.environ.get('DJANGO_WORKERS', '1'))
+
+# замеры производительности (PerformanceMiddleware):
+# гистограммы задержек для всех запросов, подробные замеры + Server-Timing —
+# для доли PERF_SAMPLE_RATE запросов (0 — выключено)
+PERF_METRICS_ENABLED = True
+PERF_SAMPLE_RATE = 1.0 if DEBUG else 0.0
+
+# ограничение нагрузки на дорогие виды (AdmissionControlMiddleware), на процесс:
+# concurrency — сколько выполняются одновременно, queue — сколько ждут,
+# timeout — сколько секунд ждать места; остальным сразу 503 + Retry-After.
+# json — вид отвечает AJAX-запросам, отказ в формате {"ok": False, ...}.
+ADMISSION_CONTROL = {
+    'start_page:login_auth': {'concurrency': 2, 'queue': 10, 'timeout': 3.0},
+    'start_page:signup': {'concurrency': 2, 'queue': 10, 'timeout': 3.0},
+    'start_page:password_reset_confirm': {'concurrency': 2, 'queue': 10, 'timeout': 3.0, 'json': True},
+}
+ADMISSION_CONTROL_METHODS = ('POST',)
+ADMISSION_RETRY_AFTER = 5
+
+# бюджет SQL-запросов на запрос (QueryBudgetMiddleware, @query_budget у видов):
+# off — не проверять, log — предупреждение в лог, raise — исключение
+QUERY_BUDGET_MODE = 'log' if DEBUG else 'off'
+
+# переопределение бюджетов по имени URL и бюджеты участков (budget_section)
+QUERY_BUDGETS = {
+    'user_session_middleware': 3,
+}
+
+# журнал медленных SQL (SlowQueryMiddleware): запросы дольше порога
+# пишутся в лог start_page.slow_queries вместе с EXPLAIN, видом и местом вызова;
+# сводка по отпечаткам SQL — на /metrics/ и /metrics/slow-queries/.
+# SLOW_QUERY_REPORT_FULL_SCANS — дополнительно сообщать о каждом новом запросе
+# с полным проходом по таблице, даже быстром (EXPLAIN раз на отпечаток);
+# по умолчанию выключено — включать на время разбора, иначе шумит в тестах.
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_REPORT_FULL_SCANS = False
+SLOW_QUERY_MAX_FINGERPRINTS = 500
+
+# прогрев воркера в wsgi.py/asgi.py до приёма трафика (start_page.warmup):
+# URL-резолвер, компиляция шаблонов, манифест статики, соединения с БД.
+# Шаблоны и так идут через кэширующий загрузчик (поведение Django по умолчанию),
+# прогрев лишь переносит их компиляцию с первого запроса на старт.
+WARMUP_ON_STARTUP = not DEBUG
+
+# профилирование отдельных запросов (ProfilingMiddleware):
+# - запросы с заголовком X-Profile-Token (manage.py profile_token);
+# - доля PROFILING_SAMPLE_RATE всех запросов;
+# - пути, включённые из админки (CapturedProfile → действие "Профилировать следующие 10 запросов").
+PROFILING_ENABLED = True
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_ENGINE = 'sampling'    # или 'cprofile'
+PROFILING_INTERVAL = 0.005       # шаг сэмплирования, секунды
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 50
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# кто может читать /metrics/ без входа в админку:
+# - с заголовком Authorization: Bearer <METRICS_TOKEN> (bearer_token в Prometheus);
+#   пустой токен — доступ только сотрудникам;
+# - с адресов METRICS_ALLOWED_IPS — только если перед приложением нет обратного
+#   прокси на той же машине (за ним REMOTE_ADDR у всех 127.0.0.1); запросы
+#   с X-Forwarded-For/Forwarded по адресу не пускаются
+METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
+
+# страницы, которые анонимам отдаются из кэша целиком (AnonymousPageCacheMiddleware)
+ANONYMOUS_PAGE_CACHE_VIEWS = (
+    "start_page:start_page",
+    "start_page:login_auth",
+    "start_page:signup",
+)
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 10
+
 # сессия живёт 24 часа
 SESSION_COOKIE_AGE = 60 * 60 * 24
 
 # продлевать срок действия сессии при каждом запросе
 SESSION_SAVE_EVERY_REQUEST = True
 
+# сессии в кэше + базе; строку django_session переписываем только при изменении
+# данных или когда срок жизни в базе отстал больше чем на эту долю SESSION_COOKIE_AGE
+SESSION_ENGINE = 'start_page.session_backend'
+SESSION_SAVE_THRESHOLD = 0.1
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 465
@@ -151,4 +362,28 @@ EMAIL_HOST_USER = 'khwedi.ananieva@gmail.com'
 EMAIL_HOST_PASSWORD = 'apva wcmf avml uzfa'
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
-
+# медленный почтовый сервер не должен занимать поток отправки бесконечно
+EMAIL_TIMEOUT = 10
+
+# письма (код сброса пароля) отправляются в фоне, ответ не ждёт SMTP
+# (start_page.mail_dispatch); False — отправлять прямо в запросе
+MAIL_DISPATCH_BACKGROUND = True
+MAIL_DISPATCH_WORKERS = 4
+
+
+# журнал событий сессий и авторизации (start_page.event_log → AuthEvent):
+# события копятся в памяти процесса, фоновый поток пишет их пачкой, когда набралось
+# EVENT_LOG_BATCH_SIZE или самое старое ждёт дольше EVENT_LOG_FLUSH_INTERVAL секунд
+# (запросы за запись не платят, в затихшем процессе события не залёживаются);
+# сверх EVENT_LOG_MAX_BUFFER события отбрасываются (метрика auth_events_dropped_total)
+EVENT_LOG_ENABLED = True
+EVENT_LOG_BATCH_SIZE = 500
+EVENT_LOG_FLUSH_INTERVAL = 5.0
+EVENT_LOG_MAX_BUFFER = 10_000
+
+# Idempotency-Key для JSON POST (start_page/idempotency.py): ответ первого
+# запроса хранится IDEMPOTENCY_TTL секунд, параллельный дубликат ждёт его
+# до IDEMPOTENCY_WAIT секунд, блокировка живёт не дольше IDEMPOTENCY_LOCK_TIMEOUT
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_WAIT = 5.0
+IDEMPOTENCY_LOCK_TIMEOUT = 60
@@ -14,11 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from start_page.static_views import serve_asset
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('start_page.urls', namespace='start_page')),
     path('main/', include('main_page.urls')),
 ]
+
+if settings.SERVE_STATIC_ASSETS:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_asset),
+    ]
@@ -1,18 +1,77 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.core.exceptions import ValidationError
+from django.utils.http import parse_etags
 
+from start_page.idempotency import idempotent
+from start_page.models import CustomUser
+from start_page.page_cache import bump_user_version
+from start_page.query_budget import query_budget
 from start_page.validators import validate_username
 
+from .views import _mask_email, _profile_etag
 
+
+PROFILE_MESSAGES = {
+    "precondition_failed": "Профиль был изменён в другой вкладке. Обновите данные и попробуйте ещё раз.",
+}
+
+
+def _etag_matches(header, etag):
+    etags = parse_etags(header)
+    return "*" in etags or etag in etags
+
+
+def _precondition_failed():
+    return JsonResponse(
+        {
+            "ok": False,
+            "code": "precondition_failed",
+            "error": PROFILE_MESSAGES["precondition_failed"],
+        },
+        status=412,
+    )
+
+
+@query_budget(4)
+@login_required
+@require_GET
+def profile_data(request):
+    """
+    JSON с данными профиля (имя и маскированный email) для profile.js.
+    Поддерживает If-None-Match: если данные не менялись — 304 без тела.
+    """
+    user = request.user
+    etag = _profile_etag(user)
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            "ok": True,
+            "username": user.username,
+            "masked_email": _mask_email(user.email or ""),
+        })
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@query_budget(5)
 @login_required
 @require_POST
+@idempotent
 def update_username(request):
     """
     AJAX-обновление имени пользователя.
     Принимает POST 'username', валидирует и сохраняет.
+
+    Если передан If-Match, имя меняется только когда ETag совпадает с текущим
+    (иначе 412) — так две вкладки не перетирают изменения друг друга.
+    Если имя не изменилось — в базу ничего не пишем.
     """
     new_username = request.POST.get("username", "").strip()
 
@@ -25,7 +84,27 @@ def update_username(request):
         )
 
     user = request.user
-    user.username = validated
-    user.save(update_fields=["username"])
+    if_match = request.headers.get("If-Match")
+
+    if if_match and not _etag_matches(if_match, _profile_etag(user)):
+        return _precondition_failed()
+
+    if validated != user.username:
+        if if_match:
+            # обновляем, только если имя в базе всё ещё то, что мы видели
+            updated = CustomUser.objects.filter(
+                pk=user.pk,
+                username=user.username,
+            ).update(username=validated)
+            if not updated:
+                return _precondition_failed()
+            user.username = validated
+            bump_user_version(user.pk)
+        else:
+            user.username = validated
+            # post_save сбрасывает закэшированные страницы пользователя
+            user.save(update_fields=["username"])
 
-    return JsonResponse({"ok": True, "username": user.username})
\ No newline at end of file
+    response = JsonResponse({"ok": True, "username": user.username})
+    response.headers["ETag"] = _profile_etag(user)
+    return response
@@ -4,6 +4,11 @@ document.addEventListener('DOMContentLoaded', function () {
         return el ? el.value : '';
     }
 
+    // ETag текущей версии профиля: для дешёвого обновления (304) и If-Match при сохранении.
+    // Начальное значение отдаёт сама страница — при загрузке данные уже свежие
+    const profileRoot = document.querySelector('.profile-details');
+    let profileEtag = (profileRoot && profileRoot.dataset.etag) || null;
+
     // ===== Показ/скрытие email =====
     const emailMasked = document.getElementById('email-masked');
     const emailFull = document.getElementById('email-full');
@@ -34,6 +39,41 @@ document.addEventListener('DOMContentLoaded', function () {
     const saveBtn = document.getElementById('username-save-btn');
     const cancelBtn = document.getElementById('username-cancel-btn');
 
+    // ===== Обновление данных профиля без перерисовки страницы =====
+    function refreshProfile() {
+        const headers = {};
+        if (profileEtag) {
+            headers['If-None-Match'] = profileEtag;
+        }
+
+        return fetch('/main/profile/data/', { headers: headers })
+            .then(resp => {
+                if (resp.status === 304) {
+                    return;
+                }
+                if (!resp.ok) {
+                    return;
+                }
+                profileEtag = resp.headers.get('ETag');
+                return resp.json().then(data => {
+                    if (usernameDisplay) {
+                        usernameDisplay.textContent = data.username;
+                    }
+                    if (emailMasked) {
+                        emailMasked.textContent = data.masked_email;
+                    }
+                });
+            })
+            .catch(() => {});
+    }
+
+    // обновляем только при возврате на вкладку: данные могли поменять в другой
+    document.addEventListener('visibilitychange', function () {
+        if (document.visibilityState === 'visible') {
+            refreshProfile();
+        }
+    });
+
     if (usernameDisplay && usernameInput && usernameError && editBtn && saveBtn && cancelBtn) {
         function clearUsernameError() {
             usernameError.textContent = '';
@@ -82,21 +122,36 @@ document.addEventListener('DOMContentLoaded', function () {
             const formData = new FormData();
             formData.append('username', newUsername);
 
+            const headers = {
+                'X-CSRFToken': getCsrfToken(),
+            };
+            if (profileEtag) {
+                headers['If-Match'] = profileEtag;
+            }
+
             fetch('/main/profile/update-username/', {
                 method: 'POST',
-                headers: {
-                    'X-CSRFToken': getCsrfToken(),
-                },
+                headers: headers,
                 body: formData,
             })
-                .then(resp => resp.json().then(data => ({ status: resp.status, data })))
-                .then(({ status, data }) => {
+                .then(resp => resp.json().then(data => ({ status: resp.status, etag: resp.headers.get('ETag'), data })))
+                .then(({ status, etag, data }) => {
+                    if (status === 412) {
+                        // профиль изменили в другой вкладке — подтягиваем актуальные данные
+                        usernameError.textContent = data.error;
+                        refreshProfile();
+                        return;
+                    }
+
                     if (!data.ok) {
                         usernameError.textContent = data.error || 'Произошла ошибка при сохранении.';
                         return;
                     }
 
                     // успешно обновили на сервере — обновляем отображение
+                    if (etag) {
+                        profileEtag = etag;
+                    }
                     usernameDisplay.textContent = data.username;
                     switchToView();
                 })
@@ -1,3 +1,121 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils.html import escape
 
-# Create your tests here.
+from start_page import idempotency
+from start_page.models import CustomUser
+from start_page.page_cache import get_page_cache_stats
+from start_page.services import create_or_update_user_session
+
+
+class ProfilePageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+        self.client.force_login(self.user)
+        create_or_update_user_session(self.client, self.user)
+
+    def test_repeat_visit_served_from_cache(self):
+        url = reverse("main_page:profile")
+        self.client.get(url)
+        response = self.client.get(url)
+
+        self.assertContains(response, "Tester")
+        self.assertNotContains(response, "__page_cache_csrf_token__")
+        stats = get_page_cache_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_update_username_invalidates_cache(self):
+        url = reverse("main_page:profile")
+        self.client.get(url)
+        self.client.post(reverse("main_page:update_username"), {"username": "Renamed"})
+
+        response = self.client.get(url)
+        self.assertContains(response, "Renamed")
+
+
+class ProfileDataApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+        self.client.force_login(self.user)
+        create_or_update_user_session(self.client, self.user)
+
+    def test_if_none_match_returns_304(self):
+        url = reverse("main_page:profile_data")
+        response = self.client.get(url)
+        self.assertEqual(response.json()["masked_email"], "tes*er@gmail.com")
+
+        response = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_survives_cache_loss(self):
+        url = reverse("main_page:profile_data")
+        etag = self.client.get(url)["ETag"]
+        # другой воркер, перезапуск или вытеснение — версий в кэше больше нет
+        cache.clear()
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_profile_page_carries_etag(self):
+        etag = self.client.get(reverse("main_page:profile_data"))["ETag"]
+        response = self.client.get(reverse("main_page:profile"))
+        self.assertContains(response, f'data-etag="{escape(etag)}"')
+
+    def test_update_with_stale_etag_is_rejected(self):
+        etag = self.client.get(reverse("main_page:profile_data"))["ETag"]
+        url = reverse("main_page:update_username")
+
+        response = self.client.post(url, {"username": "First"}, headers={"If-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(url, {"username": "Second"}, headers={"If-Match": etag})
+        self.assertEqual(response.status_code, 412)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, "First")
+
+
+class UpdateUsernameIdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+        self.client.force_login(self.user)
+        create_or_update_user_session(self.client, self.user)
+        self.url = reverse("main_page:update_username")
+
+    def test_replay_returns_first_response(self):
+        first = self.client.post(self.url, {"username": "First"}, headers={"Idempotency-Key": "k1"})
+        CustomUser.objects.filter(pk=self.user.pk).update(username="Changed")
+
+        second = self.client.post(self.url, {"username": "First"}, headers={"Idempotency-Key": "k1"})
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        # вид не выполнялся повторно
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, "Changed")
+
+    def hold_lock(self, key):
+        # первый запрос с этим ключом ещё выполняется — блокировка занята
+        request = RequestFactory().post(self.url)
+        request.resolver_match = resolve(self.url)
+        cache.set(idempotency.lock_key(request, key, self.user), "x")
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_duplicate_while_first_in_progress(self):
+        self.hold_lock("k1")
+
+        response = self.client.post(self.url, {"username": "First"}, headers={"Idempotency-Key": "k1"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, "Tester")
@@ -1,11 +1,12 @@
 from django.urls import path
 from . import views
-from .profile_views import *
+from .profile_views import profile_data, update_username
 
 app_name = "main_page"
 
 urlpatterns = [
     path('', views.main_page, name='main_page'),
     path('profile/', views.profile, name='profile'),
+    path('profile/data/', profile_data, name='profile_data'),
     path('profile/update-username/', update_username, name='update_username'),
 ]
\ No newline at end of file
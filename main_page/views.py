@@ -1,6 +1,11 @@
+import hashlib
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 
+from start_page.page_cache import render_user_page
+from start_page.query_budget import query_budget
+
 
 def _mask_email(email):
     """
@@ -23,6 +28,17 @@ def _mask_email(email):
     return f"{masked_local}@{domain}"
 
 
+def _profile_etag(user):
+    """
+    Сильный ETag профиля: хэш от тех полей, что отдаёт profile_data.
+    Считается по данным из базы, а не по версии в кэше — одинаков
+    во всех воркерах и не меняется после перезапуска или вытеснения.
+    """
+    digest = hashlib.sha256(f"{user.username}\n{user.email}".encode()).hexdigest()[:16]
+    return f'"{user.pk}-{digest}"'
+
+
+@query_budget(4)
 @login_required
 def main_page(request):
     """
@@ -30,23 +46,28 @@ def main_page(request):
     Проверку и продление UserSession делает middleware.
     Если сессия истекла, middleware разлогинит и отправит на стартовую страницу.
     """
-    return render(request, "main_page/main_page.html")
+    return render_user_page(request, "main_page/main_page.html")
 
 
+@query_budget(4)
 @login_required
 def profile(request):
     """
     Страница профиля.
     Секции: имя пользователя, почта (маскированная), пароль.
     Пока только отображение, без сохранения изменений.
+    Страница кэшируется по пользователю, контекст собирается только при промахе.
     """
     user = request.user
-    full_email = user.email or ""
-    masked_email = _mask_email(full_email)
-
-    context = {
-        "user": user,
-        "full_email": full_email,
-        "masked_email": masked_email,
-    }
-    return render(request, "main_page/profile.html", context)
\ No newline at end of file
+
+    def build_context():
+        full_email = user.email or ""
+        return {
+            "user": user,
+            "full_email": full_email,
+            "masked_email": _mask_email(full_email),
+            # начальный ETag для profile.js — без лишнего запроса при загрузке
+            "profile_etag": _profile_etag(user),
+        }
+
+    return render_user_page(request, "main_page/profile.html", build_context)
\ No newline at end of file
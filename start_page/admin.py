@@ -1,7 +1,16 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils import timezone
+from django.utils.html import format_html
 
-from .models import *
+from . import analytics
+from .models import AuthEvent, CapturedProfile, CustomUser, PasswordResetRequest, UserSession, session_key_hash
+from .presence import online_counts
+from .profiling import arm_path, profile_dir
 
 
 class SessionStatusFilter(admin.SimpleListFilter):
@@ -28,6 +37,29 @@ class SessionStatusFilter(admin.SimpleListFilter):
         return queryset
 
 
+class HasActiveSessionFilter(admin.SimpleListFilter):
+    """
+    Фильтр пользователей по денормализованному active_sessions_count —
+    без JOIN с UserSession.
+    """
+    title = "Активная сессия"
+    parameter_name = "has_active_session"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("yes", "Есть"),
+            ("no", "Нет"),
+        )
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value == "yes":
+            return queryset.filter(active_sessions_count__gt=0)
+        if value == "no":
+            return queryset.filter(active_sessions_count=0)
+        return queryset
+
+
 class UserSessionInline(admin.TabularInline):
     """
     Показывает сессии конкретного пользователя прямо в его карточке.
@@ -37,30 +69,27 @@ class UserSessionInline(admin.TabularInline):
     extra = 0
     can_delete = False
     readonly_fields = (
-        "session_key",
         "start_time",
         "end_time",
         "duration",
         "is_active",
-        "created_at",
-        "updated_at",
     )
     fields = (
-        "session_key",
         "start_time",
         "end_time",
         "duration",
         "is_active",
-        "created_at",
-        "updated_at",
     )
 
+    def has_add_permission(self, request, obj=None):
+        # сессии создаёт только вход; пустая форма «добавить» упала бы на duration
+        return False
+
 
 @admin.register(UserSession)
 class UserSessionAdmin(admin.ModelAdmin):
     list_display = (
         "user",
-        "session_key",
         "start_time",
         "end_time",
         "duration",
@@ -71,18 +100,120 @@ class UserSessionAdmin(admin.ModelAdmin):
         SessionStatusFilter,
         "user",
     )
-    search_fields = ("user__email", "user__username", "session_key")
+    search_fields = ("user__email", "user__username")
+    # хэш ключа админу ничего не говорит — по ключу сессии работает поиск
+    exclude = ("session_key_hash",)
     readonly_fields = (
         "user",
-        "session_key",
         "start_time",
         "end_time",
         "duration",
         "is_active",
-        "created_at",
-        "updated_at",
     )
     date_hierarchy = "start_time"
+    change_list_template = "admin/start_page/usersession/change_list.html"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_duration()
+
+    @admin.display(description="Duration", ordering="session_duration")
+    def duration(self, obj):
+        return obj.session_duration
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Ключ сессии Django ищем по его хэшу (сам ключ больше не хранится).
+        """
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        if term and term.isalnum() and len(term) == 32:
+            # queryset уже отфильтрован (list_filter, date_hierarchy) — ищем в нём же
+            results |= queryset.filter(session_key_hash=session_key_hash(term))
+        return results, may_have_duplicates
+
+    def changelist_view(self, request, extra_context=None):
+        # онлайн по HyperLogLog — без подсчёта строк UserSession
+        extra_context = {**(extra_context or {}), "online_counts": online_counts()}
+        return super().changelist_view(request, extra_context)
+
+    def get_urls(self):
+        urls = [
+            path(
+                "analytics/",
+                self.admin_site.admin_view(self.analytics_view),
+                name="start_page_usersession_analytics",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def analytics_view(self, request):
+        """
+        Распределение длительностей, число одновременных сессий по часам
+        и недельные когорты удержания за последние ?days= дней (по умолчанию 30).
+        """
+        try:
+            days = max(1, min(int(request.GET.get("days", 30)), 365))
+        except ValueError:
+            days = 30
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Аналитика сессий",
+            "days": days,
+            "numpy_missing": analytics.np is None,
+        }
+        if analytics.np is not None:
+            since = timezone.now() - timedelta(days=days)
+            columns = analytics.load_sessions(since)
+            context.update(self._analytics_context(columns, since))
+        return TemplateResponse(request, "admin/start_page/usersession/analytics.html", context)
+
+    def _analytics_context(self, columns, since):
+        counts, edges = analytics.duration_histogram(columns)
+        peak = max(int(counts.max()), 1) if len(counts) else 1
+        histogram = [
+            {
+                "from_min": edges[i] / 60,
+                "to_min": edges[i + 1] / 60,
+                "count": int(count),
+                "width": 100 * int(count) / peak,
+            }
+            for i, count in enumerate(counts)
+        ]
+
+        now = int(timezone.now().timestamp())
+        moments, concurrent = analytics.concurrency_curve(
+            columns, start=int(since.timestamp()) // analytics.HOUR * analytics.HOUR, end=now
+        )
+        top = max(int(concurrent.max()), 1) if len(concurrent) else 1
+        last = max(len(concurrent) - 1, 1)
+        # ломаная для SVG 1000x200
+        curve_points = " ".join(
+            f"{1000 * i / last:.1f},{200 - 200 * int(value) / top:.1f}"
+            for i, value in enumerate(concurrent)
+        )
+
+        cohort_starts, retention = analytics.retention_cohorts(columns)
+        cohorts = [
+            {
+                "start": datetime.fromtimestamp(int(start), tz=dt_timezone.utc).date(),
+                "retention": [round(100 * share) for share in row.tolist()],
+            }
+            for start, row in zip(cohort_starts, retention)
+        ]
+
+        return {
+            "sessions_count": len(columns["user_id"]),
+            "percentiles": {
+                percent: seconds / 60
+                for percent, seconds in analytics.duration_percentiles(columns).items()
+            },
+            "histogram": histogram,
+            "curve_points": curve_points,
+            "peak_concurrency": int(concurrent.max()) if len(concurrent) else 0,
+            "cohorts": cohorts,
+        }
 
 
 class PasswordResetRequestInline(admin.TabularInline):
@@ -95,11 +226,21 @@ class PasswordResetRequestInline(admin.TabularInline):
 
 @admin.register(CustomUser)
 class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'email', 'username', 'is_staff', 'is_active', 'date_joined','password')
+    list_display = (
+        'id', 'email', 'username', 'is_staff', 'is_active', 'date_joined',
+        'last_seen_at', 'active_sessions_count', 'total_sessions_count', 'last_password_reset_at',
+        'password',
+    )
     search_fields = ('email', 'username')
     ordering = ('-id',)
-    readonly_fields = ('email', 'password')
-    list_filter = ('email', 'is_active', 'is_staff', 'date_joined')
+    readonly_fields = (
+        'email', 'password',
+        'last_seen_at', 'active_sessions_count', 'total_sessions_count', 'last_password_reset_at',
+    )
+    list_filter = (
+        'email', 'is_active', 'is_staff', 'date_joined',
+        HasActiveSessionFilter, 'last_seen_at', 'last_password_reset_at',
+    )
 
     inlines = [UserSessionInline, PasswordResetRequestInline]
 
@@ -114,5 +255,75 @@ class PasswordResetRequestAdmin(admin.ModelAdmin):
     date_hierarchy = "created_at"
 
 
+@admin.register(AuthEvent)
+class AuthEventAdmin(admin.ModelAdmin):
+    """
+    Журнал событий только для чтения. Таблица растёт быстро,
+    поэтому без точного подсчёта строк и поиск только по точному id.
+    """
+    list_display = ("created_at", "kind", "user_id", "session_id")
+    list_filter = ("kind",)
+    search_fields = ("=user_id", "=session_id")
+    readonly_fields = ("created_at", "kind", "user_id", "session_id")
+    date_hierarchy = "created_at"
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CapturedProfile)
+class CapturedProfileAdmin(admin.ModelAdmin):
+    """
+    Снятые профили запросов: скачать файл (folded stacks для flamegraph
+    или .prof для pstats/snakeviz) и включить профилирование пути ещё раз.
+    """
+    list_display = ("created_at", "method", "path", "view_name", "status_code",
+                    "duration_ms", "engine", "samples", "download_link")
+    list_filter = ("engine", "view_name", "method")
+    search_fields = ("path", "view_name")
+    readonly_fields = ("created_at", "path", "view_name", "method", "status_code",
+                       "engine", "duration_ms", "samples", "file_name")
+    date_hierarchy = "created_at"
+    actions = ["profile_next_requests"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="start_page_capturedprofile_download",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description="Файл")
+    def download_link(self, obj):
+        url = reverse("admin:start_page_capturedprofile_download", args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
+
+    def download_view(self, request, pk):
+        captured = self.get_object(request, pk)
+        if captured is None:
+            raise Http404
+        file_path = profile_dir() / captured.file_name
+        if not file_path.exists():
+            raise Http404("Файл профиля уже удалён ротацией.")
+        return FileResponse(open(file_path, "rb"), as_attachment=True, filename=captured.file_name)
 
+    @admin.action(description="Профилировать следующие 10 запросов к этим путям")
+    def profile_next_requests(self, request, queryset):
+        paths = set(queryset.values_list("path", flat=True))
+        for profiled_path in paths:
+            arm_path(profiled_path, 10)
+        self.message_user(request, f"Профилирование включено для: {', '.join(sorted(paths))}")
 
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+
+# причины отказа (метка reason в метриках)
+SHED_QUEUE_FULL = "queue_full"
+SHED_TIMEOUT = "timeout"
+
+_limiters = {}
+
+
+class RouteLimiter:
+    """
+    Ограничение одновременных запросов к одному виду внутри процесса:
+    не больше concurrency выполняются, не больше queue ждут своей очереди
+    (каждый не дольше timeout секунд). Остальным сразу отказываем.
+
+    Синхронный режим (WSGI, потоки) — threading.Semaphore,
+    асинхронный (ASGI) — asyncio.Semaphore; процесс работает в одном из них.
+    """
+
+    def __init__(self, name, concurrency, queue, timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self._semaphore = threading.Semaphore(concurrency)
+        self._async_semaphore = None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "wait_seconds": 0.0,
+            SHED_QUEUE_FULL: 0,
+            SHED_TIMEOUT: 0,
+        }
+
+    def _enter_queue(self):
+        with self._lock:
+            if self.waiting >= self.queue:
+                self.stats[SHED_QUEUE_FULL] += 1
+                return False
+            self.waiting += 1
+            self.stats["queued"] += 1
+            return True
+
+    def _leave_queue(self, admitted, waited):
+        with self._lock:
+            self.waiting -= 1
+            self.stats["wait_seconds"] += waited
+            if admitted:
+                self._admit_locked()
+            else:
+                self.stats[SHED_TIMEOUT] += 1
+
+    def _admit_locked(self):
+        self.active += 1
+        self.stats["admitted"] += 1
+
+    def acquire(self):
+        """
+        None — запрос допущен (потом обязательно release()),
+        иначе причина отказа.
+        """
+        if self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self._admit_locked()
+            return None
+        if not self._enter_queue():
+            return SHED_QUEUE_FULL
+
+        started = time.monotonic()
+        admitted = self._semaphore.acquire(timeout=self.timeout)
+        self._leave_queue(admitted, time.monotonic() - started)
+        return None if admitted else SHED_TIMEOUT
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+    async def aacquire(self):
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.concurrency)
+        semaphore = self._async_semaphore
+
+        if not semaphore.locked():
+            await semaphore.acquire()
+            with self._lock:
+                self._admit_locked()
+            return None
+        if not self._enter_queue():
+            return SHED_QUEUE_FULL
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            admitted = True
+        except asyncio.TimeoutError:
+            admitted = False
+        self._leave_queue(admitted, time.monotonic() - started)
+        return None if admitted else SHED_TIMEOUT
+
+    def arelease(self):
+        with self._lock:
+            self.active -= 1
+        self._async_semaphore.release()
+
+
+def build_limiters():
+    """
+    Ограничители по settings.ADMISSION_CONTROL: {имя URL: {"concurrency", "queue", "timeout"}}.
+    """
+    limits = getattr(settings, "ADMISSION_CONTROL", {})
+    _limiters.clear()
+    for view_name, options in limits.items():
+        _limiters[view_name] = RouteLimiter(
+            view_name,
+            concurrency=options.get("concurrency", 2),
+            queue=options.get("queue", 10),
+            timeout=options.get("timeout", 3.0),
+        )
+    return _limiters
+
+
+def get_limiter(view_name):
+    return _limiters.get(view_name)
+
+
+def render_prometheus():
+    lines = [
+        "# TYPE admission_active gauge",
+        "# TYPE admission_waiting gauge",
+        "# TYPE admission_admitted_total counter",
+        "# TYPE admission_queued_total counter",
+        "# TYPE admission_wait_seconds_total counter",
+        "# TYPE admission_shed_total counter",
+    ]
+    for view_name, limiter in sorted(_limiters.items()):
+        with limiter._lock:
+            active, waiting, stats = limiter.active, limiter.waiting, dict(limiter.stats)
+        label = f'view="{view_name}"'
+        lines.append(f"admission_active{{{label}}} {active}")
+        lines.append(f"admission_waiting{{{label}}} {waiting}")
+        lines.append(f"admission_admitted_total{{{label}}} {stats['admitted']}")
+        lines.append(f"admission_queued_total{{{label}}} {stats['queued']}")
+        lines.append(f"admission_wait_seconds_total{{{label}}} {stats['wait_seconds']:.6f}")
+        for reason in (SHED_QUEUE_FULL, SHED_TIMEOUT):
+            lines.append(f'admission_shed_total{{{label},reason="{reason}"}} {stats[reason]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,219 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import AuthEvent
+from .services import SESSION_LIFETIME
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость, нужна только аналитике
+    np = None
+
+CHUNK_SIZE = 10_000
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+# столбцы выгрузки: id пользователя и время в секундах Unix (UTC)
+COLUMNS = ("user_id", "start_time", "end_time")
+
+# события журнала, из которых восстанавливаются сессии
+SESSION_EVENTS = (AuthEvent.LOGIN, AuthEvent.SESSION_EXTENDED, AuthEvent.SESSION_EXPIRED, AuthEvent.LOGOUT)
+_ACTIVITY_EVENTS = (AuthEvent.LOGIN, AuthEvent.SESSION_EXTENDED)
+_NO_SESSION = -1
+# ключ сортировки (пользователь, время): время Unix помещается в 32 бита до 2106 года
+_USER_SHIFT = 1 << 32
+
+
+def require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("Для аналитики сессий нужен numpy: pip install numpy")
+
+
+def load_events(since=None, chunk_size=CHUNK_SIZE):
+    """
+    События сессий из журнала AuthEvent в виде массивов numpy:
+    {"kind", "user_id", "session_id" (-1, если нет), "time"}.
+
+    Читаем values_list(...).iterator(chunk_size) — без создания моделей
+    и без загрузки всей таблицы в память разом; каждый кусок сразу
+    перекладывается в заранее выделенные массивы.
+    """
+    require_numpy()
+    queryset = AuthEvent.objects.filter(kind__in=SESSION_EVENTS)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    queryset = queryset.order_by().values_list("kind", "user_id", "session_id", "created_at")
+
+    total = queryset.count()
+    columns = {
+        "kind": np.empty(total, dtype=np.int64),
+        "user_id": np.empty(total, dtype=np.int64),
+        "session_id": np.empty(total, dtype=np.int64),
+        "time": np.empty(total, dtype=np.int64),
+    }
+
+    filled = 0
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            filled = _store_chunk(chunk, filled, columns)
+            chunk = []
+    if chunk:
+        filled = _store_chunk(chunk, filled, columns)
+
+    # между count() и чтением строки могли удалить
+    return {name: values[:filled] for name, values in columns.items()}
+
+
+def _store_chunk(chunk, offset, columns):
+    size = min(len(chunk), len(columns["kind"]) - offset)
+    chunk = chunk[:size]
+    target = slice(offset, offset + size)
+    columns["kind"][target] = np.fromiter((row[0] for row in chunk), np.int64, size)
+    columns["user_id"][target] = np.fromiter((row[1] for row in chunk), np.int64, size)
+    columns["session_id"][target] = np.fromiter(
+        (_NO_SESSION if row[2] is None else row[2] for row in chunk), np.int64, size
+    )
+    columns["time"][target] = np.fromiter((row[3].timestamp() for row in chunk), np.float64, size)
+    return offset + size
+
+
+def sessions_from_events(events, lifetime=int(SESSION_LIFETIME.total_seconds())):
+    """
+    Сессии {"user_id", "start_time", "end_time"} по событиям журнала, векторно:
+    - начало — вход (или первое событие сессии, если вход раньше выборки);
+    - конец — последнее продление + lifetime, как end_time в UserSession;
+    - выход записывается без id сессии, но активная сессия у пользователя
+      одна — он закрывает его последнюю начатую до выхода сессию.
+    Сессии без входа и продлений в выборке (только истечение) пропускаются.
+    """
+    activity = np.isin(events["kind"], _ACTIVITY_EVENTS) & (events["session_id"] != _NO_SESSION)
+    session_ids, index = np.unique(events["session_id"][activity], return_inverse=True)
+    moments = events["time"][activity]
+
+    user_ids = np.zeros(len(session_ids), dtype=np.int64)
+    user_ids[index] = events["user_id"][activity]
+    starts = np.full(len(session_ids), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(starts, index, moments)
+    last_seen = np.full(len(session_ids), np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last_seen, index, moments)
+    ends = last_seen + lifetime
+
+    order = np.lexsort((starts, user_ids))
+    user_ids, starts, ends = user_ids[order], starts[order], ends[order]
+
+    logout = events["kind"] == AuthEvent.LOGOUT
+    logout_users, logout_times = events["user_id"][logout], events["time"][logout]
+    closed = np.searchsorted(user_ids * _USER_SHIFT + starts, logout_users * _USER_SHIFT + logout_times, side="right") - 1
+    valid = closed >= 0
+    valid[valid] = user_ids[closed[valid]] == logout_users[valid]
+    np.minimum.at(ends, closed[valid], logout_times[valid])
+
+    return {"user_id": user_ids, "start_time": starts, "end_time": ends}
+
+
+def load_sessions(since=None, chunk_size=CHUNK_SIZE):
+    """
+    Столбцы сессий, пересекающихся с периодом от since, — из журнала
+    событий, а не из горячей таблицы UserSession. События читаются
+    с запасом SESSION_LIFETIME: сессия, продлённая до since, ещё открыта.
+    """
+    events = load_events(None if since is None else since - SESSION_LIFETIME, chunk_size)
+    columns = sessions_from_events(events)
+    if since is not None:
+        keep = columns["end_time"] >= int(since.timestamp())
+        columns = {name: values[keep] for name, values in columns.items()}
+    return columns
+
+
+def durations(columns):
+    """
+    Длительность сессий в секундах (end_time - start_time).
+    """
+    return columns["end_time"] - columns["start_time"]
+
+
+def duration_percentiles(columns, percents=(50, 90, 95, 99)):
+    values = durations(columns)
+    if not len(values):
+        return {percent: 0.0 for percent in percents}
+    return dict(zip(percents, np.percentile(values, percents).tolist()))
+
+
+def duration_histogram(columns, bins=20):
+    """
+    Гистограмма длительностей: (количество в корзине, границы корзин в секундах).
+    """
+    values = durations(columns)
+    if not len(values):
+        return np.zeros(bins, dtype=np.int64), np.zeros(bins + 1)
+    return np.histogram(values, bins=bins)
+
+
+def concurrency_curve(columns, start=None, end=None, step=HOUR):
+    """
+    Сколько сессий было открыто в каждый момент t = start, start+step, ...
+    (start_time <= t < end_time). Вместо перебора сессий — два searchsorted
+    по отсортированным началам и концам.
+    """
+    starts = np.sort(columns["start_time"])
+    ends = np.sort(columns["end_time"])
+    if not len(starts):
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    start = int(starts[0]) // step * step if start is None else start
+    end = int(ends[-1]) if end is None else end
+    moments = np.arange(start, end + step, step, dtype=np.int64)
+    opened = np.searchsorted(starts, moments, side="right")
+    closed = np.searchsorted(ends, moments, side="right")
+    return moments, opened - closed
+
+
+def retention_cohorts(columns, periods=8, period=WEEK):
+    """
+    Когорты по периоду первой сессии пользователя.
+
+    Возвращает (начала периодов когорт, матрица удержания): строка — когорта,
+    столбец k — доля пользователей когорты, у которых была сессия
+    через k периодов после первой. Столбец 0 всегда 1.0.
+    """
+    if not len(columns["user_id"]):
+        return np.array([], dtype=np.int64), np.zeros((0, periods))
+
+    users, user_index = np.unique(columns["user_id"], return_inverse=True)
+    session_period = columns["start_time"] // period
+
+    first_period = np.full(len(users), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_period, user_index, session_period)
+
+    offset = session_period - first_period[user_index]
+    in_window = offset < periods
+    # пара (пользователь, смещение) считается один раз, сколько бы сессий ни было
+    active = np.unique(user_index[in_window] * periods + offset[in_window])
+    active_user, active_offset = np.divmod(active, periods)
+
+    cohorts, cohort_index = np.unique(first_period, return_inverse=True)
+    counts = np.zeros((len(cohorts), periods), dtype=np.int64)
+    np.add.at(counts, (cohort_index[active_user], active_offset), 1)
+
+    sizes = counts[:, :1]
+    return cohorts * period, counts / np.maximum(sizes, 1)
+
+
+def export_columns(columns, path, fmt="npz"):
+    """
+    Выгрузка столбцов для офлайн-анализа:
+    - npz — один сжатый архив (np.load(path)["start_time"]);
+    - npy — каталог с файлом на столбец (можно открыть через mmap_mode="r").
+    """
+    require_numpy()
+    if fmt == "npz":
+        np.savez_compressed(path, **columns)
+    elif fmt == "npy":
+        path.mkdir(parents=True, exist_ok=True)
+        for name, values in columns.items():
+            np.save(path / f"{name}.npy", values)
+    else:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class StartPageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'start_page'
+
+    def ready(self):
+        from . import checks, db_wrappers, signals  # noqa: F401
+
+        db_wrappers.install_all()
@@ -0,0 +1,227 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость, без неё пишем только .gz
+    brotli = None
+
+BUNDLES_DIR = "bundles"
+COMPRESSIBLE_SUFFIXES = (".css", ".js", ".svg", ".txt", ".json", ".html")
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACES_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,])\s*")
+
+
+def minify_css(source):
+    """
+    Простая минификация CSS: убираем комментарии, лишние пробелы
+    вокруг { } ; , и последнюю ';' перед '}'.
+    Пробелы вокруг ':' не трогаем — в селекторах они значимы.
+    """
+    source = _CSS_COMMENT_RE.sub("", source)
+    source = _CSS_SPACES_RE.sub(" ", source)
+    source = _CSS_PUNCT_RE.sub(r"\1", source)
+    return source.replace(";}", "}").strip()
+
+
+# после этих токенов '/' начинает регулярное выражение, а не деление
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {
+    "", "return", "typeof", "instanceof", "in", "of", "new", "delete",
+    "void", "throw", "case", "do", "else", "yield", "await",
+}
+
+
+def minify_js(source):
+    """
+    Консервативная минификация JS на уровне токенов: убираем комментарии,
+    отступы, пустые строки и повторные пробелы. Строки, шаблонные строки
+    и регулярные выражения копируются как есть — внутри них `//`
+    и отступы значимы. Переводы строк оставляем, чтобы не сломать
+    автоподстановку ';'.
+    """
+    out = []
+    last_token = ""
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in "\"'`":
+            end = _skip_string(source, i)
+            out.append(source[i:end])
+            last_token = ch
+            i = end
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end == -1 else end
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            # многострочный комментарий для ';' считается переводом строки
+            _append_space(out, "\n" if "\n" in source[i:end] else " ")
+            i = end
+        elif ch == "/" and last_token in _REGEX_PRECEDERS:
+            end = _skip_regex(source, i)
+            out.append(source[i:end])
+            last_token = ")"  # после регулярного выражения '/' — деление
+            i = end
+        elif ch.isspace():
+            _append_space(out, "\n" if ch == "\n" else " ")
+            i += 1
+        else:
+            out.append(ch)
+            if _is_identifier(ch) and _is_identifier(last_token[-1:]):
+                last_token += ch
+            else:
+                last_token = ch
+            i += 1
+    return "".join(out).strip()
+
+
+def _is_identifier(ch):
+    return ch.isalnum() or ch in "_$"
+
+
+def _append_space(out, space):
+    if space == "\n":
+        while out and out[-1] == " ":
+            out.pop()
+        if out and out[-1] != "\n":
+            out.append("\n")
+    elif out and out[-1] not in (" ", "\n"):
+        out.append(" ")
+
+
+def _skip_string(source, start):
+    """
+    Конец строки в кавычках или шаблонной строки (с выражениями ${...}).
+    """
+    quote = source[start]
+    i, n = start + 1, len(source)
+    while i < n:
+        ch = source[i]
+        if ch == "\\":
+            i += 2
+        elif ch == quote:
+            return i + 1
+        elif quote == "`" and source.startswith("${", i):
+            i = _skip_template_expression(source, i + 2)
+        else:
+            i += 1
+    return n
+
+
+def _skip_template_expression(source, i):
+    depth, n = 1, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in "\"'`":
+            i = _skip_string(source, i)
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def _skip_regex(source, start):
+    i, n = start + 1, len(source)
+    in_class = False
+    while i < n:
+        ch = source[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "\n":
+            # не регулярное выражение — дальше разберём как обычный код
+            return start + 1
+        if in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "/":
+            i += 1
+            while i < n and _is_identifier(source[i]):  # флаги
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+MINIFIERS = {
+    "css": minify_css,
+    "js": minify_js,
+}
+
+
+def bundle_name(name, kind):
+    return f"{BUNDLES_DIR}/{name}.{kind}"
+
+
+class BundledManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Хранилище статики для продакшена (collectstatic = шаг сборки):
+    - собирает бандлы из settings.ASSET_BUNDLES и минифицирует их;
+    - хэширует имена файлов и пишет их в staticfiles.json (делает родитель);
+    - рядом с каждым текстовым файлом кладёт сжатые .gz и .br варианты.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name, hashed_name in self._build_bundles():
+            yield name, hashed_name, True
+        self.save_manifest()
+
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_SUFFIXES):
+                self._write_compressed(hashed_name)
+
+    def _build_bundles(self):
+        bundles = getattr(settings, "ASSET_BUNDLES", {})
+        for name, kinds in bundles.items():
+            for kind, sources in kinds.items():
+                parts = []
+                for source in sources:
+                    with self.open(source) as f:
+                        parts.append(f.read().decode("utf-8"))
+                separator = "\n" if kind == "css" else ";\n"
+                content = MINIFIERS[kind](separator.join(parts)).encode("utf-8")
+
+                unhashed = bundle_name(name, kind)
+                if self.exists(unhashed):
+                    self.delete(unhashed)
+                self._save(unhashed, ContentFile(content))
+
+                hashed = self.hashed_name(unhashed, ContentFile(content))
+                if not self.exists(hashed):
+                    self._save(hashed, ContentFile(content))
+                self.hashed_files[self.hash_key(unhashed)] = hashed
+                yield unhashed, hashed
+
+    def _write_compressed(self, name):
+        with self.open(name) as f:
+            content = f.read()
+
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+
+        for suffix, compressed in variants.items():
+            # сжатый вариант имеет смысл, только если он реально меньше
+            if len(compressed) >= len(content):
+                continue
+            target = name + suffix
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(compressed))
@@ -0,0 +1,137 @@
+import copy
+import time
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .instrumentation import record_cache
+from .page_cache import get_user_version
+
+USER_CACHE_TIMEOUT = 15 * 60
+PERMISSIONS_CACHE_TIMEOUT = 60 * 60
+
+_USER_KEY = "auth_user:{user_id}:{version}"
+_PERMISSIONS_KEY = "auth_perms:{user_id}:{user_version}:{version}"
+_PERMISSIONS_VERSION_KEY = "auth_perms_version"
+
+# атрибуты, которыми ModelBackend кэширует права на объекте пользователя
+# (на время одного запроса) — в общий кэш их не сохраняем
+_PERM_CACHE_ATTRS = ("_perm_cache", "_user_perm_cache", "_group_perm_cache")
+
+
+def _user_key(user_id, version):
+    return _USER_KEY.format(user_id=user_id, version=version)
+
+
+def get_permissions_version():
+    """
+    Общая версия прав: меняется при любом изменении групп, прав групп
+    и прав пользователей (signals.py). Права группы касаются всех её
+    участников, поэтому проще сбросить всё — такие правки редки.
+    """
+    version = cache.get(_PERMISSIONS_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(_PERMISSIONS_VERSION_KEY, version, timeout=None):
+            version = cache.get(_PERMISSIONS_VERSION_KEY, version)
+    return version
+
+
+def bump_permissions_version():
+    try:
+        return cache.incr(_PERMISSIONS_VERSION_KEY)
+    except ValueError:
+        return get_permissions_version()
+
+
+def _permissions_key(user_obj):
+    # версия пользователя — на случай смены is_active/is_superuser
+    return _PERMISSIONS_KEY.format(
+        user_id=user_obj.pk,
+        user_version=get_user_version(user_obj.pk),
+        version=get_permissions_version(),
+    )
+
+
+def remember_user(user):
+    """
+    Положить в кэш обновлённый объект пользователя (например, после
+    UPDATE last_seen_at, который не вызывает post_save и не меняет версию).
+    Только под той версией, с которой объект был загружен: если версия
+    с тех пор выросла, объект устарел и кэшировать его нельзя.
+    """
+    version = getattr(user, "_cached_version", None)
+    if version is not None and version == get_user_version(user.pk):
+        cached = copy.copy(user)
+        for attr in _PERM_CACHE_ATTRS:
+            cached.__dict__.pop(attr, None)
+        cache.set(_user_key(user.pk, version), cached, USER_CACHE_TIMEOUT)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который загружает пользователя сессии из кэша.
+
+    Ключ — id пользователя + его версия (page_cache.get_user_version),
+    версию увеличивает post_save/post_delete CustomUser (смена имени,
+    пароля, деактивация, last_login), так что устаревший объект
+    просто перестаёт находиться. На обычном запросе вместо SELECT
+    по start_page_customuser — одно-два чтения кэша.
+
+    Объект хранится целиком: хэш пароля нужен для проверки
+    session auth hash при каждом запросе.
+
+    Права (has_perm, has_module_perms в админке) тоже кэшируются:
+    frozenset строк "app_label.codename" на пользователя вместо двух
+    запросов через user_permissions и groups__permissions.
+    """
+
+    def get_user(self, user_id):
+        version = get_user_version(user_id)
+        key = _user_key(user_id, version)
+        user = cache.get(key)
+        record_cache(hit=user is not None)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            user._cached_version = version
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        version = get_user_version(user_id)
+        key = _user_key(user_id, version)
+        user = await cache.aget(key)
+        record_cache(hit=user is not None)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is None:
+                return None
+            user._cached_version = version
+            await cache.aset(key, user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key = _permissions_key(user_obj)
+            perms = cache.get(key)
+            if perms is None:
+                perms = frozenset(super().get_all_permissions(user_obj))
+                cache.set(key, perms, PERMISSIONS_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key = _permissions_key(user_obj)
+            perms = await cache.aget(key)
+            if perms is None:
+                perms = frozenset(await super().aget_all_permissions(user_obj))
+                await cache.aset(key, perms, PERMISSIONS_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
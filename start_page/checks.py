@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+def _uses_locmem():
+    return settings.CACHES["default"]["BACKEND"] == LOCMEM_BACKEND
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Кэш по умолчанию должен быть общим для всех воркеров: версии
+    пользователей (сброс страниц, пользователей и прав), онлайн-счётчики
+    и блокировки Idempotency-Key работают только через него.
+    LocMemCache у каждого процесса свой — с несколькими воркерами
+    пользователи видят чужие устаревшие данные.
+    """
+    if _uses_locmem() and getattr(settings, "WORKER_PROCESSES", 1) > 1:
+        return [Error(
+            "LocMemCache не годится при нескольких воркерах "
+            f"(WORKER_PROCESSES={settings.WORKER_PROCESSES}).",
+            hint="Задайте DJANGO_REDIS_URL или запускайте один воркер.",
+            id="start_page.E001",
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache_deploy(app_configs, **kwargs):
+    if _uses_locmem():
+        return [Warning(
+            "В продакшене используется LocMemCache: кэш и его сброс не общие между процессами.",
+            hint="Задайте DJANGO_REDIS_URL.",
+            id="start_page.W001",
+        )]
+    return []
@@ -0,0 +1,11 @@
+from .page_cache import CSRF_PLACEHOLDER
+
+
+def page_cache_csrf(request):
+    """
+    Если страница рендерится для кэша, вместо CSRF-токена кладём заглушку —
+    настоящий токен подставит AnonymousPageCacheMiddleware.
+    """
+    if getattr(request, "_page_cache_csrf_placeholder", False):
+        return {"csrf_token": CSRF_PLACEHOLDER}
+    return {}
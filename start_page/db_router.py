@@ -0,0 +1,60 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Признак "этот запрос уже писал в основную базу": после записи все чтения
+# идут туда же, чтобы запрос видел свои изменения (read-your-writes).
+_pinned_to_primary = contextvars.ContextVar("pinned_to_primary", default=False)
+
+
+def pin_to_primary():
+    _pinned_to_primary.set(True)
+
+
+def is_pinned_to_primary():
+    return _pinned_to_primary.get()
+
+
+def start_request(pinned=False):
+    """
+    Сбрасываем признак в начале запроса (потоки WSGI переиспользуются).
+    Возвращает токен для end_request.
+    """
+    return _pinned_to_primary.set(pinned)
+
+
+def end_request(token):
+    _pinned_to_primary.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Роутер чтения на реплики из settings.DATABASE_REPLICAS.
+
+    - запись — всегда в default, после неё запрос закрепляется за default;
+    - чтение внутри транзакции на default — тоже в default;
+    - остальное чтение (списки в админке, выгрузки, проверки exists()) —
+      на случайную реплику.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if not replicas or is_pinned_to_primary():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # реплики получают схему и данные репликацией, migrate --database=replica_N — ничего не делает
+        return db == DEFAULT_DB_ALIAS
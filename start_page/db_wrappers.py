@@ -0,0 +1,54 @@
+import contextvars
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# обёртки execute текущего запроса, от внешней к внутренней
+_wrappers = contextvars.ContextVar("db_execute_wrappers", default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    wrappers = _wrappers.get()
+    if not wrappers:
+        return execute(sql, params, many, context)
+    for wrapper in reversed(wrappers):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+def install_all():
+    # соединения, открытые до подключения сигнала (manage.py shell, тесты)
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """
+    Как connection.execute_wrapper(), но для всех соединений и всех потоков
+    текущего запроса.
+
+    connection.execute_wrapper() действует только на соединение своего
+    потока, а асинхронный вид выполняет SQL в потоке sync_to_async.
+    Поэтому на каждое соединение при открытии ставится одна постоянная
+    обёртка (_dispatch), которая вызывает обёртки из contextvar, —
+    contextvar sync_to_async передаёт в поток вместе с контекстом.
+    """
+    token = _wrappers.set(_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
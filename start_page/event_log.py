@@ -0,0 +1,155 @@
+import atexit
+import logging
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger("start_page.event_log")
+
+_lock = threading.Lock()
+# буфер: (created_at, kind, user_id, session_id); _flush_lock — одна запись за раз
+_buffer = []
+_flush_lock = threading.Lock()
+_oldest = None
+_stats = {"written": 0, "dropped": 0, "flushes": 0}
+# поток записи пачек; после fork в дочернем процессе он не жив — запускается заново
+_flusher = None
+_wake = threading.Event()
+
+
+def _enabled():
+    return getattr(settings, "EVENT_LOG_ENABLED", True)
+
+
+def _enqueue(event):
+    """
+    Положить событие в буфер. Запись — в фоновом потоке (_flush_periodically):
+    его будим, когда буфер стал непустым (пора заводить таймер
+    EVENT_LOG_FLUSH_INTERVAL) или набралось EVENT_LOG_BATCH_SIZE.
+    """
+    global _oldest
+    with _lock:
+        if len(_buffer) >= getattr(settings, "EVENT_LOG_MAX_BUFFER", 10_000):
+            # база не успевает — теряем события, а не память процесса
+            _stats["dropped"] += 1
+            return
+        if not _buffer:
+            _oldest = time.monotonic()
+            _start_flusher()
+        _buffer.append(event)
+        if len(_buffer) == 1 or len(_buffer) >= getattr(settings, "EVENT_LOG_BATCH_SIZE", 500):
+            _wake.set()
+
+
+def _start_flusher():
+    """
+    Поток, который пишет пачки: запрос, на котором набралась пачка,
+    не платит за bulk INSERT, а затихший процесс не держит события
+    в памяти, пока его не убьют (SIGKILL, OOM — atexit тогда не вызывается).
+    Вызывается под _lock.
+    """
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    _flusher = threading.Thread(target=_flush_periodically, name="event-log-flush", daemon=True)
+    _flusher.start()
+
+
+def _seconds_until_due():
+    """
+    Через сколько секунд писать пачку: None — буфер пуст, 0 — пора.
+    """
+    with _lock:
+        if not _buffer:
+            return None
+        if len(_buffer) >= getattr(settings, "EVENT_LOG_BATCH_SIZE", 500):
+            return 0
+        return max(0, _oldest + getattr(settings, "EVENT_LOG_FLUSH_INTERVAL", 5.0) - time.monotonic())
+
+
+def _flush_periodically():
+    from django.db import connection
+
+    while True:
+        _wake.wait(_seconds_until_due())
+        _wake.clear()
+        if _seconds_until_due() == 0:
+            try:
+                flush()
+            finally:
+                # соединение потока не должно висеть открытым между пачками
+                connection.close()
+
+
+def record(kind, user_id, session_id=None):
+    """
+    Записать событие (AuthEvent.kind) в журнал.
+
+    Событие попадает в буфер процесса только после коммита текущей
+    транзакции (откат — события не было), в базу — пачкой одним
+    bulk INSERT из фонового потока. Запрос за запись не платит.
+    """
+    if not _enabled():
+        return
+    event = (timezone.now(), kind, user_id, session_id)
+    transaction.on_commit(partial(_enqueue, event), robust=True)
+
+
+async def arecord(kind, user_id, session_id=None):
+    """
+    record для асинхронных видов: только буфер в памяти, без обращения к базе.
+    """
+    if _enabled():
+        _enqueue((timezone.now(), kind, user_id, session_id))
+
+
+def flush():
+    """
+    Записать всё из буфера. Вызывается фоновым потоком (пачка набралась
+    или самое старое событие ждёт дольше EVENT_LOG_FLUSH_INTERVAL),
+    при остановке процесса (atexit) и из тестов.
+    """
+    from .models import AuthEvent
+
+    with _flush_lock:
+        with _lock:
+            events = _buffer[:]
+            _buffer.clear()
+        if not events:
+            return 0
+        try:
+            AuthEvent.objects.bulk_create(
+                [
+                    AuthEvent(created_at=created_at, kind=kind, user_id=user_id, session_id=session_id)
+                    for created_at, kind, user_id, session_id in events
+                ],
+                batch_size=getattr(settings, "EVENT_LOG_BATCH_SIZE", 500),
+            )
+        except Exception:
+            with _lock:
+                _stats["dropped"] += len(events)
+            logger.exception("Не удалось записать %s событий журнала", len(events))
+            return 0
+        with _lock:
+            _stats["written"] += len(events)
+            _stats["flushes"] += 1
+        return len(events)
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:  # при остановке база может быть уже недоступна
+        logger.exception("Журнал событий не записан при остановке")
+
+
+atexit.register(_flush_at_exit)
+
+
+def get_event_log_stats():
+    with _lock:
+        return {**_stats, "buffered": len(_buffer)}
@@ -2,8 +2,14 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email as django_validate_email
 
-from .validators import *
-from .validators import _normalize_email, _check_allowed_domain
+from .models import CustomUser
+from .validators import (
+    _check_allowed_domain,
+    _normalize_email,
+    validate_email,
+    validate_password,
+    validate_username,
+)
 
 
 class RegisterForm(forms.ModelForm):
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.http.request import RawPostDataException
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# заголовки ответа, которые сохраняем для повтора
+_STORED_HEADERS = ("Content-Type", "ETag")
+_POLL_INTERVAL = 0.05
+
+IDEMPOTENCY_MESSAGES = {
+    "key_invalid": f"Заголовок {IDEMPOTENCY_HEADER} должен быть не длиннее {MAX_KEY_LENGTH} символов.",
+    "key_reused": "Этот ключ идемпотентности уже использован для другого запроса.",
+    "in_progress": "Запрос с этим ключом ещё выполняется. Повторите чуть позже.",
+}
+
+
+def _scope(request, user):
+    # ключи разных клиентов не пересекаются: пользователь, иначе сессия.
+    # Адрес (общий за NAT) — только пока сессии нет, то есть для первого
+    # анонимного запроса; его ответ сохраняется и под сессией (_Call.session_key)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        return f"session:{session.session_key}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _anonymous_without_session(request, user):
+    session = getattr(request, "session", None)
+    return (
+        not (user is not None and user.is_authenticated)
+        and session is not None
+        and not session.session_key
+    )
+
+
+def _fingerprint(request):
+    """
+    Отпечаток запроса: метод, путь и тело. Тело уже могли разобрать
+    (CsrfViewMiddleware читает request.POST) — тогда берём поля формы.
+    """
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    try:
+        digest.update(request.body)
+    except RawPostDataException:
+        for name, values in sorted(request.POST.lists()):
+            digest.update(repr((name, values)).encode())
+        for name, files in sorted(request.FILES.lists()):
+            digest.update(repr((name, [(f.name, f.size) for f in files])).encode())
+    return digest.hexdigest()
+
+
+def _error(code, status, **extra):
+    response = JsonResponse(
+        {"ok": False, "code": code, "error": IDEMPOTENCY_MESSAGES[code]},
+        status=status,
+    )
+    for header, value in extra.items():
+        response.headers[header] = value
+    return response
+
+
+def _serialize(response):
+    return {
+        "status": response.status_code,
+        "content": response.content,
+        "headers": {name: response.headers[name] for name in _STORED_HEADERS if name in response.headers},
+    }
+
+
+def _replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        return _error("key_reused", 422)
+    response = HttpResponse(stored["content"], status=stored["status"])
+    for name, value in stored["headers"].items():
+        response.headers[name] = value
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _should_store(response):
+    # 5xx — сбой, клиент должен иметь возможность повторить по-настоящему
+    return not response.streaming and response.status_code < 500
+
+
+class _Call:
+    """
+    Состояние одного запроса с ключом: ключи кэша, отпечаток, тайминги.
+    """
+
+    def __init__(self, request, key, user):
+        self.view_name = request.resolver_match.view_name if request.resolver_match else request.path
+        self.key_hash = hashlib.sha256(key.encode()).hexdigest()
+        self.user = user
+        self.result_key = self._result_key(_scope(request, user))
+        self.lock_key = f"{self.result_key}:lock"
+        # первый анонимный запрос: сессию создаст сам вид
+        self.needs_session = _anonymous_without_session(request, user)
+        self.fingerprint = _fingerprint(request)
+        self.ttl = getattr(settings, "IDEMPOTENCY_TTL", 24 * 60 * 60)
+        self.lock_timeout = getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60)
+        self.deadline = time.monotonic() + getattr(settings, "IDEMPOTENCY_WAIT", 5.0)
+
+    def _result_key(self, scope):
+        return f"idempotency:{self.view_name}:{scope}:{self.key_hash}"
+
+    def session_key(self, request):
+        """
+        Ключ результата в сессии, которую создал вид, — повтор придёт уже
+        с её cookie. None, если сессия не появилась.
+        """
+        if not self.needs_session or not request.session.session_key:
+            return None
+        return self._result_key(_scope(request, self.user))
+
+    def stored(self, response):
+        return {"fingerprint": self.fingerprint, **_serialize(response)}
+
+    def busy(self):
+        return _error("in_progress", 409, **{"Retry-After": "1"})
+
+
+def lock_key(request, key, user=None):
+    """
+    Ключ кэша, которым занят запрос с Idempotency-Key, пока он выполняется
+    (для диагностики и тестов: формат ключей остаётся внутри модуля).
+    """
+    return _Call(request, key, user).lock_key
+
+
+def _get_key(request):
+    """
+    (ключ или None, ответ с ошибкой или None)
+    """
+    if request.method != "POST":
+        return None, None
+    key = request.headers.get(IDEMPOTENCY_HEADER, "").strip()
+    if not key:
+        return None, None
+    if len(key) > MAX_KEY_LENGTH:
+        return None, _error("key_invalid", 400)
+    return key, None
+
+
+def idempotent(view_func):
+    """
+    Поддержка заголовка Idempotency-Key для POST-видов (и синхронных, и асинхронных).
+
+    - Первый запрос с ключом выполняет вид, ответ (кроме 5xx) кладётся
+      в кэш на IDEMPOTENCY_TTL секунд.
+    - Повтор с тем же ключом и тем же телом получает сохранённый ответ
+      (заголовок Idempotent-Replayed: true) — вид не выполняется: ни записи
+      в базу, ни хэширования пароля, ни письма.
+    - Параллельный дубликат ждёт первый до IDEMPOTENCY_WAIT секунд
+      (блокировка — cache.add), потом получает 409 с Retry-After.
+    - Тот же ключ с другим телом — 422.
+
+    Ключи разделены по виду и клиенту: пользователь, для анонимных — сессия,
+    а без сессии (первый запрос) — адрес.
+    Без заголовка вид работает как раньше.
+    """
+    if iscoroutinefunction(view_func):
+
+        @wraps(view_func)
+        async def _async_view(request, *args, **kwargs):
+            key, error = _get_key(request)
+            if error is not None:
+                return error
+            if key is None:
+                return await view_func(request, *args, **kwargs)
+
+            # request.user в асинхронном виде трогать нельзя — ленивый SELECT
+            user = await request.auser() if hasattr(request, "auser") else None
+            call = _Call(request, key, user)
+            while True:
+                stored = await cache.aget(call.result_key)
+                if stored is not None:
+                    return _replay(stored, call.fingerprint)
+                if await cache.aadd(call.lock_key, call.fingerprint, call.lock_timeout):
+                    break
+                if time.monotonic() >= call.deadline:
+                    return call.busy()
+                await asyncio.sleep(_POLL_INTERVAL)
+
+            try:
+                response = await view_func(request, *args, **kwargs)
+                if _should_store(response):
+                    stored = call.stored(response)
+                    await cache.aset(call.result_key, stored, call.ttl)
+                    if call.needs_session and request.session.modified:
+                        # ключ новой сессии появляется при сохранении
+                        await request.session.asave()
+                    session_key = call.session_key(request)
+                    if session_key is not None:
+                        await cache.aset(session_key, stored, call.ttl)
+                return response
+            finally:
+                await cache.adelete(call.lock_key)
+
+        return _async_view
+
+    @wraps(view_func)
+    def _view(request, *args, **kwargs):
+        key, error = _get_key(request)
+        if error is not None:
+            return error
+        if key is None:
+            return view_func(request, *args, **kwargs)
+
+        call = _Call(request, key, getattr(request, "user", None))
+        while True:
+            stored = cache.get(call.result_key)
+            if stored is not None:
+                return _replay(stored, call.fingerprint)
+            if cache.add(call.lock_key, call.fingerprint, call.lock_timeout):
+                break
+            if time.monotonic() >= call.deadline:
+                return call.busy()
+            time.sleep(_POLL_INTERVAL)
+
+        try:
+            response = view_func(request, *args, **kwargs)
+            if _should_store(response):
+                stored = call.stored(response)
+                cache.set(call.result_key, stored, call.ttl)
+                if call.needs_session and request.session.modified:
+                    # ключ новой сессии появляется при сохранении
+                    request.session.save()
+                session_key = call.session_key(request)
+                if session_key is not None:
+                    cache.set(session_key, stored, call.ttl)
+            return response
+        finally:
+            cache.delete(call.lock_key)
+
+    return _view
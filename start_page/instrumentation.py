@@ -0,0 +1,206 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.template.backends.django import DjangoTemplates
+
+# Границы корзин гистограммы задержек, в секундах (как принято в Prometheus).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Замеры одного (сэмплированного) запроса: время по участкам,
+    число и время SQL-запросов, попадания/промахи кэша.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_count += 1
+            self.db_seconds += time.perf_counter() - started
+
+    def server_timing(self, total_seconds):
+        """
+        Значение заголовка Server-Timing (длительности в мс).
+        """
+        parts = [f"total;dur={total_seconds * 1000:.1f}"]
+        parts.append(f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_count} queries"')
+        for name, seconds in self.spans.items():
+            parts.append(f"{name};dur={seconds * 1000:.1f}")
+        if self.cache_hits or self.cache_misses:
+            parts.append(f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"')
+        return ", ".join(parts)
+
+
+def start_sampling():
+    """
+    Включает замеры для текущего запроса.
+    Возвращает токен (для stop_sampling) и объект с замерами.
+    """
+    timings = RequestTimings()
+    return _current.set(timings), timings
+
+
+def stop_sampling(token):
+    _current.reset(token)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Замер участка запроса (например, отправки письма).
+    Если запрос не сэмплирован — ничего не делает.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, time.perf_counter() - started)
+
+
+def record_cache(hit):
+    timings = _current.get()
+    if timings is None:
+        return
+    if hit:
+        timings.cache_hits += 1
+    else:
+        timings.cache_misses += 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса по имени URL: гистограмма задержек для всех запросов,
+    суммы по SQL/кэшу — только для сэмплированных.
+    Каждый воркер держит свои метрики, Prometheus складывает их сам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.sampled = {}
+
+    def observe(self, view_name, seconds, timings=None):
+        with self._lock:
+            histogram = self.latency.get(view_name)
+            if histogram is None:
+                histogram = self.latency[view_name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+            if timings is not None:
+                totals = self.sampled.setdefault(view_name, {
+                    "requests": 0,
+                    "db_queries": 0,
+                    "db_seconds": 0.0,
+                    "cache_hits": 0,
+                    "cache_misses": 0,
+                })
+                totals["requests"] += 1
+                totals["db_queries"] += timings.db_count
+                totals["db_seconds"] += timings.db_seconds
+                totals["cache_hits"] += timings.cache_hits
+                totals["cache_misses"] += timings.cache_misses
+                for name, span_seconds in timings.spans.items():
+                    key = f"span_seconds:{name}"
+                    totals[key] = totals.get(key, 0.0) + span_seconds
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by URL name.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for view_name, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), histogram.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{view="{view_name}",le="{le}"}} {cumulative}'
+                    )
+                lines.append(f'http_request_duration_seconds_sum{{view="{view_name}"}} {histogram.sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{view="{view_name}"}} {histogram.count}')
+
+            lines.append("# TYPE http_sampled_requests_total counter")
+            lines.append("# TYPE http_sampled_db_queries_total counter")
+            lines.append("# TYPE http_sampled_db_seconds_total counter")
+            lines.append("# TYPE http_sampled_cache_hits_total counter")
+            lines.append("# TYPE http_sampled_cache_misses_total counter")
+            lines.append("# TYPE http_sampled_span_seconds_total counter")
+            for view_name, totals in sorted(self.sampled.items()):
+                for key, value in totals.items():
+                    if key.startswith("span_seconds:"):
+                        span = key.split(":", 1)[1]
+                        lines.append(
+                            f'http_sampled_span_seconds_total{{view="{view_name}",span="{span}"}} {value:.6f}'
+                        )
+                    else:
+                        lines.append(f'http_sampled_{key}_total{{view="{view_name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Обычный бэкенд шаблонов Django, но время render() попадает
+    в Server-Timing сэмплированного запроса (участок "template").
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger("start_page.mail")
+
+_lock = threading.Lock()
+_executor = None
+_pending = set()
+_stats = {"sent": 0, "failed": 0, "seconds": 0.0, "last_failure_at": 0.0}
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "MAIL_DISPATCH_WORKERS", 4),
+                thread_name_prefix="mail-dispatch",
+            )
+        return _executor
+
+
+def _send(subject, message, recipient_list):
+    # почтовый модуль нужен только здесь — импортируем по месту
+    from django.core.mail import send_mail
+
+    started = time.perf_counter()
+    try:
+        send_mail(
+            subject=subject,
+            message=message,
+            from_email=None,  # возьмётся DEFAULT_FROM_EMAIL из settings
+            recipient_list=recipient_list,
+        )
+    except Exception:
+        # клиент уже получил ok — сбой виден только в логе и метриках
+        # (mail_failed_total, mail_last_failure_timestamp_seconds на /metrics/)
+        with _lock:
+            _stats["failed"] += 1
+            _stats["last_failure_at"] = time.time()
+        logger.exception("Не удалось отправить письмо %r на %s", subject, recipient_list)
+        raise
+    finally:
+        with _lock:
+            _stats["seconds"] += time.perf_counter() - started
+    with _lock:
+        _stats["sent"] += 1
+
+
+def dispatch_mail(subject, message, recipient_list):
+    """
+    Отправка письма без ожидания SMTP в запросе.
+
+    При MAIL_DISPATCH_BACKGROUND письмо уходит в небольшой пул потоков
+    (MAIL_DISPATCH_WORKERS): запрос — и синхронный, и асинхронный — не ждёт
+    медленный почтовый сервер. Ошибки пишутся в лог start_page.mail.
+    Пул не привязан к event loop, поэтому работает и под WSGI, и под ASGI;
+    незавершённые отправки дожидаются при остановке процесса.
+    """
+    if not getattr(settings, "MAIL_DISPATCH_BACKGROUND", True):
+        _send(subject, message, recipient_list)
+        return None
+
+    future = _get_executor().submit(_send, subject, message, recipient_list)
+    with _lock:
+        _pending.add(future)
+    future.add_done_callback(_forget)
+    return future
+
+
+async def adispatch_mail(subject, message, recipient_list):
+    """
+    dispatch_mail для асинхронных видов: при отправке прямо в запросе
+    SMTP выполняется в отдельном потоке, а не блокирует event loop.
+    """
+    if getattr(settings, "MAIL_DISPATCH_BACKGROUND", True):
+        return dispatch_mail(subject, message, recipient_list)
+    await sync_to_async(_send, thread_sensitive=False)(subject, message, recipient_list)
+    return None
+
+
+def _forget(future):
+    with _lock:
+        _pending.discard(future)
+
+
+def wait_for_pending(timeout=None):
+    """
+    Дождаться уже поставленных писем (тесты, бенчмарки, остановка).
+    """
+    with _lock:
+        pending = list(_pending)
+    wait(pending, timeout=timeout)
+
+
+def get_mail_stats():
+    with _lock:
+        return {**_stats, "pending": len(_pending)}
@@ -0,0 +1,272 @@
+import http.cookiejar
+import json
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from start_page import event_log
+from start_page.mail_dispatch import wait_for_pending
+
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+RESET_CODE_RE = re.compile(r"\b(\d{6})\b")
+PASSWORD = "Bench123!"
+NEW_PASSWORD = "Bench456!"
+
+# метрики, по которым сравниваем с базовым прогоном
+COMPARED_PERCENTILE = "p95_ms"
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class _VirtualUser:
+    """
+    Один "браузер": свои cookies, CSRF-токен и замеры каждого запроса.
+    """
+
+    def __init__(self, base_url, record):
+        self.base_url = base_url
+        self.record = record
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect
+        )
+        self.csrf_token = ""
+
+    def request(self, endpoint, path, data=None, expected=(200,)):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body)
+        if body is not None:
+            req.add_header("X-CSRFToken", self.csrf_token)
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as resp:
+                status, content = resp.status, resp.read()
+        except urllib.error.HTTPError as exc:
+            status, content = exc.code, exc.read()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.record(endpoint, elapsed_ms, status in expected)
+        text = content.decode("utf-8", "replace")
+        match = CSRF_INPUT_RE.search(text)
+        if match:
+            self.csrf_token = match.group(1)
+        return status, text
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный бенчмарк signup/login/middleware/сброса пароля: поднимает "
+        "локальный сервер на временной базе с locmem-почтой, гоняет сценарии "
+        "параллельно, считает RPS и p50/p95/p99 по эндпоинтам, пишет JSON и "
+        "падает при регрессии относительно базового прогона."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=5, help="сценариев на один поток")
+        parser.add_argument("--output", default="bench_results.json")
+        parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="допустимое ухудшение p95 и RPS (0.2 = 20%%)",
+        )
+
+    def handle(self, *args, **options):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            results = self._run(Path(tmp) / "bench.sqlite3", options)
+
+        Path(options["output"]).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        self._print(results)
+        self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+        if options["baseline"]:
+            regressions = self._compare(results, options["baseline"], options["threshold"])
+            if regressions:
+                raise CommandError("Регрессия производительности:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("Регрессий относительно базового прогона нет."))
+
+    def _record(self, endpoint, elapsed_ms, ok):
+        with self._lock:
+            samples = self._samples.setdefault(endpoint, {"latencies": [], "errors": 0})
+            samples["latencies"].append(elapsed_ms)
+            if not ok:
+                samples["errors"] += 1
+
+    def _run(self, db_path, options):
+        setup_test_environment()
+        connection.settings_dict["TEST"]["NAME"] = str(db_path)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(ALLOWED_HOSTS=["127.0.0.1"]):
+                httpd = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler)
+                httpd.set_app(get_wsgi_application())
+                server = threading.Thread(target=httpd.serve_forever, daemon=True)
+                server.start()
+                try:
+                    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+                    wall = self._drive(base_url, options)
+                finally:
+                    httpd.shutdown()
+                    httpd.server_close()
+        finally:
+            # журнал событий дописываем в бенчмарк-базу, пока она существует
+            event_log.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        endpoints = {}
+        total_requests = 0
+        for endpoint, samples in sorted(self._samples.items()):
+            latencies = sorted(samples["latencies"])
+            total_requests += len(latencies)
+            endpoints[endpoint] = {
+                "count": len(latencies),
+                "errors": samples["errors"],
+                "mean_ms": round(sum(latencies) / len(latencies), 2),
+                "p50_ms": round(_percentile(latencies, 50), 2),
+                "p95_ms": round(_percentile(latencies, 95), 2),
+                "p99_ms": round(_percentile(latencies, 99), 2),
+            }
+        return {
+            "meta": {
+                "concurrency": options["concurrency"],
+                "iterations": options["iterations"],
+                "wall_seconds": round(wall, 3),
+                "password_hasher": settings.PASSWORD_HASHERS[0],
+            },
+            "throughput_rps": round(total_requests / wall, 2),
+            "endpoints": endpoints,
+        }
+
+    def _drive(self, base_url, options):
+        run_id = uuid.uuid4().hex[:8]
+        jobs = [
+            (worker, iteration)
+            for worker in range(options["concurrency"])
+            for iteration in range(options["iterations"])
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for future in [
+                pool.submit(self._scenario, base_url, f"bench{run_id}w{w}i{i}@gmail.com")
+                for w, i in jobs
+            ]:
+                future.result()
+        return time.perf_counter() - started
+
+    def _scenario(self, base_url, email):
+        """
+        Полный путь пользователя: регистрация → страницы за middleware →
+        выход → вход → выход → сброс пароля в три шага.
+        """
+        user = _VirtualUser(base_url, self._record)
+
+        user.request("signup_get", "/signup/")
+        user.request(
+            "signup_post",
+            "/signup/",
+            {"username": "Bench", "email": email, "password": PASSWORD},
+            expected=(302,),
+        )
+        user.request("main_page", "/main/")
+        user.request("profile", "/main/profile/")
+        user.request("logout", "/logout/", expected=(302,))
+
+        user.request("login_get", "/login/")
+        user.request(
+            "login_post",
+            "/login/",
+            {"email": email, "password": PASSWORD},
+            expected=(302,),
+        )
+        user.request("main_page", "/main/")
+        user.request("logout", "/logout/", expected=(302,))
+
+        user.request("login_get", "/login/")
+        user.request("password_reset_send_code", "/password-reset/send-code/", {"email": email})
+        code = self._reset_code(email)
+        user.request("password_reset_verify_code", "/password-reset/verify-code/", {"code": code})
+        user.request(
+            "password_reset_confirm",
+            "/password-reset/confirm/",
+            {"password1": NEW_PASSWORD, "password2": NEW_PASSWORD},
+        )
+
+    def _reset_code(self, email):
+        # письма уходят в фоне — ждём отправку
+        wait_for_pending(timeout=30)
+        for message in reversed(mail.outbox):
+            if email in message.to:
+                match = RESET_CODE_RE.search(message.body)
+                if match:
+                    return match.group(1)
+        return ""
+
+    def _print(self, results):
+        self.stdout.write(
+            f"{'endpoint':<28}{'count':>7}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}"
+        )
+        for endpoint, stats in results["endpoints"].items():
+            self.stdout.write(
+                f"{endpoint:<28}{stats['count']:>7}{stats['errors']:>8}"
+                f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+            )
+        self.stdout.write(f"Пропускная способность: {results['throughput_rps']} запросов/с")
+
+    def _compare(self, results, baseline_path, threshold):
+        baseline = json.loads(Path(baseline_path).read_text())
+        regressions = []
+
+        if results["throughput_rps"] < baseline["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"RPS: {results['throughput_rps']} < {baseline['throughput_rps']} "
+                f"(порог {threshold:.0%})"
+            )
+        for endpoint, stats in results["endpoints"].items():
+            base = baseline["endpoints"].get(endpoint)
+            if base is None:
+                continue
+            if stats[COMPARED_PERCENTILE] > base[COMPARED_PERCENTILE] * (1 + threshold):
+                regressions.append(
+                    f"{endpoint}: {COMPARED_PERCENTILE} {stats[COMPARED_PERCENTILE]} > "
+                    f"{base[COMPARED_PERCENTILE]} (порог {threshold:.0%})"
+                )
+            if stats["errors"] > base["errors"]:
+                regressions.append(f"{endpoint}: ошибок {stats['errors']} > {base['errors']}")
+        return regressions
@@ -0,0 +1,160 @@
+import asyncio
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from start_page import event_log
+from start_page.mail_dispatch import wait_for_pending
+from start_page.models import CustomUser
+
+from .bench_auth import _percentile
+
+
+class SlowSMTPServer:
+    """
+    Минимальный локальный SMTP-сервер на asyncio, который отвечает на DATA
+    с задержкой delay секунд — как перегруженный почтовый сервер.
+    Работает в своём потоке со своим event loop.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.delivered = 0
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        server.close()
+
+    async def _handle(self, reader, writer):
+        writer.write(b"220 slow-smtp ready\r\n")
+        while line := await reader.readline():
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                writer.write(b"250 slow-smtp\r\n")
+            elif command == "DATA":
+                writer.write(b"354 end with <CRLF>.<CRLF>\r\n")
+                await writer.drain()
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                await asyncio.sleep(self.delay)
+                self.delivered += 1
+                writer.write(b"250 queued\r\n")
+            elif command == "QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк шага отправки кода сброса пароля при медленном SMTP: "
+        "N одновременных запросов через ASGI (AsyncClient) к локальному "
+        "SMTP-серверу с задержкой; сравнение отправки в запросе и в фоне."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="одновременных запросов")
+        parser.add_argument("--smtp-delay", type=float, default=1.0, help="задержка SMTP на письмо, с")
+        parser.add_argument(
+            "--background-only",
+            action="store_true",
+            help="не гонять режим отправки в запросе (он идёт примерно requests × smtp-delay)",
+        )
+
+    def handle(self, *args, **options):
+        smtp = SlowSMTPServer(options["smtp_delay"])
+        smtp.start()
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                connection.settings_dict["TEST"]["NAME"] = str(Path(tmp) / "bench.sqlite3")
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                try:
+                    emails = self._create_users(options["requests"])
+                    modes = (True,) if options["background_only"] else (False, True)
+                    for background in modes:
+                        self._run_mode(smtp, emails, background)
+                finally:
+                    # журнал событий дописываем в бенчмарк-базу, пока она существует
+                    event_log.flush()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            smtp.stop()
+
+    def _create_users(self, count):
+        # один хэш на всех — иначе подготовка дольше самого бенчмарка
+        password = make_password("Bench123!")
+        users = [
+            CustomUser(email=f"reset{i}@gmail.com", username=f"Reset{i}", password=password)
+            for i in range(count)
+        ]
+        CustomUser.objects.bulk_create(users)
+        return [user.email for user in users]
+
+    def _run_mode(self, smtp, emails, background):
+        delivered_before = smtp.delivered
+        smtp_settings = {
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": "127.0.0.1",
+            "EMAIL_PORT": smtp.port,
+            "EMAIL_USE_SSL": False,
+            "EMAIL_USE_TLS": False,
+            "EMAIL_HOST_USER": "",
+            "EMAIL_HOST_PASSWORD": "",
+            "ALLOWED_HOSTS": ["testserver"],
+            "MAIL_DISPATCH_BACKGROUND": background,
+        }
+        with override_settings(**smtp_settings):
+            started = time.perf_counter()
+            latencies, statuses = asyncio.run(self._drive(emails))
+            responded = time.perf_counter() - started
+            wait_for_pending()
+            delivered = time.perf_counter() - started
+
+        latencies.sort()
+        errors = sum(1 for status in statuses if status != 200)
+        mode = "фон" if background else "в запросе"
+        self.stdout.write(
+            f"{mode:>10}: ответы за {responded:6.2f} с, p50 {_percentile(latencies, 50):8.1f} мс, "
+            f"p95 {_percentile(latencies, 95):8.1f} мс, ошибок {errors}, "
+            f"письма доставлены за {delivered:6.2f} с ({smtp.delivered - delivered_before} шт.)"
+        )
+
+    async def _drive(self, emails):
+        url = reverse("start_page:password_reset_send_code")
+
+        async def one(email):
+            client = AsyncClient()
+            started = time.perf_counter()
+            response = await client.post(url, {"email": email})
+            return (time.perf_counter() - started) * 1000, response.status_code
+
+        results = await asyncio.gather(*(one(email) for email in emails))
+        return [latency for latency, _ in results], [status for _, status in results]
@@ -0,0 +1,128 @@
+import copy
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test.utils import override_settings
+
+from start_page.models import CustomUser
+from start_page.services import create_or_update_user_session, end_user_sessions
+
+# кэш и журнал событий бенчмарка — свои: пользователи временной базы
+# не должны попасть в общий кэш или в журнал настоящей базы
+BENCH_SETTINGS = {
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench"}},
+    "EVENT_LOG_ENABLED": False,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Конкурентный бенчмарк записи в SQLite: потоки вызывают настоящие "
+        "create_or_update_user_session / end_user_sessions на временной базе "
+        "после migrate — профиль по умолчанию против SQLITE_PRODUCTION_OPTIONS "
+        "(PRAGMA + BEGIN IMMEDIATE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--logout-every", type=int, default=4,
+            help="каждый N-й запрос потока — выход, следующий создаёт новую сессию",
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile in ("default", "production"):
+            with tempfile.TemporaryDirectory() as tmp, self._database(Path(tmp) / "bench.sqlite3", profile):
+                self._prepare(options["users"])
+                results[profile] = self._run(options)
+
+            ops, errors = results[profile]
+            self.stdout.write(
+                f"{profile:>10}: {ops / options['seconds']:8.1f} оп/с, "
+                f"ошибок 'database is locked': {errors}"
+            )
+
+        base_ops = results["default"][0] or 1
+        gain = results["production"][0] / base_ops
+        self.stdout.write(self.style.SUCCESS(f"Прирост пропускной способности: x{gain:.2f}"))
+
+    @contextmanager
+    def _database(self, path, profile):
+        """
+        На время бенчмарка default указывает на временный файл: сервисы
+        пишут через default, а соединения потоков создаются по этим настройкам.
+        """
+        original = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings[DEFAULT_DB_ALIAS] = {
+            **original,
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(path),
+            "OPTIONS": settings.SQLITE_PRODUCTION_OPTIONS if profile == "production" else {},
+            "CONN_MAX_AGE": 0,
+        }
+        self._reset_connection()
+        try:
+            with override_settings(**BENCH_SETTINGS):
+                yield
+        finally:
+            self._reset_connection()
+            connections.settings[DEFAULT_DB_ALIAS] = original
+
+    def _reset_connection(self):
+        connections[DEFAULT_DB_ALIAS].close()
+        del connections[DEFAULT_DB_ALIAS]
+
+    def _prepare(self, users):
+        call_command("migrate", database=DEFAULT_DB_ALIAS, verbosity=0, interactive=False, skip_checks=True)
+        CustomUser.objects.bulk_create(
+            CustomUser(email=f"bench{index}@gmail.com", username=f"Bench{index}", password="!")
+            for index in range(users)
+        )
+
+    def _run(self, options):
+        users = list(CustomUser.objects.order_by("pk"))
+        deadline = time.monotonic() + options["seconds"]
+        counters = {"ops": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def worker(seed):
+            # у каждого потока свои объекты пользователей, как у запросов
+            own_users = {}
+            index = seed
+            ops = errors = 0
+            try:
+                while time.monotonic() < deadline:
+                    index = (index * 31 + 7) % len(users)
+                    user = own_users.setdefault(index, copy.copy(users[index]))
+                    request = SimpleNamespace(session=SimpleNamespace(session_key=f"bench{index}"))
+                    try:
+                        if (ops + errors) % options["logout_every"] == options["logout_every"] - 1:
+                            end_user_sessions(user)
+                        else:
+                            create_or_update_user_session(request, user)
+                        ops += 1
+                    except OperationalError:
+                        errors += 1
+            finally:
+                connections.close_all()
+            with lock:
+                counters["ops"] += ops
+                counters["errors"] += errors
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counters["ops"], counters["errors"]
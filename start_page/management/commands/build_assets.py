@@ -0,0 +1,51 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from start_page.assets import bundle_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает статику для продакшена: бандлы, минификация, хэши в именах, "
+        ".gz/.br варианты. Печатает, сколько байт и запросов стало на страницу."
+    )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "STATIC_ROOT", None):
+            raise CommandError("Не задан STATIC_ROOT.")
+
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+        manifest = staticfiles_storage.load_manifest()[0]
+        if not manifest:
+            raise CommandError(
+                "staticfiles.json не найден: в STORAGES['staticfiles'] должно быть "
+                "BundledManifestStaticFilesStorage (DEBUG=False)."
+            )
+
+        for name, kinds in settings.ASSET_BUNDLES.items():
+            before_bytes = after_bytes = compressed_bytes = before_requests = 0
+            for kind, sources in kinds.items():
+                before_requests += len(sources)
+                before_bytes += sum(os.path.getsize(finders.find(source)) for source in sources)
+
+                hashed = manifest[bundle_name(name, kind)]
+                path = staticfiles_storage.path(hashed)
+                after_bytes += os.path.getsize(path)
+                for suffix in (".br", ".gz"):
+                    if os.path.exists(path + suffix):
+                        compressed_bytes += os.path.getsize(path + suffix)
+                        break
+                else:
+                    compressed_bytes += os.path.getsize(path)
+
+            self.stdout.write(
+                f"{name}: запросов {before_requests} -> {len(kinds)}, "
+                f"байт {before_bytes} -> {after_bytes} (сжато {compressed_bytes})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Статика собрана в {settings.STATIC_ROOT}"))
@@ -0,0 +1,34 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from start_page import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгрузка сессий, восстановленных по журналу AuthEvent (user_id, start_time, end_time в секундах Unix) "
+        "в .npz или каталог .npy для офлайн-анализа в numpy/pandas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="файл .npz или каталог для .npy")
+        parser.add_argument("--format", choices=("npz", "npy"), default="npz")
+        parser.add_argument("--days", type=int, help="только сессии за последние N дней")
+        parser.add_argument("--chunk-size", type=int, default=analytics.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if analytics.np is None:
+            raise CommandError("Для выгрузки нужен numpy: pip install numpy")
+
+        since = timezone.now() - timedelta(days=options["days"]) if options["days"] else None
+        columns = analytics.load_sessions(since, chunk_size=options["chunk_size"])
+        output = Path(options["output"])
+        analytics.export_columns(columns, output, fmt=options["format"])
+
+        size = sum(values.nbytes for values in columns.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Выгружено сессий: {len(columns['user_id'])} ({size / 1024:.1f} КБ в памяти) → {output}"
+        ))
@@ -0,0 +1,265 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db import models
+from django.db.models import Max
+from django.utils import timezone
+
+from start_page.models import CustomUser, PasswordResetRequest, UserSession
+from start_page.services import SESSION_LIFETIME
+
+PASSWORD = "Synthetic123!"
+RESET_CODE_LIFETIME = timedelta(minutes=10)
+BULK_LOAD_CACHE_KB = -256 * 1024  # отрицательное значение cache_size — в КБ
+
+USER_FIELDS = (
+    "id", "password", "last_login", "is_superuser", "email", "username",
+    "is_active", "is_staff", "date_joined",
+    "last_seen_at", "active_sessions_count", "total_sessions_count", "last_password_reset_at",
+)
+SESSION_FIELDS = ("user_id", "session_key_hash", "start_time", "end_time", "is_active")
+RESET_FIELDS = ("user_id", "code", "created_at", "expires_at", "is_used")
+
+FIRST_NAMES = (
+    "Alex", "Anna", "Boris", "Daria", "Egor", "Elena", "Igor", "Irina", "Kirill", "Maria",
+    "Maxim", "Nina", "Oleg", "Olga", "Pavel", "Sofia", "Timur", "Vera", "Yuri", "Zoya",
+)
+
+
+def _sqlite_datetime(value):
+    # то же, что adapt_datetimefield_value для наивного UTC-времени, без проверок на каждое значение
+    return None if value is None else str(value)
+
+
+def _preparer(field, connection):
+    """
+    Подготовка значения столбца к вставке. Для SQLite даты
+    переводим напрямую (времена генерируются наивными в UTC) — полный
+    get_db_prep_save занимает больше половины времени генерации.
+    """
+    if connection.vendor == "sqlite":
+        if isinstance(field, models.DateTimeField):
+            return _sqlite_datetime
+        if isinstance(field, (models.CharField, models.IntegerField, models.BooleanField, models.ForeignKey)):
+            return None
+    return lambda value: field.get_db_prep_save(value, connection)
+
+
+class _Inserter:
+    """
+    INSERT пачками через cursor.executemany: без создания моделей и без сигналов.
+    """
+
+    def __init__(self, connection, model, field_names):
+        fields = [model._meta.get_field(name) for name in field_names]
+        self.preparers = [(index, _preparer(field, connection)) for index, field in enumerate(fields)]
+        self.preparers = [(index, prepare) for index, prepare in self.preparers if prepare is not None]
+        quote = connection.ops.quote_name
+        self.sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(model._meta.db_table),
+            ", ".join(quote(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)),
+        )
+        self.rows = 0
+
+    def insert(self, cursor, rows):
+        prepared = []
+        for row in rows:
+            row = list(row)
+            for index, prepare in self.preparers:
+                row[index] = prepare(row[index])
+            prepared.append(row)
+        cursor.executemany(self.sql, prepared)
+        self.rows += len(prepared)
+
+
+class Command(BaseCommand):
+    help = (
+        "Синтетические данные для нагрузочных проверок: пользователи с разрешёнными "
+        "доменами, история UserSession и PasswordResetRequest. Детерминировано (--seed), "
+        "вставка пачками executemany; счётчики активности CustomUser согласованы с историей."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--sessions-per-user", type=float, default=10.0, help="в среднем")
+        parser.add_argument("--resets-per-user", type=float, default=0.3, help="в среднем")
+        parser.add_argument("--days", type=int, default=365, help="глубина истории")
+        parser.add_argument("--online-share", type=float, default=0.05, help="доля с активной сессией")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5_000, help="пользователей на транзакцию")
+        parser.add_argument("--email-prefix", default="synthetic")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options["users"] <= 0 or options["batch_size"] <= 0:
+            raise CommandError("--users и --batch-size должны быть положительными")
+
+        self.rng = random.Random(options["seed"])
+        self.options = options
+        self.now = timezone.now()
+        self.domains = list(settings.ALLOWED_EMAIL_DOMAINS)
+        # один хэш на всех — иначе хэширование займёт больше, чем вставка
+        self.password = make_password(PASSWORD, salt="synthetic")
+
+        database = options["database"]
+        connection = connections[database]
+        if connection.vendor == "sqlite":
+            # SQLite хранит наивное UTC-время — генерируем сразу его (см. _sqlite_datetime)
+            self.now = self.now.astimezone(dt_timezone.utc).replace(tzinfo=None)
+        with self._bulk_load_pragmas(connection):
+            self._generate(database, connection)
+
+    @contextmanager
+    def _bulk_load_pragmas(self, connection):
+        """
+        Только для этого соединения SQLite: без fsync на коммит и с большим
+        кэшем страниц (индексы по случайным ключам иначе упираются в диск).
+        Данные синтетические — при сбое их проще сгенерировать заново.
+        Внутри уже открытой транзакции (тесты) synchronous менять нельзя.
+        """
+        if connection.vendor != "sqlite" or connection.in_atomic_block:
+            yield
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+            cursor.execute("PRAGMA cache_size")
+            cache_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.execute(f"PRAGMA cache_size={BULK_LOAD_CACHE_KB}")
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA synchronous={int(synchronous)}")
+                cursor.execute(f"PRAGMA cache_size={int(cache_size)}")
+
+    def _generate(self, database, connection):
+        options = self.options
+        inserters = {
+            "users": _Inserter(connection, CustomUser, USER_FIELDS),
+            "sessions": _Inserter(connection, UserSession, SESSION_FIELDS),
+            "resets": _Inserter(connection, PasswordResetRequest, RESET_FIELDS),
+        }
+
+        # id задаём сами, чтобы сразу ссылаться на них из сессий
+        first_id = (CustomUser.objects.using(database).aggregate(last=Max("id"))["last"] or 0) + 1
+        started = time.perf_counter()
+        total, batch_size = options["users"], options["batch_size"]
+
+        for offset in range(0, total, batch_size):
+            users, sessions, resets = [], [], []
+            for user_id in range(first_id + offset, first_id + min(offset + batch_size, total)):
+                self._generate_user(user_id, users, sessions, resets)
+
+            with transaction.atomic(using=database), connection.cursor() as cursor:
+                inserters["users"].insert(cursor, users)
+                inserters["sessions"].insert(cursor, sessions)
+                inserters["resets"].insert(cursor, resets)
+
+            done = min(offset + batch_size, total)
+            rows = sum(inserter.rows for inserter in inserters.values())
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"пользователей {done}/{total}, строк {rows} ({rows / elapsed:,.0f} строк/с)"
+            )
+
+        with connection.cursor() as cursor:
+            # id пользователей вставлены явно — счётчики id (последовательности
+            # PostgreSQL и т.п.) не сдвинулись, и следующая вставка из приложения
+            # упала бы на IntegrityError; в SQLite список пустой
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [CustomUser, UserSession, PasswordResetRequest]
+            ):
+                cursor.execute(sql)
+            # свежая статистика для планировщика — иначе планы как для пустой базы
+            cursor.execute("ANALYZE")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {elapsed:.1f} с: пользователей {inserters['users'].rows}, "
+            f"сессий {inserters['sessions'].rows}, запросов сброса {inserters['resets'].rows}. "
+            f"Пароль у всех: {PASSWORD}"
+        ))
+
+    def _generate_user(self, user_id, users, sessions, resets):
+        rng, now, days = self.rng, self.now, self.options["days"]
+
+        # регистрации чаще в недавнем прошлом (растущий сервис)
+        joined = now - timedelta(seconds=rng.triangular(0, days, 0) * 86400)
+        name = rng.choice(FIRST_NAMES)
+        email = f"{self.options['email_prefix']}{user_id}@{rng.choice(self.domains)}"
+
+        user_sessions, last_seen = self._generate_sessions(user_id, joined)
+        sessions.extend(user_sessions)
+        active = sum(1 for session in user_sessions if session[4])
+
+        user_resets = self._generate_resets(user_id, joined)
+        resets.extend(user_resets)
+        last_reset = None
+        if user_resets:
+            # отмечается при подтверждении — через пару минут после запроса кода
+            last_reset = max(reset[2] for reset in user_resets) + timedelta(seconds=rng.randint(30, 300))
+
+        users.append((
+            user_id, self.password, last_seen, False, email, f"{name}{user_id}",
+            rng.random() > 0.02, False, joined,
+            last_seen, active, len(user_sessions), last_reset,
+        ))
+
+    def _count(self, mean):
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def _generate_sessions(self, user_id, joined):
+        """
+        Количество сессий — экспоненциальное (много редких посетителей, немного
+        активных), начала равномерно от регистрации до сейчас, длительность —
+        логнормальная (медиана ~25 минут активности) плюс SESSION_LIFETIME
+        после последнего запроса, как в create_or_update_user_session.
+        Возвращает (строки сессий, время последнего запроса).
+        """
+        rng, now = self.rng, self.now
+        count = self._count(self.options["sessions_per_user"])
+        span = (now - joined).total_seconds()
+        starts = sorted(joined + timedelta(seconds=rng.random() * span) for _ in range(count))
+
+        online = rng.random() < self.options["online_share"]
+        if online:
+            # активная сессия: последний запрос недавно, end_time в будущем
+            starts.append(now - timedelta(seconds=rng.uniform(60, 3 * 3600)))
+
+        rows = []
+        last_seen = None
+        for index, start in enumerate(starts):
+            is_active = online and index == len(starts) - 1
+            if is_active:
+                since_start = (now - start).total_seconds()
+                last_request = now - timedelta(seconds=rng.uniform(0, min(600, since_start)))
+            else:
+                last_request = start + timedelta(seconds=min(rng.lognormvariate(7.3, 1.2), 86400))
+            end = last_request + SESSION_LIFETIME
+            if not is_active:
+                # завершённые: либо вышли сами (logout), либо сессия истекла
+                end = last_request if rng.random() < 0.3 else min(end, now)
+            last_seen = max(last_seen, last_request) if last_seen else last_request
+            # 64-битный хэш ключа сессии — сразу случайное знаковое число
+            rows.append((user_id, rng.getrandbits(64) - 2 ** 63, start, end, is_active))
+        return rows, last_seen
+
+    def _generate_resets(self, user_id, joined):
+        rng, now = self.rng, self.now
+        count = self._count(self.options["resets_per_user"])
+        span = (now - joined).total_seconds()
+        rows = []
+        for _ in range(count):
+            created = joined + timedelta(seconds=rng.random() * span)
+            rows.append((user_id, f"{rng.randrange(10 ** 6):06d}", created, created + RESET_CODE_LIFETIME, True))
+        return rows
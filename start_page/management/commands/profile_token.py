@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from start_page.profiling import PROFILE_HEADER, make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Выдаёт подписанный токен: запросы с ним профилируются (ProfilingMiddleware)."
+
+    def handle(self, *args, **options):
+        token = make_profile_token()
+        self.stdout.write(f"{PROFILE_HEADER}: {token}")
+        self.stdout.write(f"Действует {settings.PROFILING_TOKEN_MAX_AGE} секунд.")
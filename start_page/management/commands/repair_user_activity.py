@@ -0,0 +1,112 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from start_page.models import AuthEvent, CustomUser, PasswordResetRequest, UserSession
+from start_page.services import LAST_SEEN_RESOLUTION
+
+SUMMARY_FIELDS = (
+    "active_sessions_count",
+    "total_sessions_count",
+    "last_seen_at",
+    "last_password_reset_at",
+)
+
+# события, в которых пользователь точно был на сайте
+SEEN_EVENTS = (AuthEvent.LOGIN, AuthEvent.SESSION_EXTENDED, AuthEvent.LOGOUT)
+
+
+def expected_summary(queryset):
+    """
+    Пользователи с посчитанной заново сводкой активности
+    (атрибуты expected_<поле>), по подзапросу на поле — без JOIN,
+    который размножил бы строки сессий и запросов сброса.
+    """
+    sessions = UserSession.objects.filter(user=OuterRef("pk")).order_by().values("user")
+    events = (
+        AuthEvent.objects.filter(user_id=OuterRef("pk"), kind__in=SEEN_EVENTS)
+        .order_by().values("user_id")
+    )
+    resets = (
+        PasswordResetRequest.objects.filter(user=OuterRef("pk"), is_used=True)
+        .order_by().values("user")
+    )
+    return queryset.annotate(
+        expected_active_sessions_count=Coalesce(
+            Subquery(sessions.filter(is_active=True).annotate(n=Count("id")).values("n")), 0
+        ),
+        expected_total_sessions_count=Coalesce(
+            Subquery(sessions.annotate(n=Count("id")).values("n")), 0
+        ),
+        # последнее событие журнала (вход, продление, выход); для истории
+        # до журнала — начало последней сессии
+        expected_last_seen_at=Coalesce(
+            Subquery(events.annotate(last=Max("created_at")).values("last")),
+            Subquery(sessions.annotate(last=Max("start_time")).values("last")),
+        ),
+        expected_last_password_reset_at=Subquery(resets.annotate(last=Max("created_at")).values("last")),
+    )
+
+
+def _differs(field, current, expected):
+    if field.endswith("_count"):
+        return current != expected
+    # время по истории — нижняя оценка: продления пишутся в журнал раз в
+    # LAST_SEEN_RESOLUTION, сброс пароля отмечается позже создания запроса.
+    # Чиним только пропуски и заметное отставание, более точное значение не трогаем
+    if expected is None:
+        return False
+    return current is None or expected - current >= LAST_SEEN_RESOLUTION
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчёт денормализованной сводки активности CustomUser "
+        "(last_seen_at, active/total_sessions_count, last_password_reset_at) "
+        "по UserSession и PasswordResetRequest. Исправляет только расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="только показать расхождения")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = repaired = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                expected_summary(CustomUser.objects.filter(pk__gt=last_id))
+                .order_by("pk")
+                .only("pk", *SUMMARY_FIELDS)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            checked += len(batch)
+
+            changed = []
+            for user in batch:
+                drift = {
+                    field: getattr(user, f"expected_{field}")
+                    for field in SUMMARY_FIELDS
+                    if _differs(field, getattr(user, field), getattr(user, f"expected_{field}"))
+                }
+                if not drift:
+                    continue
+                changed.append(user)
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{user.pk}: {drift}")
+                for field, value in drift.items():
+                    setattr(user, field, value)
+
+            repaired += len(changed)
+            if changed and not options["dry_run"]:
+                # bulk_update без сигналов: кэш страниц из-за счётчиков не сбрасываем
+                CustomUser.objects.bulk_update(changed, SUMMARY_FIELDS)
+
+        action = "найдено расхождений" if options["dry_run"] else "исправлено"
+        self.stdout.write(self.style.SUCCESS(
+            f"Проверено пользователей: {checked}, {action}: {repaired}"
+        ))
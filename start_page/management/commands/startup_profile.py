@@ -0,0 +1,89 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+# выполняется в чистом процессе: так видно реальный холодный старт воркера
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+phases = {"django.setup": time.perf_counter() - started}
+
+from django.core.wsgi import get_wsgi_application
+mark = time.perf_counter()
+get_wsgi_application()
+phases["wsgi_application"] = time.perf_counter() - mark
+
+from start_page.warmup import warm_up
+phases.update({"warm_up." + name: seconds for name, seconds in warm_up().items()})
+phases["total"] = time.perf_counter() - started
+print(json.dumps(phases))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Профиль старта воркера: разбивка времени импорта (python -X importtime) "
+        "по пакетам и модулям проекта, время django.setup, сборки WSGI-приложения "
+        "и шагов прогрева (start_page.warmup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="сколько самых тяжёлых модулей показать")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings")}
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr[-2000:])
+
+        imports = self._parse_importtime(proc.stderr)
+        phases = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        self.stdout.write("Фазы старта:")
+        for name, seconds in phases.items():
+            self.stdout.write(f"  {name:<28}{seconds * 1000:>10.1f} мс")
+
+        packages = defaultdict(int)
+        for module, (self_us, _) in imports.items():
+            packages[module.split(".")[0]] += self_us
+        total_us = sum(packages.values())
+
+        self.stdout.write(f"\nИмпорт по пакетам (собственное время, всего {total_us / 1000:.1f} мс):")
+        for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {package:<28}{self_us / 1000:>10.1f} мс")
+
+        self.stdout.write("\nМодули проекта (с учётом вложенных импортов):")
+        project_packages = {"config", "start_page", "main_page"}
+        own = [
+            (module, cumulative_us)
+            for module, (_, cumulative_us) in imports.items()
+            if module.split(".")[0] in project_packages
+        ]
+        for module, cumulative_us in sorted(own, key=lambda item: item[1], reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {module:<40}{cumulative_us / 1000:>10.1f} мс")
+
+    def _parse_importtime(self, stderr):
+        """
+        {модуль: (собственное время, время с вложенными импортами)} в микросекундах.
+        """
+        imports = {}
+        for line in stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                self_us, cumulative_us, _, module = match.groups()
+                imports[module] = (int(self_us), int(cumulative_us))
+        return imports
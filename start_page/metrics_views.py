@@ -0,0 +1,114 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+
+from . import admission
+from .event_log import get_event_log_stats
+from .instrumentation import registry
+from .mail_dispatch import get_mail_stats
+from .page_cache import get_page_cache_stats
+from .presence import online_counts
+from .slow_queries import registry as slow_query_registry
+
+
+def _metrics_allowed(request):
+    """
+    Метрики видят сотрудники (is_staff), запросы с Authorization: Bearer
+    <METRICS_TOKEN> (сервер Prometheus) и адреса из METRICS_ALLOWED_IPS.
+    Адресу верим, только если запрос пришёл не через прокси: за обратным
+    прокси на той же машине REMOTE_ADDR у всех 127.0.0.1.
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        scheme, _, provided = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(provided.strip(), token):
+            return True
+
+    if "X-Forwarded-For" in request.headers or "Forwarded" in request.headers:
+        return False
+    return request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ())
+
+
+@require_GET
+def metrics(request):
+    """
+    Метрики процесса в текстовом формате Prometheus.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    body = registry.render_prometheus()
+
+    page_stats = get_page_cache_stats()
+    body += (
+        "# TYPE user_page_cache_hits_total counter\n"
+        f"user_page_cache_hits_total {page_stats['hits']}\n"
+        "# TYPE user_page_cache_misses_total counter\n"
+        f"user_page_cache_misses_total {page_stats['misses']}\n"
+        "# TYPE user_page_cache_render_saved_seconds_total counter\n"
+        f"user_page_cache_render_saved_seconds_total {page_stats['render_ms_saved'] / 1000:.3f}\n"
+    )
+    body += slow_query_registry.render_prometheus()
+    body += admission.render_prometheus()
+
+    body += "# TYPE users_online gauge\n"
+    for window, count in online_counts().items():
+        body += f'users_online{{window="{window}m"}} {count}\n'
+
+    mail_stats = get_mail_stats()
+    body += (
+        "# TYPE mail_sent_total counter\n"
+        f"mail_sent_total {mail_stats['sent']}\n"
+        "# TYPE mail_failed_total counter\n"
+        f"mail_failed_total {mail_stats['failed']}\n"
+        "# TYPE mail_last_failure_timestamp_seconds gauge\n"
+        f"mail_last_failure_timestamp_seconds {mail_stats['last_failure_at']:.0f}\n"
+        "# TYPE mail_send_seconds_total counter\n"
+        f"mail_send_seconds_total {mail_stats['seconds']:.3f}\n"
+        "# TYPE mail_pending gauge\n"
+        f"mail_pending {mail_stats['pending']}\n"
+    )
+
+    event_stats = get_event_log_stats()
+    body += (
+        "# TYPE auth_events_written_total counter\n"
+        f"auth_events_written_total {event_stats['written']}\n"
+        "# TYPE auth_events_dropped_total counter\n"
+        f"auth_events_dropped_total {event_stats['dropped']}\n"
+        "# TYPE auth_events_flushes_total counter\n"
+        f"auth_events_flushes_total {event_stats['flushes']}\n"
+        "# TYPE auth_events_buffered gauge\n"
+        f"auth_events_buffered {event_stats['buffered']}\n"
+    )
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@require_GET
+def slow_queries(request):
+    """
+    Медленные запросы и полные проходы этого процесса по отпечаткам SQL:
+    план, виды, места вызова. Самые тяжёлые по суммарному времени — первыми.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return JsonResponse(
+        {"slow_queries": slow_query_registry.snapshot()},
+        json_dumps_params={"ensure_ascii": False, "indent": 2},
+    )
+
+
+@require_GET
+def online_users(request):
+    """
+    Примерное число пользователей онлайн за 5/15/60 минут (HyperLogLog).
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return JsonResponse({
+        "online": {f"{window}m": count for window, count in online_counts().items()},
+    })
@@ -1,6 +1,27 @@
+import hashlib
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.contrib.auth import logout
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import redirect
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
 
+from . import admission, db_wrappers
+from .db_router import end_request, is_pinned_to_primary, start_request
+from .instrumentation import record_cache, registry, start_sampling, stop_sampling, timed
+from .models import CapturedProfile
+from .page_cache import CSRF_PLACEHOLDER
+from .presence import record_activity
+from .profiling import arun_profiled, rotate_profiles, run_profiled, should_profile
+from .query_budget import budget_section, get_mode, report, start_logging, stop_logging
+from . import slow_queries
 from .services import create_or_update_user_session
 
 
@@ -12,39 +33,570 @@ class UserSessionMiddleware:
     - если пользователь не авторизован — ничего не делаем;
     - если авторизован:
         - пробуем продлить его сессию (create_if_missing=False);
-        - если сессия истекла → logout и редирект на стартовую страницу.
+        - если сессия истекла → logout и редирект на стартовую страницу;
+        - иначе отмечаем пользователя онлайн (presence.record_activity).
     - некоторые пути пропускаем (login, signup, logout, admin), чтобы не ловить странные кейсы.
+
+    Под ASGI пользователь загружается через request.auser(), а проверка
+    сессии (синхронный ORM) выполняется одним вызовом sync_to_async.
     """
 
+    sync_capable = True
+    async_capable = True
+
+    # пути, для которых мы не трогаем сессию
+    skip_prefixes = (
+        "/admin/",
+        "/static/",
+        "/media/",
+    )
+    skip_exact = (
+        "/login/",
+        "/signup/",
+        "/logout/",
+    )
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _skipped(self, path):
+        return any(path.startswith(p) for p in self.skip_prefixes) or path in self.skip_exact
+
+    def _check_session(self, request, user):
+        """
+        None — всё в порядке, иначе ответ (редирект после logout).
+        """
+        with timed("user_session"), budget_section("user_session_middleware"):
+            session_obj = create_or_update_user_session(
+                request,
+                user,
+                create_if_missing=False,
+            )
+        if session_obj is None:
+            logout(request)
+            return redirect("start_page:start_page")
+        record_activity(user.pk)
+        return None
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # проверяем только для авторизованных
-        if request.user.is_authenticated:
-            path = request.path
-
-            # пути, для которых мы не трогаем сессию
-            skip_prefixes = (
-                "/admin/",
-                "/static/",
-                "/media/",
+        if request.user.is_authenticated and not self._skipped(request.path):
+            response = self._check_session(request, request.user)
+            if response is not None:
+                return response
+
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self._skipped(request.path):
+            user = await request.auser()
+            if user.is_authenticated:
+                response = await sync_to_async(self._check_session)(request, user)
+                if response is not None:
+                    return response
+
+        return await self.get_response(request)
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных посетителей (start_page, login, signup на GET).
+
+    Логика:
+    - кэшируем только GET/HEAD без query string и только для видов из
+      ANONYMOUS_PAGE_CACHE_VIEWS;
+    - если у запроса есть cookie сессии — это (возможно) авторизованный
+      пользователь, кэш не используем;
+    - в кэше лежит HTML с заглушкой вместо CSRF-токена, токен подставляется
+      на каждый запрос, так что сессии и база не трогаются вовсе;
+    - ETag зависит и от страницы, и от CSRF-cookie клиента: после смены токена
+      браузер получит новую страницу, а не 304 со старым токеном.
+      Поэтому 304 — только по совпадению ETag: Last-Modified не отдаём,
+      If-Modified-Since про CSRF-cookie ничего не знает.
+
+    Стоит последним в MIDDLEWARE, чтобы ответы из кэша проходили через
+    остальные middleware (CSRF-cookie, X-Frame-Options и т.д.).
+
+    Под ASGI и __call__, и process_view асинхронные (кэш через aget/aset):
+    Django берёт process_view с экземпляра, поэтому в __init__ он
+    подменяется асинхронным вариантом.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        key = getattr(request, "_anonymous_page_cache_key", None)
+        if key is not None:
+            entry = self._new_entry(response, request.user)
+            if entry is not None:
+                cache.set(key, entry, getattr(settings, "ANONYMOUS_PAGE_CACHE_TIMEOUT", 600))
+                self._apply_validators(request, response, entry)
+            self._insert_csrf_token(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        key = getattr(request, "_anonymous_page_cache_key", None)
+        if key is not None:
+            entry = self._new_entry(response, await request.auser())
+            if entry is not None:
+                await cache.aset(key, entry, getattr(settings, "ANONYMOUS_PAGE_CACHE_TIMEOUT", 600))
+                self._apply_validators(request, response, entry)
+            self._insert_csrf_token(request, response)
+        return response
+
+    @staticmethod
+    def _new_entry(response, user):
+        if response.status_code != 200 or response.streaming or user.is_authenticated:
+            return None
+        content = response.content
+        return {
+            "content": content,
+            "content_type": response.headers.get("Content-Type"),
+            "content_hash": hashlib.md5(content).hexdigest(),
+        }
+
+    @staticmethod
+    def _insert_csrf_token(request, response):
+        if not response.streaming:
+            response.content = response.content.replace(
+                CSRF_PLACEHOLDER.encode(), get_token(request).encode()
             )
-            skip_exact = (
-                "/login/",
-                "/signup/",
-                "/logout/",
+
+    @staticmethod
+    def _cache_key(request):
+        if request.method not in ("GET", "HEAD") or request.GET:
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+
+        view_name = request.resolver_match.view_name
+        if view_name not in getattr(settings, "ANONYMOUS_PAGE_CACHE_VIEWS", ()):
+            return None
+
+        # язык в ключ не входит: LocaleMiddleware не подключён, язык у всех один
+        return f"anonymous_page:{view_name}"
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key = self._cache_key(request)
+        if key is None:
+            return None
+        return self._cached_response(request, key, cache.get(key))
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        key = self._cache_key(request)
+        if key is None:
+            return None
+        return self._cached_response(request, key, await cache.aget(key))
+
+    def _cached_response(self, request, key, entry):
+        record_cache(hit=entry is not None)
+        if entry is None:
+            # промах: вид отрендерит шаблон с заглушкой, в __call__ положим его в кэш
+            request._anonymous_page_cache_key = key
+            request._page_cache_csrf_placeholder = True
+            return None
+
+        etag = self._etag(request, entry)
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return response
+
+        content = entry["content"].replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+        response = HttpResponse(content, content_type=entry["content_type"])
+        self._apply_validators(request, response, entry)
+        return response
+
+    @staticmethod
+    def _etag(request, entry):
+        csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+        if not csrf_cookie:
+            return None
+        digest = hashlib.md5(f"{entry['content_hash']}:{csrf_cookie}".encode()).hexdigest()
+        return f'"{digest}"'
+
+    def _apply_validators(self, request, response, entry):
+        etag = self._etag(request, entry)
+        if etag is not None:
+            response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+
+
+class PrimaryPinningMiddleware:
+    """
+    Read-your-writes для роутера реплик.
+
+    - в начале запроса сбрасываем закрепление за основной базой;
+    - если запрос что-то записал, ставим короткоживущую cookie: следующие
+      запросы в течение DATABASE_REPLICA_PIN_SECONDS (пока реплика догоняет)
+      тоже читают из основной базы.
+
+    Стоит первым в MIDDLEWARE, чтобы покрыть и чтение сессии.
+    """
+
+    cookie_name = "db_pin_primary"
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = start_request(pinned=self.cookie_name in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            wrote = is_pinned_to_primary()
+        finally:
+            end_request(token)
+        return self._pin(response, wrote)
+
+    async def __acall__(self, request):
+        # запись в потоке sync_to_async ставит признак в копии контекста,
+        # asgiref возвращает его обратно — здесь он виден
+        token = start_request(pinned=self.cookie_name in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+            wrote = is_pinned_to_primary()
+        finally:
+            end_request(token)
+        return self._pin(response, wrote)
+
+    def _pin(self, response, wrote):
+        if wrote:
+            response.set_cookie(
+                self.cookie_name,
+                "1",
+                max_age=getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5),
+                httponly=True,
+                samesite="Lax",
             )
+        return response
 
-            if not any(path.startswith(p) for p in skip_prefixes) and path not in skip_exact:
-                session_obj = create_or_update_user_session(
-                    request,
-                    request.user,
-                    create_if_missing=False,
-                )
-                if session_obj is None:
-                    logout(request)
-                    return redirect("start_page:start_page")
 
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+class PerformanceMiddleware:
+    """
+    Замеры производительности запросов.
+
+    - для каждого запроса: время ответа в гистограмму по имени URL;
+    - для доли PERF_SAMPLE_RATE запросов дополнительно: число и время SQL,
+      попадания в кэш, время шаблонов/почты/UserSessionMiddleware —
+      всё это уходит в заголовок Server-Timing и в суммы метрик.
+    Метрики отдаются в формате Prometheus на /metrics/.
+
+    Стоит первым в MIDDLEWARE, чтобы учитывать время всех остальных.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "PERF_METRICS_ENABLED", True)
+        self.sample_rate = getattr(settings, "PERF_SAMPLE_RATE", 0.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        timings = None
+        if self._sampled():
+            token, timings = start_sampling()
+            try:
+                with db_wrappers.execute_wrapper(timings.db_wrapper):
+                    response = self.get_response(request)
+            finally:
+                stop_sampling(token)
+        else:
+            response = self.get_response(request)
+        return self._observe(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        timings = None
+        if self._sampled():
+            token, timings = start_sampling()
+            try:
+                with db_wrappers.execute_wrapper(timings.db_wrapper):
+                    response = await self.get_response(request)
+            finally:
+                stop_sampling(token)
+        else:
+            response = await self.get_response(request)
+        return self._observe(request, response, time.perf_counter() - started, timings)
+
+    def _observe(self, request, response, total, timings):
+        if timings is not None:
+            response.headers["Server-Timing"] = timings.server_timing(total)
+
+        resolver_match = getattr(request, "resolver_match", None)
+        view_name = resolver_match.view_name if resolver_match else "unresolved"
+        registry.observe(view_name, total, timings)
+        return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Защита от всплесков на дорогих видах (хэширование пароля при входе,
+    регистрации, смене пароля).
+
+    Для видов из settings.ADMISSION_CONTROL ограничиваем число одновременных
+    запросов в процессе и длину очереди ожидания. Кто не поместился в очередь
+    или не дождался за timeout, сразу получает 503 с Retry-After; AJAX-виды
+    ("json": True) получают JSON в обычном формате {"ok": False, ...}.
+    Так перегрузка входа не занимает все потоки и остальной сайт отвечает как обычно.
+
+    Стоит сразу после PerformanceMiddleware — до загрузки сессии и пользователя.
+    Поддерживает и WSGI, и ASGI (ожидание в очереди не блокирует event loop).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        admission.build_limiters()
+        if not getattr(settings, "ADMISSION_CONTROL", {}):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.methods = getattr(settings, "ADMISSION_CONTROL_METHODS", ("POST",))
+        self.retry_after = getattr(settings, "ADMISSION_RETRY_AFTER", 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _limiter(self, request):
+        if request.method not in self.methods:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return admission.get_limiter(match.view_name)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        limiter = self._limiter(request)
+        if limiter is None:
+            return self.get_response(request)
+
+        shed_reason = limiter.acquire()
+        if shed_reason is not None:
+            return self._shed(limiter)
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release()
+
+    async def __acall__(self, request):
+        limiter = self._limiter(request)
+        if limiter is None:
+            return await self.get_response(request)
+
+        shed_reason = await limiter.aacquire()
+        if shed_reason is not None:
+            return self._shed(limiter)
+        try:
+            return await self.get_response(request)
+        finally:
+            limiter.arelease()
+
+    def _shed(self, limiter):
+        options = getattr(settings, "ADMISSION_CONTROL", {}).get(limiter.name, {})
+        message = f"Сервер перегружен. Попробуйте через {self.retry_after} секунд."
+        if options.get("json"):
+            response = JsonResponse(
+                {"ok": False, "code": "overloaded", "error": message, "retry_after": self.retry_after},
+                status=503,
+            )
+        else:
+            response = HttpResponse(message, status=503, content_type="text/plain; charset=utf-8")
+        response["Retry-After"] = str(self.retry_after)
+        return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Проверка бюджета SQL-запросов на запрос.
+
+    Бюджет вида задаётся декоратором @query_budget(n) или в
+    settings.QUERY_BUDGETS по имени URL; считаются все запросы,
+    включая middleware. Режим — settings.QUERY_BUDGET_MODE (off/log/raise).
+    Под ASGI считаются и запросы, выполненные в потоках sync_to_async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if get_mode() == "off":
+            return self.get_response(request)
+
+        token, log = start_logging()
+        try:
+            with db_wrappers.execute_wrapper(log):
+                response = self.get_response(request)
+        finally:
+            stop_logging(token)
+        self._check(request, log)
+        return response
+
+    async def __acall__(self, request):
+        if get_mode() == "off":
+            return await self.get_response(request)
+
+        token, log = start_logging()
+        try:
+            with db_wrappers.execute_wrapper(log):
+                response = await self.get_response(request)
+        finally:
+            stop_logging(token)
+        self._check(request, log)
+        return response
+
+    @staticmethod
+    def _check(request, log):
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match is not None:
+            budget = getattr(settings, "QUERY_BUDGETS", {}).get(
+                resolver_match.view_name,
+                getattr(resolver_match.func, "query_budget", None),
+            )
+            if budget is not None:
+                report(resolver_match.view_name, budget, log)
+
+
+class SlowQueryMiddleware:
+    """
+    Журнал медленных SQL-запросов с планами (см. slow_queries.SlowQueryWrapper):
+    в лог start_page.slow_queries, сводка по отпечаткам — на /metrics/ и
+    /metrics/slow-queries/.
+    При SLOW_QUERY_LOG_ENABLED=False middleware не подключается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SLOW_QUERY_LOG_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = slow_queries.start_request(request)
+        try:
+            with db_wrappers.execute_wrapper(slow_queries.SlowQueryWrapper()):
+                return self.get_response(request)
+        finally:
+            slow_queries.end_request(token)
+
+    async def __acall__(self, request):
+        token = slow_queries.start_request(request)
+        try:
+            with db_wrappers.execute_wrapper(slow_queries.SlowQueryWrapper()):
+                return await self.get_response(request)
+        finally:
+            slow_queries.end_request(token)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование отдельных запросов в продакшене.
+
+    Запрос профилируется, если пришёл с подписанным X-Profile-Token,
+    попал в долю PROFILING_SAMPLE_RATE или его путь включён из админки.
+    Профиль пишется в PROFILING_DIR (хранятся последние PROFILING_MAX_FILES)
+    и виден в админке (CapturedProfile).
+    При PROFILING_ENABLED=False middleware вообще не подключается.
+
+    Под ASGI профилируется поток event loop на время запроса — в профиль
+    попадают и другие запросы этого процесса, выполнявшиеся параллельно.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile(request):
+            return self.get_response(request)
+
+        response, file_name, duration_ms, samples = run_profiled(self.get_response, request)
+        self._save(request, response, file_name, duration_ms, samples)
+        return response
+
+    async def __acall__(self, request):
+        # should_profile обращается к кэшу не чаще раза в секунду — без sync_to_async
+        if not should_profile(request):
+            return await self.get_response(request)
+
+        response, file_name, duration_ms, samples = await arun_profiled(self.get_response, request)
+        await sync_to_async(self._save)(request, response, file_name, duration_ms, samples)
+        return response
+
+    @staticmethod
+    def _save(request, response, file_name, duration_ms, samples):
+        resolver_match = getattr(request, "resolver_match", None)
+        CapturedProfile.objects.create(
+            path=request.path[:255],
+            view_name=resolver_match.view_name if resolver_match else "",
+            method=request.method,
+            status_code=response.status_code,
+            engine=getattr(settings, "PROFILING_ENGINE", "sampling"),
+            duration_ms=duration_ms,
+            samples=samples,
+            file_name=file_name,
+        )
+        rotate_profiles()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('start_page', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapturedProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('path', models.CharField(max_length=255)),
+                ('view_name', models.CharField(blank=True, max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('engine', models.CharField(choices=[('sampling', 'Сэмплирующий (folded stacks)'), ('cprofile', 'cProfile')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('file_name', models.CharField(max_length=255)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
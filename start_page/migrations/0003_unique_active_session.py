@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:29
+
+from django.db import migrations, models
+
+
+def deactivate_duplicate_sessions(apps, schema_editor):
+    """
+    Перед ограничением оставляем активной только самую позднюю сессию
+    каждого пользователя, остальные дубли (следствие гонки) гасим.
+    """
+    UserSession = apps.get_model('start_page', 'UserSession')
+    db_alias = schema_editor.connection.alias
+    sessions = UserSession.objects.using(db_alias)
+
+    duplicated_users = list(
+        sessions.filter(is_active=True)
+        .order_by()
+        .values('user_id')
+        .annotate(active=models.Count('id'))
+        .filter(active__gt=1)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in duplicated_users:
+        active = sessions.filter(user_id=user_id, is_active=True).order_by('-start_time', '-id')
+        keep_id = active.values_list('id', flat=True).first()
+        active.exclude(id=keep_id).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('start_page', '0002_capturedprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_duplicate_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usersession',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user',), name='unique_active_session_per_user'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_activity_summary(apps, schema_editor):
+    """
+    Начальные значения сводки — одним UPDATE с подзапросами
+    (дальше их поддерживает services.py, пересчёт — repair_user_activity).
+    """
+    CustomUser = apps.get_model('start_page', 'CustomUser')
+    UserSession = apps.get_model('start_page', 'UserSession')
+    PasswordResetRequest = apps.get_model('start_page', 'PasswordResetRequest')
+    db_alias = schema_editor.connection.alias
+
+    sessions = UserSession.objects.using(db_alias).filter(user=models.OuterRef('pk')).order_by().values('user')
+    resets = (
+        PasswordResetRequest.objects.using(db_alias)
+        .filter(user=models.OuterRef('pk'), is_used=True)
+        .order_by().values('user')
+    )
+    CustomUser.objects.using(db_alias).update(
+        active_sessions_count=Coalesce(
+            models.Subquery(sessions.filter(is_active=True).annotate(n=models.Count('id')).values('n')), 0
+        ),
+        total_sessions_count=Coalesce(
+            models.Subquery(sessions.annotate(n=models.Count('id')).values('n')), 0
+        ),
+        last_seen_at=models.Subquery(sessions.annotate(last=models.Max('updated_at')).values('last')),
+        last_password_reset_at=models.Subquery(resets.annotate(last=models.Max('created_at')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('start_page', '0003_unique_active_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='active_sessions_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Активных сессий'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='last_password_reset_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сброс пароля'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Был на сайте'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='total_sessions_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Всего сессий'),
+        ),
+        migrations.RunPython(backfill_activity_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('start_page', '0004_user_activity_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Вход / новая сессия'), (2, 'Выход'), (3, 'Сессия продлена'), (4, 'Сессия истекла'), (5, 'Код сброса отправлен'), (6, 'Код сброса подтверждён'), (7, 'Пароль сброшен')])),
+                ('user_id', models.PositiveIntegerField()),
+                ('session_id', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user_id', 'created_at'], name='authevent_user_time'), models.Index(fields=['created_at'], name='authevent_time')],
+            },
+        ),
+    ]
@@ -0,0 +1,110 @@
+import hashlib
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def _session_key_hash(session_key):
+    # копия start_page.models.session_key_hash: миграция не должна зависеть от кода приложения
+    digest = hashlib.blake2b(session_key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def hash_session_keys(apps, schema_editor):
+    """
+    Заменяем строковые ключи сессий хэшами пачками по id,
+    чтобы не держать всю таблицу в памяти.
+    """
+    UserSession = apps.get_model('start_page', 'UserSession')
+    sessions = UserSession.objects.using(schema_editor.connection.alias)
+
+    last_id = 0
+    while True:
+        batch = list(sessions.filter(id__gt=last_id).order_by('id').only('id', 'session_key')[:2000])
+        if not batch:
+            break
+        for session in batch:
+            session.session_key_hash = _session_key_hash(session.session_key)
+        sessions.bulk_update(batch, ['session_key_hash'])
+        last_id = batch[-1].id
+
+
+def seed_auth_events(apps, schema_editor):
+    """
+    updated_at удаляется — последнюю активность сессии переносим в журнал:
+    вход (start_time) и продление (updated_at) для каждой сессии,
+    у которой ещё нет событий. Завершённая раньше срока сессия (выход)
+    получает и событие выхода в end_time — иначе аналитика посчитала бы
+    её концом последнее продление + SESSION_LIFETIME.
+    Константы — как в AuthEvent и start_page.services.
+    """
+    UserSession = apps.get_model('start_page', 'UserSession')
+    AuthEvent = apps.get_model('start_page', 'AuthEvent')
+    alias = schema_editor.connection.alias
+    sessions = UserSession.objects.using(alias)
+    events = AuthEvent.objects.using(alias)
+    login, logout, session_extended = 1, 2, 3
+    session_lifetime = timedelta(hours=24)
+
+    last_id = 0
+    while True:
+        batch = list(
+            sessions.filter(id__gt=last_id).order_by('id').only('id', 'user_id', 'start_time', 'end_time', 'is_active', 'updated_at')[:2000]
+        )
+        if not batch:
+            break
+        logged = set(
+            events.filter(session_id__in=[session.id for session in batch]).values_list('session_id', flat=True)
+        )
+        new_events = []
+        for session in batch:
+            if session.id in logged:
+                continue
+            new_events.append(AuthEvent(
+                created_at=session.start_time, kind=login, user_id=session.user_id, session_id=session.id,
+            ))
+            if session.updated_at > session.start_time:
+                new_events.append(AuthEvent(
+                    created_at=session.updated_at, kind=session_extended,
+                    user_id=session.user_id, session_id=session.id,
+                ))
+            last_seen = max(session.start_time, session.updated_at)
+            if not session.is_active and session.end_time < last_seen + session_lifetime:
+                # выход записывается без id сессии, как в end_user_sessions
+                new_events.append(AuthEvent(created_at=session.end_time, kind=logout, user_id=session.user_id))
+        events.bulk_create(new_events)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('start_page', '0005_auth_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='session_key_hash',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_session_keys, migrations.RunPython.noop),
+        migrations.RunPython(seed_auth_events, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='usersession',
+            name='session_key',
+        ),
+        migrations.RemoveField(
+            model_name='usersession',
+            name='duration',
+        ),
+        migrations.RemoveField(
+            model_name='usersession',
+            name='created_at',
+        ),
+        migrations.RemoveField(
+            model_name='usersession',
+            name='updated_at',
+        ),
+    ]
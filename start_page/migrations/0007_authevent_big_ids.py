@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('start_page', '0006_slim_usersession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='authevent',
+            name='session_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='authevent',
+            name='user_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.utils import timezone
@@ -32,6 +34,16 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, username, password, **extra_fields)
 
 
+class UserSessionQuerySet(models.QuerySet):
+    def with_duration(self):
+        return self.annotate(
+            session_duration=models.ExpressionWrapper(
+                models.F("end_time") - models.F("start_time"),
+                output_field=models.DurationField(),
+            )
+        )
+
+
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     """
     Кастомная модель пользователя сайта.
@@ -46,6 +58,14 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
 
+    # сводка активности: денормализована, чтобы список в админке
+    # сортировался и фильтровался без JOIN/агрегатов по UserSession.
+    # Ведётся в services.py и в сбросе пароля, пересчёт — repair_user_activity
+    last_seen_at = models.DateTimeField("Был на сайте", null=True, blank=True, db_index=True)
+    active_sessions_count = models.PositiveIntegerField("Активных сессий", default=0)
+    total_sessions_count = models.PositiveIntegerField("Всего сессий", default=0, db_index=True)
+    last_password_reset_at = models.DateTimeField("Последний сброс пароля", null=True, blank=True)
+
     objects = CustomUserManager()
 
     USERNAME_FIELD = "email"
@@ -55,35 +75,59 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+def session_key_hash(session_key):
+    """
+    64-битный хэш ключа сессии Django (знаковый — помещается в BIGINT).
+    В UserSession хранится он, а не 40-символьная строка.
+    """
+    digest = hashlib.blake2b(session_key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
 class UserSession(models.Model):
     """
     Лог сессий пользователя:
     - user: к какому пользователю относится
-    - session_key: ключ сессии Django
+    - session_key_hash: 64-битный хэш ключа сессии Django (session_key_hash())
     - start_time: когда сессия началась
     - end_time: когда должна закончиться
-    - duration: длительность (end_time - start_time)
     - is_active: флаг "активна ли сессия сейчас"
+
+    Длительность не хранится: свойство duration или
+    UserSession.objects.with_duration() (end_time - start_time в SQL).
+    История продлений — в журнале событий (AuthEvent).
+
+    Активная сессия у пользователя максимум одна — это гарантирует
+    база (частичный уникальный индекс unique_active_session_per_user).
     """
     user = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
         related_name="sessions",
     )
-    session_key = models.CharField(max_length=40, db_index=True)
+    session_key_hash = models.BigIntegerField()
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
-    duration = models.DurationField()
     is_active = models.BooleanField(default=True)
 
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    objects = UserSessionQuerySet.as_manager()
 
     class Meta:
         ordering = ["-start_time"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(is_active=True),
+                name="unique_active_session_per_user",
+            ),
+        ]
 
     def __str__(self):
-        return f"Session {self.session_key} for {self.user.email}"
+        return f"Session {self.pk} for user {self.user_id}"
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
 
 
 class PasswordResetRequest(models.Model):
@@ -113,4 +157,78 @@ class PasswordResetRequest(models.Model):
 
     @property
     def is_expired(self):
-        return timezone.now() >= self.expires_at
\ No newline at end of file
+        return timezone.now() >= self.expires_at
+
+
+class CapturedProfile(models.Model):
+    """
+    Снятый профиль запроса (файл лежит в settings.PROFILING_DIR):
+    - path / view_name / method: какой запрос профилировали
+    - engine: sampling (folded stacks для flamegraph) или cprofile (.prof)
+    - duration_ms: длительность запроса под профайлером
+    - samples: сколько стеков снял сэмплер
+    """
+    ENGINE_CHOICES = (
+        ("sampling", "Сэмплирующий (folded stacks)"),
+        ("cprofile", "cProfile"),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    path = models.CharField(max_length=255)
+    view_name = models.CharField(max_length=255, blank=True)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    engine = models.CharField(max_length=10, choices=ENGINE_CHOICES)
+    duration_ms = models.FloatField()
+    samples = models.PositiveIntegerField(default=0)
+    file_name = models.CharField(max_length=255)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class AuthEvent(models.Model):
+    """
+    Журнал событий сессий и авторизации — только добавление, без UPDATE.
+    Пишется пачками из буфера в памяти (start_page.event_log):
+    - created_at: когда событие произошло (а не когда записано)
+    - kind: тип события (KIND_CHOICES)
+    - user_id: id пользователя — без внешнего ключа, журнал переживает удаление
+    - session_id: id UserSession для событий сессии
+    """
+    LOGIN = 1
+    LOGOUT = 2
+    SESSION_EXTENDED = 3
+    SESSION_EXPIRED = 4
+    RESET_CODE_SENT = 5
+    RESET_CODE_VERIFIED = 6
+    PASSWORD_RESET = 7
+
+    KIND_CHOICES = (
+        (LOGIN, "Вход / новая сессия"),
+        (LOGOUT, "Выход"),
+        (SESSION_EXTENDED, "Сессия продлена"),
+        (SESSION_EXPIRED, "Сессия истекла"),
+        (RESET_CODE_SENT, "Код сброса отправлен"),
+        (RESET_CODE_VERIFIED, "Код сброса подтверждён"),
+        (PASSWORD_RESET, "Пароль сброшен"),
+    )
+
+    created_at = models.DateTimeField()
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    # BigAutoField у CustomUser и UserSession — id больше 2**31
+    user_id = models.PositiveBigIntegerField()
+    session_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user_id", "created_at"], name="authevent_user_time"),
+            models.Index(fields=["created_at"], name="authevent_time"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} (user {self.user_id})"
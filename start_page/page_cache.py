@@ -0,0 +1,104 @@
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .instrumentation import record_cache
+
+# Вместо настоящего CSRF-токена в закэшированный HTML кладём заглушку,
+# а при отдаче подставляем токен текущего запроса.
+CSRF_PLACEHOLDER = "__page_cache_csrf_token__"
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+_VERSION_KEY = "user_version:{user_id}"
+_PAGE_KEY = "user_page:{template}:{user_id}:{version}"
+_STATS_KEYS = {
+    "hits": "user_page_stats:hits",
+    "misses": "user_page_stats:misses",
+    "render_ms_saved": "user_page_stats:render_ms_saved",
+}
+
+
+def get_user_version(user_id):
+    """
+    Текущая версия данных пользователя (для ключей кэша и ETag).
+    Если версии в кэше нет (первый запрос или её вытеснили) —
+    начинаем с метки времени в мс, чтобы новая версия не совпала ни с одной старой.
+    """
+    key = _VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_user_version(user_id):
+    """
+    Увеличиваем версию пользователя — все закэшированные страницы
+    с предыдущей версией перестают использоваться.
+    """
+    key = _VERSION_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # ключа нет — следующий get_user_version создаст новую версию
+        return get_user_version(user_id)
+
+
+def _incr_stat(name, delta=1):
+    key = _STATS_KEYS[name]
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, delta)
+
+
+def get_page_cache_stats():
+    """
+    Счётчики кэша страниц: попадания, промахи, доля попаданий
+    и сколько миллисекунд рендера сэкономлено.
+    """
+    values = cache.get_many(_STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in _STATS_KEYS.items()}
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+    return stats
+
+
+def render_user_page(request, template_name, build_context=None):
+    """
+    Рендер страницы авторизованного пользователя с кэшированием.
+
+    Ключ кэша: шаблон + id пользователя + версия пользователя.
+    build_context вызывается только при промахе, поэтому контекст
+    (например, маскированный email) не пересчитывается на каждый запрос.
+    В кэше лежит HTML с заглушкой вместо CSRF-токена и время рендера.
+    """
+    user_id = request.user.pk
+    version = get_user_version(user_id)
+    key = _PAGE_KEY.format(template=template_name, user_id=user_id, version=version)
+
+    entry = cache.get(key)
+    record_cache(hit=entry is not None)
+    if entry is not None:
+        html, render_ms = entry
+        _incr_stat("hits")
+        _incr_stat("render_ms_saved", int(render_ms))
+    else:
+        started = time.perf_counter()
+        context = build_context() if build_context else {}
+        context["csrf_token"] = CSRF_PLACEHOLDER
+        html = render_to_string(template_name, context, request=request)
+        render_ms = (time.perf_counter() - started) * 1000
+        cache.set(key, (html, render_ms), PAGE_CACHE_TIMEOUT)
+        _incr_stat("misses")
+
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(html)
@@ -1,14 +1,18 @@
 import random
 from datetime import timedelta
 
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
 from django.utils import timezone
 
-from .models import CustomUser, PasswordResetRequest
-from .validators import validate_email, validate_password
+from . import event_log
+from .idempotency import idempotent
+from .mail_dispatch import adispatch_mail
+from .models import AuthEvent, CustomUser, PasswordResetRequest
+from .query_budget import query_budget
+from .validators import USER_NOT_FOUND_MESSAGE, validate_email_format, validate_password
 
 
 PASSWORD_RESET_MESSAGES = {
@@ -46,11 +50,13 @@ def _get_cooldown_seconds(attempts_so_far):
         return 600
 
 
+@query_budget(8)
 @require_POST
-def password_reset_send_code(request):
+@idempotent
+async def password_reset_send_code(request):
     """
     Шаг 1: пользователь вводит email.
-    - Валидируем email (формат + домен + что пользователь существует).
+    - Валидируем email (формат + домен) и одним запросом достаём пользователя.
     - Создаём или обновляем PasswordResetRequest.
     - Отправляем код на почту.
     - В сессии сохраняем id пользователя, чтобы дальше не передавать email туда-сюда.
@@ -62,13 +68,16 @@ def password_reset_send_code(request):
     - 4-я и далее -> каждая через 10 минут.
 
     Счётчик и время последней попытки лежат в request.session.
+
+    Вид асинхронный: БД и сессия через async-API, письмо отправляется
+    в фоне (mail_dispatch) — ответ не ждёт почтовый сервер.
     """
     email = request.POST.get("email", "")
 
     # --- проверяем лимиты попыток ---
     now = timezone.now()
-    attempts = request.session.get("password_reset_attempts", 0)
-    last_at_str = request.session.get("password_reset_last_attempt_at")
+    attempts = await request.session.aget("password_reset_attempts", 0)
+    last_at_str = await request.session.aget("password_reset_last_attempt_at")
 
     if last_at_str:
         try:
@@ -96,22 +105,25 @@ def password_reset_send_code(request):
                 )
 
     try:
-        email_normalized = validate_email(email, type='login')
+        email_normalized = validate_email_format(email)
+        # существование и сам пользователь — одним запросом
+        try:
+            user = await CustomUser.objects.aget(email__iexact=email_normalized)
+        except CustomUser.DoesNotExist:
+            raise ValidationError(USER_NOT_FOUND_MESSAGE)
     except ValidationError as exc:
         return JsonResponse({"ok": False, "code": "email_error", "error": str(exc)}, status=400)
 
-    user = CustomUser.objects.get(email__iexact=email_normalized)
-
     # инвалидируем старые запросы
-    PasswordResetRequest.objects.filter(
+    await PasswordResetRequest.objects.filter(
         user=user,
         is_used=False,
-    ).update(is_used=True)
+    ).aupdate(is_used=True)
 
     code = _generate_reset_code()
     expires_at = now + timedelta(minutes=10)  # код действует 10 минут
 
-    reset_req = PasswordResetRequest.objects.create(
+    reset_req = await PasswordResetRequest.objects.acreate(
         user=user,
         code=code,
         expires_at=expires_at,
@@ -119,37 +131,40 @@ def password_reset_send_code(request):
 
     # обновляем данные попыток в сессии
     attempts += 1
-    request.session["password_reset_attempts"] = attempts
-    request.session["password_reset_last_attempt_at"] = now.isoformat()
+    await request.session.aset("password_reset_attempts", attempts)
+    await request.session.aset("password_reset_last_attempt_at", now.isoformat())
 
     # сохраняем в сессии, что этот пользователь сейчас проходит процедуру сброса
-    request.session["password_reset_user_id"] = user.id
-    request.session["password_reset_request_id"] = reset_req.id
-    request.session["password_reset_verified"] = False
+    await request.session.aset("password_reset_user_id", user.id)
+    await request.session.aset("password_reset_request_id", reset_req.id)
+    await request.session.aset("password_reset_verified", False)
 
-    # отправляем письмо
-    send_mail(
+    # отправляем письмо в фоне
+    await adispatch_mail(
         subject="Код для восстановления пароля",
         message=f"Ваш код для восстановления пароля: {code}\nКод действителен 10 минут.",
-        from_email=None,  # возьмётся DEFAULT_FROM_EMAIL из settings
         recipient_list=[user.email],
     )
 
+    await event_log.arecord(AuthEvent.RESET_CODE_SENT, user.id)
+
     # на фронт отдадим, сколько секунд ждать до следующей попытки
     next_cooldown = _get_cooldown_seconds(attempts_so_far=attempts)
     return JsonResponse({"ok": True, "cooldown_seconds": next_cooldown, "attempts": attempts})
 
 
+@query_budget(4)
 @require_POST
-def password_reset_verify_code(request):
+@idempotent
+async def password_reset_verify_code(request):
     """
     Шаг 2: пользователь вводит код из письма.
     - Берём user_id и request_id из сессии.
     - Проверяем, что код совпадает, не истёк, не использован.
     - Если всё ок — ставим флаг password_reset_verified=True в сессии.
     """
-    user_id = request.session.get("password_reset_user_id")
-    req_id = request.session.get("password_reset_request_id")
+    user_id = await request.session.aget("password_reset_user_id")
+    req_id = await request.session.aget("password_reset_request_id")
     code_input = request.POST.get("code", "").strip()
 
     if not user_id or not req_id:
@@ -159,7 +174,7 @@ def password_reset_verify_code(request):
         )
 
     try:
-        reset_req = PasswordResetRequest.objects.select_related("user").get(
+        reset_req = await PasswordResetRequest.objects.select_related("user").aget(
             id=req_id,
             user_id=user_id,
             is_used=False,
@@ -172,7 +187,7 @@ def password_reset_verify_code(request):
 
     if reset_req.is_expired:
         reset_req.is_used = True
-        reset_req.save(update_fields=["is_used"])
+        await reset_req.asave(update_fields=["is_used"])
         return JsonResponse(
             {"ok": False, "error": PASSWORD_RESET_MESSAGES["code_expired"]},
             status=400,
@@ -184,12 +199,15 @@ def password_reset_verify_code(request):
             status=400,
         )
 
-    request.session["password_reset_verified"] = True
+    await request.session.aset("password_reset_verified", True)
+    await event_log.arecord(AuthEvent.RESET_CODE_VERIFIED, user_id)
     return JsonResponse({"ok": True})
 
 
+@query_budget(6)
 @require_POST
-def password_reset_confirm(request):
+@idempotent
+async def password_reset_confirm(request):
     """
     Шаг 3: пользователь вводит новый пароль дважды.
     - Проверяем, что есть user_id + verified=True в сессии.
@@ -199,9 +217,9 @@ def password_reset_confirm(request):
     - Помечаем запрос как использованный.
     - Чистим данные восстановления из сессии.
     """
-    user_id = request.session.get("password_reset_user_id")
-    req_id = request.session.get("password_reset_request_id")
-    verified = request.session.get("password_reset_verified", False)
+    user_id = await request.session.aget("password_reset_user_id")
+    req_id = await request.session.aget("password_reset_request_id")
+    verified = await request.session.aget("password_reset_verified", False)
 
     if not user_id or not req_id or not verified:
         return JsonResponse(
@@ -219,16 +237,20 @@ def password_reset_confirm(request):
         )
 
     try:
-        validate_password(password1)
+        # валидатор синхронный — не выполняем его в event loop
+        await sync_to_async(validate_password)(password1)
     except ValidationError as exc:
         error_text = "; ".join(exc.messages)
         return JsonResponse({"ok": False, "error": error_text}, status=400)
 
-    user = CustomUser.objects.get(id=user_id)
-    user.set_password(password1)
-    user.save(update_fields=["password"])
+    user = await CustomUser.objects.aget(id=user_id)
+    # хэширование пароля — долгая работа CPU, не держим на ней event loop
+    await sync_to_async(user.set_password, thread_sensitive=False)(password1)
+    user.last_password_reset_at = timezone.now()
+    await user.asave(update_fields=["password", "last_password_reset_at"])
 
-    PasswordResetRequest.objects.filter(id=req_id).update(is_used=True)
+    await PasswordResetRequest.objects.filter(id=req_id).aupdate(is_used=True)
+    await event_log.arecord(AuthEvent.PASSWORD_RESET, user.id)
 
     # чистим данные восстановления
     for key in [
@@ -238,6 +260,6 @@ def password_reset_confirm(request):
         "password_reset_attempts",
         "password_reset_last_attempt_at",
     ]:
-        request.session.pop(key, None)
+        await request.session.apop(key, None)
 
     return JsonResponse({"ok": True})
\ No newline at end of file
@@ -0,0 +1,107 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import cache
+
+# HyperLogLog: 2^10 = 1024 однобайтовых регистра (1 КБ на минуту),
+# стандартная ошибка оценки ~1.04 / sqrt(1024) ≈ 3%
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+_HASH_BITS = 64
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+WINDOWS = (5, 15, 60)  # минуты
+
+_BUCKET_KEY = "presence:hll:{minute}"
+_BUCKET_TIMEOUT = (max(WINDOWS) + 2) * 60
+
+# дедупликация в процессе: пользователь учитывается раз в минуту,
+# в кэш пишем, только если вырос регистр
+_lock = threading.Lock()
+_local = {"minute": None, "users": set(), "registers": bytearray(REGISTERS)}
+
+
+def _current_minute():
+    return int(time.time() // 60)
+
+
+def _register_update(user_id):
+    """
+    (номер регистра, ранг): первые PRECISION бит хэша выбирают регистр,
+    ранг — позиция первой единицы в остальных битах.
+    """
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    index = value >> (_HASH_BITS - PRECISION)
+    rest = value & ((1 << (_HASH_BITS - PRECISION)) - 1)
+    rank = (_HASH_BITS - PRECISION) - rest.bit_length() + 1
+    return index, rank
+
+
+def _merge(target, registers):
+    target[:] = bytes(map(max, target, registers))
+
+
+def record_activity(user_id):
+    """
+    Отметить, что пользователь был активен в текущую минуту.
+    Чаще всего это проверка по множеству в памяти процесса, без обращения к кэшу.
+    """
+    minute = _current_minute()
+    index, rank = _register_update(user_id)
+
+    with _lock:
+        if _local["minute"] != minute:
+            _local.update(minute=minute, users=set(), registers=bytearray(REGISTERS))
+        if user_id in _local["users"]:
+            return
+        _local["users"].add(user_id)
+        if _local["registers"][index] >= rank:
+            return
+
+        key = _BUCKET_KEY.format(minute=minute)
+        stored = cache.get(key)
+        if stored:
+            _merge(_local["registers"], stored)
+        if _local["registers"][index] >= rank:
+            return
+        _local["registers"][index] = rank
+        # между get и set другой воркер мог записать свои регистры —
+        # тогда часть его обновлений потеряется; для приблизительного счётчика это допустимо
+        cache.set(key, bytes(_local["registers"]), _BUCKET_TIMEOUT)
+
+
+def estimate(registers):
+    """
+    Оценка числа различных пользователей по регистрам HyperLogLog
+    (с поправкой для малых значений — linear counting).
+    """
+    harmonic = sum(2.0 ** -register for register in registers)
+    result = _ALPHA * REGISTERS * REGISTERS / harmonic
+    zeros = registers.count(0)
+    if result <= 2.5 * REGISTERS and zeros:
+        result = REGISTERS * math.log(REGISTERS / zeros)
+    return round(result)
+
+
+def online_counts(windows=WINDOWS):
+    """
+    Примерное число пользователей онлайн за последние 5/15/60 минут:
+    {окно в минутах: количество}. Одно чтение get_many и объединение
+    не более чем max(windows) минутных скетчей — время и память постоянны.
+    """
+    minute = _current_minute()
+    keys = [_BUCKET_KEY.format(minute=minute - offset) for offset in range(max(windows))]
+    stored = cache.get_many(keys)
+
+    counts = {}
+    merged = bytearray(REGISTERS)
+    windows = sorted(windows)
+    for offset, key in enumerate(keys, start=1):
+        if key in stored:
+            _merge(merged, stored[key])
+        if offset in windows:
+            counts[offset] = estimate(merged)
+    return counts
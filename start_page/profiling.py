@@ -0,0 +1,247 @@
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from .models import CapturedProfile
+
+PROFILE_HEADER = "X-Profile-Token"
+_TOKEN_SALT = "start_page.profiling"
+_ARMED_KEY = "profiling:armed_paths"
+
+# как часто процесс перечитывает из кэша пути, включённые из админки
+_ARMED_REFRESH_SECONDS = 1.0
+_armed_local = {"paths": {}, "loaded_at": 0.0}
+
+
+def make_profile_token():
+    """
+    Подписанный токен для заголовка X-Profile-Token:
+    запрос с ним профилируется независимо от доли сэмплирования.
+    """
+    return signing.TimestampSigner(salt=_TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def _token_valid(token):
+    try:
+        signing.TimestampSigner(salt=_TOKEN_SALT).unsign(
+            token, max_age=getattr(settings, "PROFILING_TOKEN_MAX_AGE", 3600)
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _armed_counter_key(path):
+    return f"{_ARMED_KEY}:{hashlib.md5(path.encode()).hexdigest()}"
+
+
+def arm_path(path, count):
+    """
+    Включить профилирование следующих count запросов к path (из админки).
+    Сколько осталось — отдельный счётчик на путь (cache.decr атомарен),
+    а в _ARMED_KEY — только список путей, чтобы остальные запросы
+    не обращались к кэшу.
+    """
+    cache.set(_armed_counter_key(path), count, timeout=None)
+    armed = cache.get(_ARMED_KEY) or {}
+    armed[path] = True
+    cache.set(_ARMED_KEY, armed, timeout=None)
+    # в этом процессе изменения видны сразу, в остальных — после обновления
+    _armed_local["paths"] = armed
+    _armed_local["loaded_at"] = time.monotonic()
+
+
+def _disarm(path):
+    armed = cache.get(_ARMED_KEY) or {}
+    armed.pop(path, None)
+    cache.set(_ARMED_KEY, armed, timeout=None)
+    cache.delete(_armed_counter_key(path))
+    _armed_local["paths"] = armed
+
+
+def _take_armed(path):
+    now = time.monotonic()
+    if now - _armed_local["loaded_at"] > _ARMED_REFRESH_SECONDS:
+        _armed_local["paths"] = cache.get(_ARMED_KEY) or {}
+        _armed_local["loaded_at"] = now
+
+    if path not in _armed_local["paths"]:
+        return False
+
+    # decr — одна атомарная операция: два параллельных запроса не займут
+    # одно и то же место, и счётчик не потеряет уменьшение
+    try:
+        remaining = cache.decr(_armed_counter_key(path))
+    except ValueError:  # счётчика нет — путь уже выключен
+        remaining = -1
+    if remaining <= 0:
+        _disarm(path)
+    return remaining >= 0
+
+
+def should_profile(request):
+    """
+    Профилируем запрос, если:
+    - в нём валидный подписанный X-Profile-Token;
+    - путь включён из админки (осталось N запросов);
+    - или он попал в долю PROFILING_SAMPLE_RATE.
+    """
+    token = request.headers.get(PROFILE_HEADER)
+    if token and _token_valid(token):
+        return True
+
+    sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+    if sample_rate and random.random() < sample_rate:
+        return True
+
+    return _take_armed(request.path)
+
+
+class StackSampler:
+    """
+    Статистический профайлер: отдельный поток раз в interval секунд снимает
+    стек потока запроса. Результат — "folded stacks" (формат flamegraph.pl,
+    speedscope, inferno): "корень;...;лист количество".
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                name = f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+                stack.append(name.replace(";", ":").replace(" ", "_"))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        lines = (f"{stack} {count}" for stack, count in self.stacks.most_common())
+        path.write_text("\n".join(lines) + "\n")
+
+
+def profile_dir():
+    path = Path(getattr(settings, "PROFILING_DIR", settings.BASE_DIR / "profiles"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def run_profiled(get_response, request):
+    """
+    Выполнить запрос под профайлером и записать результат в PROFILING_DIR.
+    Возвращает (response, имя файла, длительность в мс, число сэмплов).
+    """
+    engine = getattr(settings, "PROFILING_ENGINE", "sampling")
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    started = time.perf_counter()
+
+    if engine == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(get_response, request)
+        duration_ms = (time.perf_counter() - started) * 1000
+        file_name = f"{stem}.prof"
+        profiler.dump_stats(profile_dir() / file_name)
+        samples = 0
+    else:
+        sampler = StackSampler(
+            threading.get_ident(), getattr(settings, "PROFILING_INTERVAL", 0.005)
+        )
+        sampler.start()
+        try:
+            response = get_response(request)
+        finally:
+            sampler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        file_name = f"{stem}.folded"
+        sampler.write(profile_dir() / file_name)
+        samples = sampler.samples
+
+    return response, file_name, duration_ms, samples
+
+
+async def arun_profiled(get_response, request):
+    """
+    run_profiled для ASGI: профилируется поток event loop, пока запрос
+    выполняется (вместе с тем, что loop делает параллельно). SQL из
+    sync_to_async идёт в другом потоке — в профиле это ожидание.
+    """
+    engine = getattr(settings, "PROFILING_ENGINE", "sampling")
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    started = time.perf_counter()
+
+    if engine == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = await get_response(request)
+        finally:
+            profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+        file_name = f"{stem}.prof"
+        profiler.dump_stats(profile_dir() / file_name)
+        samples = 0
+    else:
+        sampler = StackSampler(
+            threading.get_ident(), getattr(settings, "PROFILING_INTERVAL", 0.005)
+        )
+        sampler.start()
+        try:
+            response = await get_response(request)
+        finally:
+            sampler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        file_name = f"{stem}.folded"
+        sampler.write(profile_dir() / file_name)
+        samples = sampler.samples
+
+    return response, file_name, duration_ms, samples
+
+
+def rotate_profiles():
+    """
+    Оставляем только PROFILING_MAX_FILES последних профилей (файлы + записи).
+    """
+    max_files = getattr(settings, "PROFILING_MAX_FILES", 50)
+    stale = list(
+        CapturedProfile.objects.order_by("-created_at").values_list("id", "file_name")[max_files:]
+    )
+    if not stale:
+        return
+
+    directory = profile_dir()
+    for _, file_name in stale:
+        (directory / file_name).unlink(missing_ok=True)
+    CapturedProfile.objects.filter(id__in=[pk for pk, _ in stale]).delete()
@@ -0,0 +1,101 @@
+import contextvars
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger("start_page.query_budget")
+
+_current = contextvars.ContextVar("query_budget_log", default=None)
+
+# управление транзакциями — не запросы к данным, в бюджет не считаем
+_TRANSACTION_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Декоратор вида: сколько SQL-запросов разрешено на весь запрос
+    (вместе с middleware). Проверяет QueryBudgetMiddleware.
+    Значение можно переопределить в settings.QUERY_BUDGETS по имени URL.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class QueryLog:
+    """
+    SQL-запросы текущего запроса (без параметров — так видны повторы).
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(_TRANSACTION_PREFIXES):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def duplicates(self):
+        return {sql: count for sql, count in Counter(self.queries).items() if count > 1}
+
+
+def start_logging():
+    log = QueryLog()
+    return _current.set(log), log
+
+
+def stop_logging(token):
+    _current.reset(token)
+
+
+def get_mode():
+    """
+    off — не проверяем; log — пишем предупреждение; raise — исключение
+    (в тестах и при разработке).
+    """
+    return getattr(settings, "QUERY_BUDGET_MODE", "off")
+
+
+def report(name, budget, log, used=None):
+    """
+    Проверка бюджета: при превышении логируем/бросаем исключение
+    со списком повторяющихся SQL.
+    """
+    used = len(log.queries) if used is None else used
+    if used <= budget:
+        return
+
+    lines = [f"{name}: {used} SQL-запросов при бюджете {budget}."]
+    duplicates = log.duplicates()
+    if duplicates:
+        lines.append("Повторяющиеся запросы:")
+        lines.extend(f"  {count} x {sql}" for sql, count in duplicates.items())
+    message = "\n".join(lines)
+
+    if get_mode() == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def budget_section(name):
+    """
+    Бюджет для участка запроса (например, UserSessionMiddleware).
+    Лимит берётся из settings.QUERY_BUDGETS[name].
+    """
+    log = _current.get()
+    budget = getattr(settings, "QUERY_BUDGETS", {}).get(name)
+    if log is None or budget is None:
+        yield
+        return
+
+    before = len(log.queries)
+    yield
+    report(name, budget, log, used=len(log.queries) - before)
@@ -1,11 +1,23 @@
 from datetime import timedelta
 
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
-from .models import UserSession
+from . import event_log
+from .auth_backends import remember_user
+from .models import AuthEvent, CustomUser, UserSession, session_key_hash
 
 SESSION_LIFETIME = timedelta(hours=24)
 
+# last_seen_at и end_time активной сессии обновляем не чаще раза в минуту на пользователя
+LAST_SEEN_RESOLUTION = timedelta(minutes=1)
+
+# сколько раз повторяем поиск/создание, если параллельный запрос
+# успел создать активную сессию между нашим SELECT и INSERT
+SESSION_CONFLICT_RETRIES = 3
+
 
 def _ensure_session_key(request):
     """
@@ -21,73 +33,144 @@ def create_or_update_user_session(request, user, *, create_if_missing: bool = Tr
     """
     Общая функция работы с пользовательской сессией.
 
-    - Деактивирует истёкшие активные сессии пользователя.
+    - Деактивирует истёкшую активную сессию пользователя.
     - Если есть активная сессия (is_active=True, end_time > now),
-      продлевает её: end_time = now + 24 часа, пересчитывает duration.
+      продлевает её: end_time = now + 24 часа.
+      UPDATE — не чаще раза в LAST_SEEN_RESOLUTION (или при смене ключа сессии),
+      в остальных запросах хватает одного SELECT.
     - Если активной нет и create_if_missing=True — создаёт новую сессию.
     - Если активной нет и create_if_missing=False — ничего не создаёт, возвращает None.
 
     Использование:
     - signup/login → create_if_missing=True (создать/обновить сессию).
     - start_page/main_page → create_if_missing=False (если сессия истекла — не создавать новую).
-    """
-    now = timezone.now()
-    session_key = _ensure_session_key(request)
-
-    # деактивируем истёкшие активные сессии
-    UserSession.objects.filter(
-        user=user,
-        is_active=True,
-        end_time__lte=now,
-    ).update(is_active=False)
-
-    # ищем текущую активную
-    active_session = UserSession.objects.filter(
-        user=user,
-        is_active=True,
-        end_time__gt=now,
-    ).order_by("-start_time").first()
-
-    if active_session:
-        # продлеваем
-        new_end_time = now + SESSION_LIFETIME
-        active_session.end_time = new_end_time
-        active_session.duration = active_session.end_time - active_session.start_time
-        active_session.session_key = session_key
-        active_session.save(update_fields=["end_time", "duration", "session_key", "updated_at"])
-        return active_session
-
-    if not create_if_missing:
-        return None
-
-    # активной нет и разрешено создать новую
-    start_time = now
-    end_time = now + SESSION_LIFETIME
-    session = UserSession.objects.create(
-        user=user,
-        session_key=session_key,
-        start_time=start_time,
-        end_time=end_time,
-        duration=end_time - start_time,
-        is_active=True,
-    )
-    return session
 
+    Чтение идёт вне транзакции: в продакшен-профиле SQLite транзакция
+    начинается с BEGIN IMMEDIATE и берёт блокировку на запись, а на обычном
+    запросе записи нет. transaction.atomic() открывается только вокруг
+    записей (истечение со счётчиком, создание сессии со счётчиками),
+    продление и last_seen_at — одиночные UPDATE.
+
+    Две активные сессии у пользователя запрещает база (unique_active_session_per_user).
+    Если параллельный запрос (вторая вкладка, signup + middleware) создал сессию
+    между нашим SELECT и INSERT, INSERT падает с IntegrityError — тогда
+    откатываем точку сохранения и продлеваем уже созданную сессию.
 
+    Заодно поддерживает счётчики активности в CustomUser
+    (last_seen_at, active_sessions_count, total_sessions_count)
+    и пишет события в журнал (event_log): вход, продление, истечение.
+    """
+    now = timezone.now()
+    key_hash = session_key_hash(_ensure_session_key(request))
+
+    for attempt in range(SESSION_CONFLICT_RETRIES):
+        # активная сессия у пользователя одна (уникальный индекс), так что
+        # ORDER BY id, который добавляет first(), сортирует не больше одной строки.
+        # Чтение вне транзакции ушло бы на реплику, а отставшая реплика
+        # не покажет только что созданную сессию — читаем из основной базы
+        active_session = UserSession.objects.using(DEFAULT_DB_ALIAS).filter(
+            user=user,
+            is_active=True,
+        ).order_by().first()
+
+        if active_session and active_session.end_time <= now:
+            # истекла — деактивируем (UPDATE только в этом редком случае)
+            with transaction.atomic():
+                deactivated = UserSession.objects.filter(
+                    pk=active_session.pk,
+                    is_active=True,
+                ).update(is_active=False)
+                _decrement_active_sessions(user, deactivated)
+                if deactivated:
+                    event_log.record(AuthEvent.SESSION_EXPIRED, user.pk, active_session.pk)
+            active_session = None
+
+        if active_session:
+            new_end_time = now + SESSION_LIFETIME
+            if (
+                active_session.session_key_hash != key_hash
+                or new_end_time - active_session.end_time >= LAST_SEEN_RESOLUTION
+            ):
+                # продлеваем
+                active_session.end_time = new_end_time
+                active_session.session_key_hash = key_hash
+                active_session.save(update_fields=["end_time", "session_key_hash"])
+                event_log.record(AuthEvent.SESSION_EXTENDED, user.pk, active_session.pk)
+            touch_last_seen(user, now)
+            return active_session
+
+        if not create_if_missing:
+            return None
+
+        # активной нет и разрешено создать новую
+        start_time = now
+        end_time = now + SESSION_LIFETIME
+        try:
+            with transaction.atomic():
+                session_obj = UserSession.objects.create(
+                    user=user,
+                    session_key_hash=key_hash,
+                    start_time=start_time,
+                    end_time=end_time,
+                    is_active=True,
+                )
+                # в той же точке сохранения: при IntegrityError счётчики не изменятся
+                CustomUser.objects.filter(pk=user.pk).update(
+                    active_sessions_count=F("active_sessions_count") + 1,
+                    total_sessions_count=F("total_sessions_count") + 1,
+                    last_seen_at=now,
+                )
+                # откат точки сохранения отменит и событие
+                event_log.record(AuthEvent.LOGIN, user.pk, session_obj.pk)
+            user.last_seen_at = now
+            return session_obj
+        except IntegrityError:
+            if attempt == SESSION_CONFLICT_RETRIES - 1:
+                raise
+
+
+@transaction.atomic
 def end_user_sessions(user):
     """
     Прервать все активные сессии пользователя (logout):
     - end_time = сейчас
-    - duration пересчитать
     - is_active=False
     """
     now = timezone.now()
-    sessions = UserSession.objects.filter(user=user, is_active=True)
+    # одним UPDATE вместо save() на каждую строку
+    ended = UserSession.objects.filter(user=user, is_active=True).update(
+        end_time=now,
+        is_active=False,
+    )
+    _decrement_active_sessions(user, ended)
+    if ended:
+        event_log.record(AuthEvent.LOGOUT, user.pk)
 
-    for s in sessions:
-        s.end_time = now
-        s.duration = s.end_time - s.start_time
-        s.is_active = False
-        s.save(update_fields=["end_time", "duration", "is_active", "updated_at"])
 
+def _decrement_active_sessions(user, count):
+    """
+    Уменьшить active_sessions_count на число только что закрытых сессий.
+    Через UPDATE ... F(), а не save(): не гоняем сигналы и не сбрасываем
+    кэш страниц пользователя из-за служебного счётчика.
+    """
+    if not count:
+        return
+    CustomUser.objects.filter(pk=user.pk).update(
+        active_sessions_count=Greatest(F("active_sessions_count") - count, 0),
+    )
 
+
+def touch_last_seen(user, now=None):
+    """
+    Обновить CustomUser.last_seen_at, если прошло больше LAST_SEEN_RESOLUTION:
+    на обычном запросе это проверка атрибута уже загруженного пользователя,
+    запись в базу — не чаще раза в минуту.
+    """
+    now = now or timezone.now()
+    if user.last_seen_at and now - user.last_seen_at < LAST_SEEN_RESOLUTION:
+        return
+    CustomUser.objects.filter(pk=user.pk).update(last_seen_at=now)
+    user.last_seen_at = now
+    # версия пользователя не меняется — обновим объект в кэше CachedModelBackend,
+    # иначе со следующего запроса last_seen_at снова выглядел бы устаревшим
+    remember_user(user)
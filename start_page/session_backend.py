@@ -0,0 +1,79 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    """
+    cached_db-сессии, которые не переписывают строку django_session без нужды.
+
+    При SESSION_SAVE_EVERY_REQUEST=True Django сохраняет сессию на каждом запросе.
+    Здесь сохранение в базу реально происходит, только если:
+    - сессия новая;
+    - данные сессии изменились (сравниваем отпечаток сериализованных данных);
+    - срок жизни в базе отстал от текущего больше чем на
+      SESSION_SAVE_THRESHOLD * SESSION_COOKIE_AGE.
+    Читается сессия из кэша (как в cached_db), туда же кладём срок жизни,
+    записанный в базу последним.
+    """
+
+    def _fingerprint(self, data):
+        return hashlib.md5(self.serializer().dumps(data)).hexdigest()
+
+    def _expiry_cache_key(self):
+        return f"{self.cache_key}:persisted_expiry"
+
+    def _drift_threshold(self):
+        return getattr(settings, "SESSION_SAVE_THRESHOLD", 0.1) * settings.SESSION_COOKIE_AGE
+
+    def _needs_persist(self, data, persisted_expiry, expiry_date):
+        if self._session_key is None:
+            return True
+        if getattr(self, "_persisted_fingerprint", None) != self._fingerprint(data):
+            return True
+        if persisted_expiry is None:
+            return True
+        return expiry_date.timestamp() - persisted_expiry > self._drift_threshold()
+
+    def load(self):
+        data = super().load()
+        self._persisted_fingerprint = self._fingerprint(data)
+        return data
+
+    async def aload(self):
+        data = await super().aload()
+        self._persisted_fingerprint = self._fingerprint(data)
+        return data
+
+    def save(self, must_create=False):
+        if not must_create and self._session_key is not None:
+            data = self._get_session()
+            expiry_date = self.get_expiry_date()
+            persisted_expiry = self._cache.get(self._expiry_cache_key())
+            if not self._needs_persist(data, persisted_expiry, expiry_date):
+                return
+
+        super().save(must_create)
+        self._persisted_fingerprint = self._fingerprint(self._session)
+        self._cache.set(
+            self._expiry_cache_key(),
+            self.get_expiry_date().timestamp(),
+            self.get_expiry_age(),
+        )
+
+    async def asave(self, must_create=False):
+        if not must_create and self._session_key is not None:
+            data = await self._aget_session()
+            expiry_date = await self.aget_expiry_date()
+            persisted_expiry = await self._cache.aget(self._expiry_cache_key())
+            if not self._needs_persist(data, persisted_expiry, expiry_date):
+                return
+
+        await super().asave(must_create)
+        self._persisted_fingerprint = self._fingerprint(await self._aget_session())
+        await self._cache.aset(
+            self._expiry_cache_key(),
+            (await self.aget_expiry_date()).timestamp(),
+            await self.aget_expiry_age(),
+        )
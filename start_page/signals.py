@@ -0,0 +1,49 @@
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .auth_backends import bump_permissions_version
+from .models import CustomUser
+from .page_cache import bump_user_version
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Любое изменение пользователя (имя, email, пароль, активность)
+    сбрасывает закэшированные страницы и объект пользователя (CachedModelBackend).
+
+    Версию поднимаем ещё раз после коммита: иначе параллельный запрос,
+    прочитавший строку до коммита, положил бы старые данные под новую версию.
+    """
+    user_id = instance.pk  # после delete() у instance pk станет None
+    bump_user_version(user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id), robust=True)
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_on_m2m(sender, action, **kwargs):
+    """
+    Добавили/убрали группу или право (с любой стороны связи) —
+    закэшированные наборы прав (CachedModelBackend) больше не верны.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_permissions_version()
+        transaction.on_commit(bump_permissions_version, robust=True)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permissions(sender, **kwargs):
+    """
+    Переименование группы не меняет права, но удаление группы или права
+    (и переименование codename) — меняет; проще сбросить всегда.
+    """
+    bump_permissions_version()
+    transaction.on_commit(bump_permissions_version, robust=True)
@@ -0,0 +1,263 @@
+import contextvars
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger("start_page.slow_queries")
+
+_current_request = contextvars.ContextVar("slow_query_request", default=None)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SAVEPOINT_RE = re.compile(r'"s\d+_x\d+"')
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+# EXPLAIN имеет смысл только для чтения/изменения существующих строк
+_EXPLAINABLE_PREFIXES = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+_PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+# обёртки execute — тоже код проекта, но местом вызова их не считаем
+_WRAPPER_FILES = {
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name("query_budget.py")),
+    str(Path(__file__).resolve().with_name("instrumentation.py")),
+    str(Path(__file__).resolve().with_name("db_wrappers.py")),
+}
+
+
+def fingerprint(sql):
+    """
+    Нормализованный SQL: литералы, параметры и имена точек сохранения → ?,
+    списки IN (...) схлопнуты, пробелы сжаты. Запросы, отличающиеся только значениями, совпадают.
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _SAVEPOINT_RE.sub('"?"', sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(...)", sql)
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+def is_full_scan(plan):
+    """
+    Полный проход: "SCAN" в SQLite (в том числе по всему индексу —
+    "USING COVERING INDEX"; поиск по индексу — это "SEARCH"),
+    "Seq Scan" в PostgreSQL, тип доступа ALL в MySQL.
+    """
+    for line in plan:
+        if line.startswith("SCAN ") and not line.startswith("SCAN CONSTANT ROW"):
+            return True
+        if "Seq Scan" in line or " ALL " in line:
+            return True
+    return False
+
+
+def explain(connection, sql, params):
+    """
+    План запроса (EXPLAIN QUERY PLAN в SQLite, EXPLAIN в остальных) списком строк.
+    Обёртки execute на время EXPLAIN снимаем: он не должен попадать
+    в бюджеты, метрики и в этот же лог.
+    """
+    prefix = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+    saved_wrappers = connection.execute_wrappers
+    connection.execute_wrappers = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            rows = cursor.fetchall()
+    except DatabaseError as exc:
+        return [f"EXPLAIN не удался: {exc}"]
+    finally:
+        connection.execute_wrappers = saved_wrappers
+
+    if connection.vendor == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [" ".join(str(value) for value in row) for row in rows]
+
+
+def call_site():
+    """
+    Первая строка кода проекта в стеке (не Django, не библиотеки) —
+    откуда на самом деле пришёл запрос: "start_page/validators.py:55 in validate_email".
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(_PROJECT_ROOT)
+            and filename not in _WRAPPER_FILES
+            and "site-packages" not in filename
+        ):
+            relative = Path(filename).relative_to(_PROJECT_ROOT)
+            return f"{relative}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _current_view():
+    request = _current_request.get()
+    if request is None:
+        return "-"
+    resolver_match = getattr(request, "resolver_match", None)
+    return resolver_match.view_name if resolver_match else request.path
+
+
+class SlowQueryRegistry:
+    """
+    Медленные запросы процесса, сгруппированные по отпечатку SQL:
+    сколько раз, суммарное/максимальное время, план, виды и места вызова.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}
+        self.seen = set()
+
+    def reset(self):
+        with self._lock:
+            self.entries.clear()
+            self.seen.clear()
+
+    def is_new(self, sql_fingerprint):
+        with self._lock:
+            if sql_fingerprint in self.seen:
+                return False
+            if len(self.seen) < getattr(settings, "SLOW_QUERY_MAX_FINGERPRINTS", 500):
+                self.seen.add(sql_fingerprint)
+            return True
+
+    def get(self, sql_fingerprint):
+        with self._lock:
+            return self.entries.get(sql_fingerprint)
+
+    def record(self, sql_fingerprint, sql, seconds, plan, view, site):
+        with self._lock:
+            entry = self.entries.get(sql_fingerprint)
+            if entry is None:
+                if len(self.entries) >= getattr(settings, "SLOW_QUERY_MAX_FINGERPRINTS", 500):
+                    return None
+                entry = self.entries[sql_fingerprint] = {
+                    "id": hashlib.md5(sql_fingerprint.encode()).hexdigest()[:12],
+                    "fingerprint": sql_fingerprint,
+                    "example": sql,
+                    "plan": plan,
+                    "full_scan": is_full_scan(plan),
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "views": Counter(),
+                    "call_sites": Counter(),
+                }
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["views"][view] += 1
+            entry["call_sites"][site] += 1
+            return entry
+
+    def snapshot(self):
+        """
+        Копия для отчётов: самые тяжёлые по суммарному времени — первыми.
+        """
+        with self._lock:
+            entries = [
+                {**entry, "views": dict(entry["views"]), "call_sites": dict(entry["call_sites"])}
+                for entry in self.entries.values()
+            ]
+        return sorted(entries, key=lambda entry: entry["total_seconds"], reverse=True)
+
+    def render_prometheus(self):
+        lines = [
+            "# TYPE db_slow_queries_total counter",
+            "# TYPE db_slow_query_seconds_total counter",
+        ]
+        for entry in self.snapshot():
+            labels = f'fingerprint="{entry["id"]}",full_scan="{int(entry["full_scan"])}"'
+            lines.append(f"db_slow_queries_total{{{labels}}} {entry['count']}")
+            lines.append(f"db_slow_query_seconds_total{{{labels}}} {entry['total_seconds']:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+registry = SlowQueryRegistry()
+
+
+class SlowQueryWrapper:
+    """
+    Обёртка execute для запроса (db_wrappers.execute_wrapper).
+
+    В лог попадают запросы дольше SLOW_QUERY_THRESHOLD_MS, а при
+    SLOW_QUERY_REPORT_FULL_SCANS ещё и каждый новый отпечаток, план которого —
+    полный проход по таблице (так видно проблему ещё на маленькой базе).
+    EXPLAIN выполняется один раз на отпечаток.
+    """
+
+    def __init__(self):
+        self.threshold = getattr(settings, "SLOW_QUERY_THRESHOLD_MS", 100) / 1000
+        self.report_full_scans = getattr(settings, "SLOW_QUERY_REPORT_FULL_SCANS", False)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        seconds = time.perf_counter() - started
+
+        slow = seconds >= self.threshold
+        if not slow and not (self.report_full_scans and self._explainable(sql, many)):
+            return result
+
+        sql_fingerprint = fingerprint(sql)
+        entry = registry.get(sql_fingerprint)
+        if entry is not None:
+            plan = entry["plan"]
+        elif slow or registry.is_new(sql_fingerprint):
+            plan = self._plan(context["connection"], sql, params, many)
+        else:
+            return result
+
+        if not slow and not is_full_scan(plan):
+            return result
+
+        site = call_site()
+        view = _current_view()
+        entry = registry.record(sql_fingerprint, sql, seconds, plan, view, site)
+        if entry is not None and entry["count"] == 1:
+            logger.warning(
+                "%s SQL за %.1f мс (%s, %s):\n%s\nПлан:\n  %s",
+                "Медленный" if slow else "Полный проход в",
+                seconds * 1000,
+                view,
+                site,
+                sql,
+                "\n  ".join(plan),
+            )
+        elif slow:
+            logger.warning("Медленный SQL за %.1f мс (%s, %s): %s",
+                           seconds * 1000, view, site, sql_fingerprint)
+        return result
+
+    @staticmethod
+    def _explainable(sql, many):
+        return not many and sql.lstrip().upper().startswith(_EXPLAINABLE_PREFIXES)
+
+    def _plan(self, connection, sql, params, many):
+        if not self._explainable(sql, many):
+            return []
+        return explain(connection, sql, params)
+
+
+def start_request(request):
+    return _current_request.set(request)
+
+
+def end_request(token):
+    _current_request.reset(token)
@@ -0,0 +1,66 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+
+# app.3f2a9c1b7d4e.css — имя с хэшем от ManifestStaticFilesStorage
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+
+# в порядке предпочтения
+ENCODINGS = (
+    ("br", ".br"),
+    ("gzip", ".gz"),
+)
+
+
+def _accepted_encodings(request):
+    header = request.headers.get("Accept-Encoding", "")
+    return {part.split(";", 1)[0].strip().lower() for part in header.split(",")}
+
+
+@require_safe
+def serve_asset(request, path):
+    """
+    Отдача собранной статики из STATIC_ROOT.
+    - если клиент принимает br/gzip и есть сжатый вариант — отдаём его;
+    - файлы с хэшем в имени кэшируются браузером на год (immutable).
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except (SuspiciousFileOperation, ValueError):
+        # путь за пределами STATIC_ROOT (../)
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    accepted = _accepted_encodings(request)
+    encoding = None
+    file_path = full_path
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            encoding = name
+            file_path = full_path + suffix
+            break
+
+    response = FileResponse(
+        open(file_path, "rb"),
+        content_type=content_type or "application/octet-stream",
+        filename=os.path.basename(full_path),
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    if HASHED_NAME_RE.search(path):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = DEFAULT_CACHE_CONTROL
+    return response
@@ -0,0 +1,28 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from start_page.assets import bundle_name
+
+register = template.Library()
+
+_TAGS = {
+    "css": '<link rel="stylesheet" href="{}">',
+    "js": '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def asset_bundle(name, kind):
+    """
+    Подключение бандла статики страницы.
+    - ASSET_BUNDLES_ENABLED=True: один минифицированный файл с хэшем в имени;
+    - иначе (разработка): исходные файлы по отдельности, как раньше.
+    """
+    tag = _TAGS[kind]
+    if getattr(settings, "ASSET_BUNDLES_ENABLED", False):
+        return format_html(tag, static(bundle_name(name, kind)))
+
+    sources = settings.ASSET_BUNDLES[name].get(kind, [])
+    return format_html_join("\n", tag, ((static(source),) for source in sources))
@@ -1,3 +1,1039 @@
-from django.test import TestCase
+import gzip
+import itertools
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import Http404, HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import admission, analytics, checks, event_log, presence
+from .assets import minify_js
+from .db_router import ReplicaRouter, end_request, start_request
+from .mail_dispatch import get_mail_stats, wait_for_pending
+from .models import AuthEvent, CapturedProfile, CustomUser, UserSession, session_key_hash
+from .profiling import arm_path, make_profile_token, should_profile
+from .query_budget import QueryBudgetExceeded
+from .services import SESSION_LIFETIME, create_or_update_user_session, end_user_sessions
+from .session_backend import SessionStore
+from .slow_queries import fingerprint, registry as slow_query_registry
+from .static_views import DEFAULT_CACHE_CONTROL, HASHED_NAME_RE, IMMUTABLE_CACHE_CONTROL, serve_asset
+
+
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_visit_does_not_touch_database(self):
+        url = reverse("start_page:login_auth")
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+        self.assertNotContains(response, "__page_cache_csrf_token__")
+        self.assertIn("ETag", response)
+
+    def test_if_none_match_returns_304(self):
+        url = reverse("start_page:signup")
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_alone_gets_full_page(self):
+        # дата не говорит, тот ли у браузера CSRF-токен в странице — только ETag
+        url = reverse("start_page:signup")
+        self.client.get(url)
+        response = self.client.get(url, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_session_cookie_bypasses_cache(self):
+        url = reverse("start_page:start_page")
+        self.client.get(url)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "anything"
+
+        response = self.client.get(url)
+        self.assertNotIn("ETag", response)
+
+
+class ThrottledSessionSaveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+        self.client.force_login(self.user)
+        create_or_update_user_session(self.client, self.user)
+
+    def _session_writes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        return [
+            q["sql"] for q in ctx.captured_queries
+            if "django_session" in q["sql"] and not q["sql"].startswith("SELECT")
+        ]
+
+    def test_steady_state_browsing_does_not_write_session(self):
+        url = reverse("main_page:main_page")
+        self.client.get(url)
+        self.assertEqual(self._session_writes(url), [])
+
+    def test_changed_session_data_is_persisted(self):
+        store = SessionStore(self.client.session.session_key)
+        store["flag"] = True
+        with CaptureQueriesContext(connection) as ctx:
+            store.save()
+
+        self.assertTrue(any("django_session" in q["sql"] for q in ctx.captured_queries))
+
+
+METRICS_TOKEN = "test-metrics-token"
+
+
+def get_metrics(client, view_name="start_page:metrics"):
+    with override_settings(METRICS_TOKEN=METRICS_TOKEN):
+        return client.get(reverse(view_name), headers={"Authorization": f"Bearer {METRICS_TOKEN}"})
+
+
+class PerformanceInstrumentationTests(TestCase):
+    def test_sampled_request_has_server_timing(self):
+        response = self.client.get(reverse("start_page:login_auth"))
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertIn("template;dur=", response["Server-Timing"])
+
+    def test_metrics_endpoint_exposes_latency_histogram(self):
+        self.client.get(reverse("start_page:signup"))
+        response = get_metrics(self.client)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response, 'http_request_duration_seconds_count{view="start_page:signup"}'
+        )
+
+    @override_settings(METRICS_TOKEN=METRICS_TOKEN)
+    def test_metrics_endpoint_is_not_public(self):
+        url = reverse("start_page:metrics")
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="127.0.0.1").status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_allowed_ip_is_ignored_behind_proxy(self):
+        url = reverse("start_page:metrics")
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="127.0.0.1").status_code, 200)
+        response = self.client.get(url, REMOTE_ADDR="127.0.0.1", headers={"X-Forwarded-For": "203.0.113.5"})
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ADMISSION_CONTROL={
+    "start_page:login_auth": {"concurrency": 1, "queue": 1, "timeout": 0.05},
+    "start_page:password_reset_confirm": {"concurrency": 1, "queue": 0, "timeout": 0.05, "json": True},
+})
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        # первый запрос собирает цепочку middleware и ограничители из настроек
+        self.client.get(reverse("start_page:login_auth"))
+
+    def _occupy(self, view_name):
+        limiter = admission.get_limiter(view_name)
+        self.assertIsNone(limiter.acquire())
+        self.addCleanup(limiter.release)
+        return limiter
+
+    def test_overloaded_page_is_shed_with_retry_after(self):
+        limiter = self._occupy("start_page:login_auth")
+
+        response = self.client.post(reverse("start_page:login_auth"), {"email": "x@gmail.com"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertEqual(limiter.stats[admission.SHED_TIMEOUT], 1)
+        # без нагрузки на вид страница по-прежнему открывается
+        self.assertEqual(self.client.get(reverse("start_page:login_auth")).status_code, 200)
+
+    def test_ajax_endpoint_is_shed_with_json_error(self):
+        self._occupy("start_page:password_reset_confirm")
+
+        response = self.client.post(reverse("start_page:password_reset_confirm"))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["code"], "overloaded")
+        metrics = get_metrics(self.client)
+        self.assertContains(
+            metrics,
+            'admission_shed_total{view="start_page:password_reset_confirm",reason="queue_full"} 1',
+        )
+
+
+class PresenceTests(TestCase):
+    # каждому тесту — свои минуты (на сутки вперёд): учёт «раз в минуту»
+    # в памяти процесса не переносится из предыдущего теста
+    _days = itertools.count(1)
+
+    def setUp(self):
+        cache.clear()
+        shift = next(self._days) * 24 * 60 * 60
+        real_time = time.time
+        self.enterContext(mock.patch("time.time", lambda: real_time() + shift))
+
+    def test_estimate_is_close_for_many_users(self):
+        for user_id in range(3000):
+            presence.record_activity(user_id)
+        self.assertAlmostEqual(presence.online_counts()[5], 3000, delta=3000 * 0.1)
+
+    def test_middleware_marks_user_online(self):
+        user = CustomUser.objects.create_user(
+            email="online@gmail.com", username="Online", password="Test123!"
+        )
+        self.client.force_login(user)
+        create_or_update_user_session(self.client, user)
+
+        self.client.get(reverse("main_page:main_page"))
+        self.client.get(reverse("main_page:profile"))
+
+        response = get_metrics(self.client, "start_page:online_users")
+        self.assertEqual(response.json(), {"online": {"5m": 1, "15m": 1, "60m": 1}})
+
+
+class UserActivitySummaryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="summary@gmail.com", username="Summary", password="Test123!"
+        )
+
+    def test_counters_follow_session_lifecycle(self):
+        create_or_update_user_session(self.client, self.user)
+        create_or_update_user_session(self.client, self.user)  # продление, не новая
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.active_sessions_count, self.user.total_sessions_count), (1, 1))
+        self.assertIsNotNone(self.user.last_seen_at)
+
+        end_user_sessions(self.user)
+        create_or_update_user_session(self.client, self.user)
+        UserSession.objects.filter(user=self.user).update(end_time=timezone.now())
+        self.assertIsNone(create_or_update_user_session(self.client, self.user, create_if_missing=False))
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.active_sessions_count, self.user.total_sessions_count), (0, 2))
+
+    def test_steady_state_request_opens_no_transaction(self):
+        create_or_update_user_session(self.client, self.user)
+        # в TestCase транзакция открыта, поэтому atomic() видно как SAVEPOINT
+        with CaptureQueriesContext(connection) as queries:
+            create_or_update_user_session(self.client, self.user)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]["sql"].startswith("SELECT"))
+
+    def test_repair_command_fixes_drift(self):
+        create_or_update_user_session(self.client, self.user)
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            active_sessions_count=5, total_sessions_count=0, last_seen_at=None
+        )
+
+        call_command("repair_user_activity", stdout=StringIO())
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.active_sessions_count, self.user.total_sessions_count), (1, 1))
+        self.assertIsNotNone(self.user.last_seen_at)
+
+
+class SyntheticDataTests(TestCase):
+    def _generate(self, seed):
+        call_command(
+            "generate_synthetic_data", users=40, seed=seed, batch_size=15,
+            online_share=0.5, resets_per_user=1, stdout=StringIO(),
+        )
+        # времена отсчитываются от "сейчас", поэтому сравниваем структуру
+        return (
+            list(CustomUser.objects.order_by("id").values_list("email", "total_sessions_count")),
+            list(UserSession.objects.order_by("id").values_list("user__email", "session_key_hash", "is_active")),
+        )
+
+    def test_generated_data_is_deterministic_and_consistent(self):
+        first = self._generate(seed=7)
+        self.assertTrue(first[1])
+        self.assertTrue(all(email.split("@")[1] in settings.ALLOWED_EMAIL_DOMAINS for email, _ in first[0]))
+        out = StringIO()
+        call_command("repair_user_activity", dry_run=True, stdout=out)
+        self.assertIn("найдено расхождений: 0", out.getvalue())
+        # счётчик id сдвинут за вставленные явно id
+        user = CustomUser.objects.create_user(email="after@gmail.com", username="After", password="x")
+        self.assertGreater(user.pk, max(CustomUser.objects.exclude(pk=user.pk).values_list("pk", flat=True)))
+
+        CustomUser.objects.all().delete()
+        self.assertEqual(self._generate(seed=7), first)
+
+
+class UserSessionAdminTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            email="root@gmail.com", username="Root", password="Test123!"
+        )
+        self.client.force_login(self.admin)
+        now = timezone.now()
+        for hours, key in ((1, "a" * 32), (5, "b" * 32)):
+            UserSession.objects.create(
+                user=self.admin, session_key_hash=session_key_hash(key),
+                start_time=now, end_time=now + timedelta(hours=hours), is_active=False,
+            )
+
+    def test_changelist_sorts_by_derived_duration_and_finds_session_key(self):
+        url = reverse("admin:start_page_usersession_changelist")
+        response = self.client.get(url, {"o": "-4"})
+        self.assertEqual(
+            [session.session_duration for session in response.context["cl"].result_list],
+            [timedelta(hours=5), timedelta(hours=1)],
+        )
+        # хэш ключа в списке не показываем
+        self.assertNotContains(response, str(session_key_hash("b" * 32)))
+        for page in (
+            reverse("admin:start_page_usersession_change", args=[UserSession.objects.first().pk]),
+            reverse("admin:start_page_customuser_change", args=[self.admin.pk]),
+        ):
+            self.assertNotContains(self.client.get(page), str(session_key_hash("b" * 32)))
+
+        response = self.client.get(url, {"q": "b" * 32})
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+
+    def test_session_key_search_respects_list_filters(self):
+        url = reverse("admin:start_page_usersession_changelist")
+        response = self.client.get(url, {"q": "b" * 32, "is_active__exact": "1"})
+        self.assertEqual(len(response.context["cl"].result_list), 0)
+
+
+class EventLogTests(TestCase):
+    def setUp(self):
+        event_log.flush()
+        self.user = CustomUser.objects.create_user(
+            email="events@gmail.com", username="Events", password="Test123!"
+        )
+
+    def _kinds(self):
+        event_log.flush()
+        return list(AuthEvent.objects.order_by("id").values_list("kind", flat=True))
+
+    def test_session_lifecycle_is_logged_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = create_or_update_user_session(self.client, self.user)
+            create_or_update_user_session(self.client, self.user)  # меньше минуты — не продление
+        UserSession.objects.filter(pk=session.pk).update(end_time=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            create_or_update_user_session(self.client, self.user, create_if_missing=False)
+            create_or_update_user_session(self.client, self.user)
+            end_user_sessions(self.user)
+
+        self.assertEqual(self._kinds(), [
+            AuthEvent.LOGIN, AuthEvent.SESSION_EXPIRED, AuthEvent.LOGIN, AuthEvent.LOGOUT,
+        ])
+        self.assertEqual(AuthEvent.objects.filter(session_id=session.pk).count(), 2)
+
+    def test_rolled_back_events_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                create_or_update_user_session(self.client, self.user)
+                raise RuntimeError
+        self.assertEqual(self._kinds(), [])
+
+
+class EventLogFlushTests(TransactionTestCase):
+    """
+    Пачки пишет фоновый поток журнала.
+    TransactionTestCase — потоку нужны закоммиченные данные.
+    """
+    # id за пределами 32 бит — как у BigAutoField после 2**31 строк
+    USER_ID = 2**40
+
+    def setUp(self):
+        event_log.flush()
+
+    def tearDown(self):
+        event_log.flush()
+
+    def _wait_for_written(self, count):
+        deadline = time.monotonic() + 5
+        while event_log.get_event_log_stats()["written"] < count:
+            if time.monotonic() >= deadline:
+                self.fail(f"журнал не записан: {event_log.get_event_log_stats()}")
+            time.sleep(0.01)
+
+    @override_settings(EVENT_LOG_BATCH_SIZE=2)
+    def test_full_batch_is_written_in_background_in_one_insert(self):
+        before = event_log.get_event_log_stats()
+        event_log.record(AuthEvent.LOGIN, self.USER_ID)
+        self.assertEqual(event_log.get_event_log_stats()["buffered"], 1)
+
+        event_log.record(AuthEvent.LOGOUT, self.USER_ID)
+        self._wait_for_written(before["written"] + 2)
+        self.assertEqual(event_log.get_event_log_stats()["flushes"], before["flushes"] + 1)
+        self.assertEqual(AuthEvent.objects.count(), 2)
+
+    @override_settings(EVENT_LOG_FLUSH_INTERVAL=0.05)
+    def test_stale_events_are_flushed_without_new_events(self):
+        before = event_log.get_event_log_stats()
+        event_log.record(AuthEvent.LOGIN, self.USER_ID)
+        self._wait_for_written(before["written"] + 1)
+        self.assertEqual(event_log.get_event_log_stats()["buffered"], 0)
+        self.assertEqual(AuthEvent.objects.count(), 1)
+
+
+class CachedUserBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="cached@gmail.com", username="Cached", password="Test123!"
+        )
+        self.client.force_login(self.user)
+        create_or_update_user_session(self.client, self.user)
+
+    def _user_selects(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("main_page:profile"))
+        return [q["sql"] for q in queries if q["sql"].startswith("SELECT") and "start_page_customuser" in q["sql"]]
+
+    def test_authenticated_request_skips_user_query(self):
+        self._user_selects()
+        self.assertEqual(self._user_selects(), [])
+
+    def test_save_invalidates_cached_user(self):
+        self._user_selects()
+        CustomUser.objects.get(pk=self.user.pk).save(update_fields=["username"])
+        self.assertEqual(len(self._user_selects()), 1)
+
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        response = self.client.get(reverse("main_page:profile"))
+        self.assertEqual(response.wsgi_request.user.is_authenticated, False)
+
+
+class CachedPermissionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name="Support")
+        self.user = CustomUser.objects.create_user(
+            email="staff@gmail.com", username="Staff", password="Test123!", is_staff=True
+        )
+        self.user.groups.add(self.group)
+        self.view_user = Permission.objects.get(codename="view_customuser")
+        self.change_user = Permission.objects.get(codename="change_customuser")
+        self.group.permissions.add(self.view_user)
+
+    def _fresh_user(self):
+        # новый объект — как на следующем запросе, без _perm_cache
+        return CustomUser.objects.get(pk=self.user.pk)
+
+    def test_permissions_are_cached_across_requests(self):
+        self.assertTrue(self._fresh_user().has_perm("start_page.view_customuser"))
+        user = self._fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("start_page.view_customuser"))
+            self.assertTrue(user.has_module_perms("start_page"))
+            self.assertFalse(user.has_perm("start_page.change_customuser"))
+
+    def test_group_and_membership_changes_invalidate(self):
+        self.assertFalse(self._fresh_user().has_perm("start_page.change_customuser"))
+
+        self.group.permissions.add(self.change_user)
+        self.assertTrue(self._fresh_user().has_perm("start_page.change_customuser"))
+
+        self.user.groups.remove(self.group)
+        self.assertFalse(self._fresh_user().has_perm("start_page.view_customuser"))
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.profiles = override_settings(PROFILING_DIR=tmp.name, PROFILING_MAX_FILES=2)
+        self.profiles.enable()
+        self.addCleanup(self.profiles.disable)
+
+    def test_signed_token_captures_profile(self):
+        self.client.get(reverse("start_page:signup"), headers={"X-Profile-Token": make_profile_token()})
+        self.client.get(reverse("start_page:signup"), headers={"X-Profile-Token": "forged"})
+
+        captured = CapturedProfile.objects.get()
+        self.assertEqual(captured.view_name, "start_page:signup")
+        self.assertTrue(captured.file_name.endswith(".folded"))
+
+    def test_old_profiles_are_rotated(self):
+        for _ in range(3):
+            self.client.get(reverse("start_page:signup"), headers={"X-Profile-Token": make_profile_token()})
+        self.assertEqual(CapturedProfile.objects.count(), 2)
+
+    def test_armed_path_profiles_next_requests_only(self):
+        url = reverse("start_page:login_auth")
+        arm_path(url, 1)
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(CapturedProfile.objects.filter(path=url).count(), 1)
+
+    def test_armed_slots_are_claimed_once_under_concurrency(self):
+        url = reverse("start_page:login_auth")
+        arm_path(url, 5)
+        request = RequestFactory().get(url)
+        taken = []
+
+        def worker():
+            taken.extend(should_profile(request) for _ in range(10))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(taken.count(True), 5)
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        slow_query_registry.reset()
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT  *  FROM t WHERE id IN (%s) AND name = 'y' LIMIT 1"),
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=100_000, SLOW_QUERY_REPORT_FULL_SCANS=True)
+    def test_full_scan_is_reported_with_plan_and_call_site(self):
+        with self.assertLogs("start_page.slow_queries", level="WARNING"):
+            self.client.post(
+                reverse("start_page:signup"),
+                {"username": "Test", "email": "scan@gmail.com", "password": "Test123!"},
+            )
+
+        entries = slow_query_registry.snapshot()
+        email_lookup = next(entry for entry in entries if "LIKE" in entry["fingerprint"])
+        self.assertTrue(email_lookup["full_scan"])
+        self.assertIn("start_page:signup", email_lookup["views"])
+        self.assertTrue(any("validators.py" in site for site in email_lookup["call_sites"]))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_REPORT_FULL_SCANS=False)
+    def test_slow_queries_exposed_in_metrics(self):
+        with self.assertLogs("start_page.slow_queries", level="WARNING"):
+            self.client.post(
+                reverse("start_page:signup"),
+                {"username": "Test", "email": "slow@gmail.com", "password": "Test123!"},
+            )
+            # при пороге 0 запросы самого /metrics/ тоже «медленные»
+            response = get_metrics(self.client)
+        self.assertContains(response, "db_slow_queries_total{fingerprint=")
+
+
+@skipUnless(analytics.np is not None, "numpy не установлен")
+class SessionAnalyticsTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            email="admin@gmail.com", username="Admin", password="Test123!"
+        )
+        other = CustomUser.objects.create_user(
+            email="other@gmail.com", username="Other", password="Test123!"
+        )
+        monday = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        # (пользователь, начало, длительность в часах): вход и выход в журнале
+        events = []
+        for session_id, (user, start, hours) in enumerate((
+            (self.admin, monday, 1),
+            (self.admin, monday + timedelta(weeks=1), 2),
+            (other, monday + timedelta(weeks=1, hours=1), 4),
+        ), start=1):
+            events += [
+                AuthEvent(kind=AuthEvent.LOGIN, user_id=user.pk, session_id=session_id, created_at=start),
+                AuthEvent(kind=AuthEvent.LOGOUT, user_id=user.pk, created_at=start + timedelta(hours=hours)),
+            ]
+        AuthEvent.objects.bulk_create(events)
+        self.columns = analytics.load_sessions(chunk_size=2)
+        self.week = int((monday + timedelta(weeks=1)).timestamp())
+
+    def test_concurrency_curve(self):
+        moments, concurrent = analytics.concurrency_curve(
+            self.columns, start=self.week, end=self.week + 3 * analytics.HOUR
+        )
+        self.assertEqual(concurrent.tolist(), [1, 2, 1, 1])
+
+    def test_retention_cohorts(self):
+        _, retention = analytics.retention_cohorts(self.columns, periods=3)
+        self.assertEqual(retention.tolist(), [[1.0, 1.0, 0.0], [1.0, 0.0, 0.0]])
+
+    def test_session_without_logout_ends_lifetime_after_last_extension(self):
+        start = datetime(2026, 2, 2, tzinfo=dt_timezone.utc)
+        AuthEvent.objects.bulk_create([
+            AuthEvent(kind=AuthEvent.LOGIN, user_id=self.admin.pk, session_id=10, created_at=start),
+            AuthEvent(
+                kind=AuthEvent.SESSION_EXTENDED, user_id=self.admin.pk, session_id=10,
+                created_at=start + timedelta(hours=3),
+            ),
+        ])
+        columns = analytics.load_sessions(since=start)
+        self.assertEqual(columns["start_time"].tolist(), [int(start.timestamp())])
+        self.assertEqual(
+            columns["end_time"].tolist(), [int((start + timedelta(hours=3) + SESSION_LIFETIME).timestamp())]
+        )
+
+    def test_admin_analytics_page(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("admin:start_page_usersession_analytics"), {"days": 3650})
+        self.assertContains(response, "<polyline")
+
+
+@skipUnless(analytics.np is not None, "numpy не установлен")
+class SlimUserSessionMigrationTests(TransactionTestCase):
+    """
+    0006 удаляет updated_at, перенося активность сессий в журнал:
+    длительности, восстановленные по журналу, совпадают с прежними.
+    """
+    migrate_from = [("start_page", "0005_auth_event")]
+    migrate_to = [("start_page", "0006_slim_usersession")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        old_apps = executor.loader.project_state(self.migrate_from).apps
+        OldUser = old_apps.get_model("start_page", "CustomUser")
+        OldSession = old_apps.get_model("start_page", "UserSession")
+
+        user = OldUser.objects.create(email="old@gmail.com", username="Old", password="x")
+        start = datetime(2026, 1, 5, tzinfo=dt_timezone.utc)
+        # (начало, последняя активность, конец, активна): выход, истечение, открытая
+        for index, (begin, last_seen, end, active) in enumerate((
+            (start, start + timedelta(hours=1), start + timedelta(hours=1), False),
+            (start + timedelta(days=2), start + timedelta(days=2, hours=2),
+             start + timedelta(days=2, hours=2) + SESSION_LIFETIME, False),
+            (start + timedelta(days=5), start + timedelta(days=5, hours=3),
+             start + timedelta(days=5, hours=3) + SESSION_LIFETIME, True),
+        )):
+            session = OldSession.objects.create(
+                user=user, session_key=str(index) * 32, start_time=begin, end_time=end,
+                duration=end - begin, is_active=active,
+            )
+            # updated_at — auto_now, задаём в обход save()
+            OldSession.objects.filter(pk=session.pk).update(updated_at=last_seen)
+        self.durations = sorted(
+            (end - begin).total_seconds() for begin, end in OldSession.objects.values_list("start_time", "end_time")
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_durations_survive_migration(self):
+        columns = analytics.load_sessions()
+        self.assertEqual(sorted(analytics.durations(columns).tolist()), self.durations)
+
+
+class AsgiMiddlewareTests(TestCase):
+    """
+    Под ASGI (AsyncClient) вся цепочка middleware асинхронная,
+    а SQL из потоков sync_to_async по-прежнему попадает в замеры.
+    """
+
+    def setUp(self):
+        cache.clear()
+        mail.outbox = []
+        CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+
+    def tearDown(self):
+        event_log.flush()
+
+    @override_settings(PROFILING_ENABLED=True, SLOW_QUERY_LOG_ENABLED=True)
+    def test_project_middleware_is_async(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        for path in settings.MIDDLEWARE:
+            if path.startswith("start_page."):
+                with self.subTest(path):
+                    self.assertTrue(iscoroutinefunction(import_string(path)(get_response)))
+
+    @override_settings(QUERY_BUDGET_MODE="raise", QUERY_BUDGETS={"start_page:password_reset_send_code": 1})
+    async def test_query_budget_sees_queries_from_sync_to_async(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            await self.async_client.post(
+                reverse("start_page:password_reset_send_code"), {"email": "tester@gmail.com"}
+            )
+
+    async def test_failed_background_mail_is_logged_and_counted(self):
+        failed_before = get_mail_stats()["failed"]
+        with mock.patch("django.core.mail.send_mail", side_effect=OSError("smtp down")):
+            with self.assertLogs("start_page.mail", level="ERROR"):
+                response = await self.async_client.post(
+                    reverse("start_page:password_reset_send_code"), {"email": "tester@gmail.com"}
+                )
+                await sync_to_async(wait_for_pending)()
+
+        self.assertTrue(response.json()["ok"])
+        self.assertEqual(get_mail_stats()["failed"], failed_before + 1)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        mail.outbox = []
+        CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+
+    def tearDown(self):
+        event_log.flush()
+
+    def send_code(self, key, email="tester@gmail.com"):
+        return self.client.post(
+            reverse("start_page:password_reset_send_code"), {"email": email},
+            headers={"Idempotency-Key": key},
+        )
+
+    def test_replay_does_not_send_second_code(self):
+        first = self.send_code("abc")
+        second = self.send_code("abc")
+        wait_for_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+
+    def test_clients_behind_one_address_do_not_share_keys(self):
+        self.send_code("abc")
+        other = Client()
+        # у второго клиента уже есть своя сессия — адрес для него не используется
+        other.post(
+            reverse("start_page:password_reset_send_code"), {"email": "tester@gmail.com"},
+            headers={"Idempotency-Key": "xyz"},
+        )
+        response = other.post(
+            reverse("start_page:password_reset_send_code"), {"email": "tester@gmail.com"},
+            headers={"Idempotency-Key": "abc"},
+        )
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+
+    def test_key_reused_with_other_body(self):
+        self.send_code("abc")
+        response = self.send_code("abc", email="other@gmail.com")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["code"], "key_reused")
+
+
+@override_settings(QUERY_BUDGET_MODE="raise")
+class QueryBudgetTests(TestCase):
+    """
+    Все основные сценарии укладываются в бюджеты из @query_budget:
+    при превышении QueryBudgetMiddleware бросает QueryBudgetExceeded.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # события из асинхронных видов ждут в буфере — пишем, пока тестовая база есть
+        event_log.flush()
+
+    def test_signup_login_logout(self):
+        self.client.get(reverse("start_page:signup"))
+        self.client.post(reverse("start_page:signup"), {
+            "username": "Tester", "email": "tester@gmail.com", "password": "secret1!",
+        })
+        self.client.get(reverse("main_page:main_page"))
+        self.client.get(reverse("main_page:profile"))
+        self.client.get(reverse("main_page:profile_data"))
+        self.client.post(reverse("main_page:update_username"), {"username": "Renamed"})
+        self.client.get(reverse("start_page:logout_auth"))
+
+        self.client.get(reverse("start_page:login_auth"))
+        response = self.client.post(reverse("start_page:login_auth"), {
+            "email": "tester@gmail.com", "password": "secret1!",
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_password_reset(self):
+        CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+        self.client.post(reverse("start_page:password_reset_send_code"), {"email": "tester@gmail.com"})
+        wait_for_pending()
+        code = mail.outbox[-1].body.split(": ", 1)[1][:6]
+        self.client.post(reverse("start_page:password_reset_verify_code"), {"code": code})
+        response = self.client.post(reverse("start_page:password_reset_confirm"), {
+            "password1": "secret2!", "password2": "secret2!",
+        })
+        self.assertEqual(response.json(), {"ok": True})
+
+    def test_send_code_looks_user_up_once(self):
+        CustomUser.objects.create_user(
+            email="tester@gmail.com", username="Tester", password="secret1!"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("start_page:password_reset_send_code"), {"email": "tester@gmail.com"})
+        user_queries = [q for q in queries if 'FROM "start_page_customuser"' in q["sql"]]
+        self.assertEqual(len(user_queries), 1)
+
+        # новый клиент — без паузы между попытками из сессии первого
+        response = Client().post(reverse("start_page:password_reset_send_code"), {"email": "nobody@gmail.com"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("не найден", response.json()["error"])
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.token = start_request()
+
+    def tearDown(self):
+        end_request(self.token)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(CustomUser), "replica_1")
+
+    def test_reads_after_write_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(CustomUser), "default")
+        self.assertEqual(self.router.db_for_read(CustomUser), "default")
+
+    def test_pinned_request_reads_from_primary(self):
+        end_request(self.token)
+        self.token = start_request(pinned=True)
+        self.assertEqual(self.router.db_for_read(CustomUser), "default")
+
+
+class StaticAssetsTests(SimpleTestCase):
+    """
+    collectstatic с BundledManifestStaticFilesStorage во временный STATIC_ROOT
+    и отдача собранного через serve_asset.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.static_root = Path(static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=static_root, STORAGES={
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "start_page.assets.BundledManifestStaticFilesStorage"},
+        }))
+        # статика админки для проверки не нужна, а сжимается долго
+        call_command("collectstatic", interactive=False, verbosity=0, ignore_patterns=["admin"])
+        cls.hashed = staticfiles_storage.load_manifest()[0]["bundles/profile.js"]
+
+    def _get(self, path, **headers):
+        response = serve_asset(RequestFactory().get(f"/static/{path}", headers=headers), path)
+        self.addCleanup(response.close)
+        return response
+
+    def test_bundle_is_minified_hashed_and_precompressed(self):
+        self.assertRegex(self.hashed, HASHED_NAME_RE)
+        content = (self.static_root / self.hashed).read_bytes()
+        self.assertNotIn(b"\n ", content)
+        self.assertEqual(gzip.decompress((self.static_root / f"{self.hashed}.gz").read_bytes()), content)
+
+    def test_serve_asset_picks_accepted_precompressed_variant(self):
+        response = self._get(self.hashed, accept_encoding="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(
+            b"".join(response.streaming_content), (self.static_root / f"{self.hashed}.gz").read_bytes()
+        )
+
+    def test_serve_asset_plain_and_unhashed(self):
+        response = self._get("bundles/profile.js")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Cache-Control"], DEFAULT_CACHE_CONTROL)
+
+    def test_serve_asset_outside_static_root_is_404(self):
+        for path in ("../secret.py", "missing.js"):
+            with self.subTest(path), self.assertRaises(Http404):
+                self._get(path)
+
+    def test_minify_js_keeps_literals(self):
+        source = (
+            "// комментарий\n"
+            "const text = `\n// строка шаблона\n    с отступом`;\n"
+            "const url = 'http://example.com'; // хвост\n"
+            "/* блок */ const re = /\\/\\/[/]/g, half = total / 2;\n"
+            "if (a) {\n    return b;\n}\n"
+        )
+        self.assertEqual(minify_js(source), (
+            "const text = `\n// строка шаблона\n    с отступом`;\n"
+            "const url = 'http://example.com';\n"
+            "const re = /\\/\\/[/]/g, half = total / 2;\n"
+            "if (a) {\nreturn b;\n}"
+        ))
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(WORKER_PROCESSES=4)
+    def test_locmem_with_several_workers_is_an_error(self):
+        errors = checks.check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ["start_page.E001"])
+
+    @override_settings(WORKER_PROCESSES=4, CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+    }})
+    def test_shared_backend_passes(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
+
+
+REPLICA = "replica_test"
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DATABASE_ROUTERS=["start_page.db_router.ReplicaRouter"])
+class ReplicaRoutingDatabaseTests(TransactionTestCase):
+    """
+    Реплика — зеркало тестовой default (как TEST MIRROR у реплик в settings):
+    данные те же, поэтому куда ушёл запрос, видно по запросам соединения.
+    TransactionTestCase — внутри транзакции TestCase роутер всегда читает из default.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # соединение с той же тестовой базой. Раннер о нём не знает (создавать
+        # нечего), а зеркало (MIRROR) TransactionTestCase не очищает отдельно
+        connections.settings[REPLICA] = {**connections.settings["default"], "TEST": {"MIRROR": "default"}}
+        cls.databases = {*cls.databases, REPLICA}
+        cls.addClassCleanup(cls._drop_replica)
+
+    @classmethod
+    def _drop_replica(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        self.token = start_request()
+
+    def tearDown(self):
+        end_request(self.token)
+
+    def _replica_queries(self, query):
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            query()
+        return len(queries)
+
+    def test_existence_check_is_served_by_replica(self):
+        self.assertEqual(self._replica_queries(CustomUser.objects.filter(email="replica@gmail.com").exists), 1)
+
+    def test_reads_after_write_stay_on_primary(self):
+        CustomUser.objects.create_user(email="replica@gmail.com", username="Replica", password="secret1!")
+        self.assertEqual(self._replica_queries(CustomUser.objects.filter(email="replica@gmail.com").exists), 0)
+
+    def test_reads_in_atomic_block_stay_on_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self._replica_queries(CustomUser.objects.filter(email="replica@gmail.com").exists), 0)
+
+    def test_replica_is_not_migrated(self):
+        self.assertFalse(ReplicaRouter().allow_migrate(REPLICA, "start_page"))
+        self.assertTrue(ReplicaRouter().allow_migrate("default", "start_page"))
+
+
+class ActiveSessionInvariantTests(TransactionTestCase):
+    """
+    Одна активная сессия на пользователя при параллельных запросах.
+    TransactionTestCase — потокам нужны закоммиченные данные.
+    С DJANGO_DB_REPLICAS потоки читают и с реплик (в тестах — зеркала default).
+    """
+    databases = "__all__"
+    THREADS = 8
+    CALLS_PER_THREAD = 5
+    LOCK_RETRIES = 50
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="race@gmail.com", username="Race", password="Test123!"
+        )
+
+    def tearDown(self):
+        # здесь коммиты настоящие — события журнала попали в буфер
+        event_log.flush()
+
+    def test_database_rejects_second_active_session(self):
+        create_or_update_user_session(self.client, self.user)
+        active = UserSession.objects.get(user=self.user, is_active=True)
+        active.pk = None
+        with self.assertRaises(IntegrityError):
+            active.save()
+
+    def test_conflicting_insert_extends_concurrent_session(self):
+        request = type("Request", (), {"session": SessionStore()})()
+        competitor = {}
+
+        def insert_competitor_after_select(execute, sql, params, many, context):
+            # "параллельный" запрос вставляет сессию между нашим SELECT и INSERT
+            result = execute(sql, params, many, context)
+            if not competitor and sql.startswith("SELECT") and "start_page_usersession" in sql:
+                now = timezone.now()
+                competitor["session"] = UserSession.objects.create(
+                    user=self.user,
+                    session_key_hash=session_key_hash("other-tab"),
+                    start_time=now,
+                    end_time=now + timedelta(hours=1),
+                )
+            return result
+
+        with connection.execute_wrapper(insert_competitor_after_select):
+            session = create_or_update_user_session(request, self.user)
+
+        self.assertEqual(session.pk, competitor["session"].pk)
+        self.assertEqual(session.session_key_hash, session_key_hash(request.session.session_key))
+        self.assertEqual(UserSession.objects.filter(user=self.user, is_active=True).count(), 1)
+
+    def test_concurrent_calls_keep_single_active_session(self):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker():
+            request = type("Request", (), {"session": SessionStore()})()
+            try:
+                barrier.wait()
+                for _ in range(self.CALLS_PER_THREAD):
+                    # общий кэш SQLite в тестах не ждёт блокировку — повторяем,
+                    # но не бесконечно: иначе зависшая блокировка повесит весь прогон
+                    for _ in range(self.LOCK_RETRIES):
+                        try:
+                            create_or_update_user_session(request, self.user)
+                            break
+                        except OperationalError:
+                            time.sleep(0.01)
+                    else:
+                        raise AssertionError(f"блокировка не освободилась за {self.LOCK_RETRIES} попыток")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(UserSession.objects.filter(user=self.user, is_active=True).count(), 1)
@@ -1,6 +1,11 @@
 from django.urls import path, include
 from . import views
-from .password_reset_views import *
+from .metrics_views import metrics, online_users, slow_queries
+from .password_reset_views import (
+    password_reset_confirm,
+    password_reset_send_code,
+    password_reset_verify_code,
+)
 
 app_name = 'start_page'
 
@@ -14,4 +19,8 @@ urlpatterns = [
     path('password-reset/send-code/', password_reset_send_code, name='password_reset_send_code'),
     path('password-reset/verify-code/', password_reset_verify_code, name='password_reset_verify_code'),
     path('password-reset/confirm/', password_reset_confirm, name='password_reset_confirm'),
+
+    path('metrics/', metrics, name='metrics'),
+    path('metrics/slow-queries/', slow_queries, name='slow_queries'),
+    path('metrics/online/', online_users, name='online_users'),
 ]
\ No newline at end of file
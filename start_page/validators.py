@@ -41,23 +41,37 @@ def validate_username(username):
     return username
 
 
-def validate_email(email, type):
+def validate_email_format(email):
     """
-    Проверка email при регистрации:
+    Проверка email без обращения к базе:
     - не пустой
     - корректный формат
     - домен из ALLOWED_EMAIL_DOMAINS (если задан)
-    - такого email ещё НЕТ в базе или ЕСТЬ в зависимости от действия
+    Для видов, которым пользователь всё равно нужен: его достают сами
+    одним запросом, при DoesNotExist — USER_NOT_FOUND_MESSAGE.
     """
     email_normalized = _normalize_email(email)
     _check_allowed_domain(email_normalized)
+    return email_normalized
+
+
+USER_NOT_FOUND_MESSAGE = "Пользователь с таким email не найден."
+
+
+def validate_email(email, type):
+    """
+    Проверка email при регистрации:
+    - validate_email_format
+    - такого email ещё НЕТ в базе или ЕСТЬ в зависимости от действия
+    """
+    email_normalized = validate_email_format(email)
 
     if CustomUser.objects.filter(email__iexact=email_normalized).exists():
         if type == 'signup':
             raise ValidationError("Пользователь с таким email уже зарегистрирован.")
     else:
         if type == 'login':
-            raise ValidationError("Пользователь с таким email не найден.")
+            raise ValidationError(USER_NOT_FOUND_MESSAGE)
 
     return email_normalized
 
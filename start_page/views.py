@@ -2,10 +2,12 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, update_session_auth_hash, login, logout
 from django.conf import settings
 
-from .forms import *
-from .services import *
+from .forms import LoginForm, RegisterForm
+from .query_budget import query_budget
+from .services import create_or_update_user_session, end_user_sessions
 
 
+@query_budget(4)
 def start_page(request):
     """
     Стартовая страница.
@@ -15,6 +17,7 @@ def start_page(request):
     return render(request, "start_page/start_page.html")
 
 
+@query_budget(10)
 def signup(request):
     """
     Страница регистрации.
@@ -41,6 +44,7 @@ def signup(request):
     )
 
 
+@query_budget(10)
 def login_auth(request):
     """
     Авторизация:
@@ -60,6 +64,8 @@ def login_auth(request):
     return render(request, "start_page/login.html", {"form": form})
 
 
+# сессия, пользователь, закрытие UserSession, счётчик активных сессий, удаление сессии
+@query_budget(5)
 def logout_auth(request):
     """
     Logout:
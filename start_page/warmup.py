@@ -0,0 +1,77 @@
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+logger = logging.getLogger("start_page.warmup")
+
+
+def _populate_resolver(resolver):
+    """
+    Разбор всех URL-шаблонов (в том числе вложенных namespace) —
+    то, что иначе делают первый resolve()/reverse() в первом запросе.
+    """
+    resolver.reverse_dict  # обращение заполняет resolver целиком
+    for _, sub_resolver in resolver.namespace_dict.values():
+        _populate_resolver(sub_resolver)
+
+
+def _compile_templates():
+    """
+    Компилируем шаблоны проекта (не библиотек): кэширующий загрузчик
+    оставит их в памяти, и первый рендер не будет разбирать файлы.
+    """
+    project_root = Path(settings.BASE_DIR).resolve()
+    compiled = 0
+    for engine in engines.all():
+        for template_dir in engine.template_dirs:
+            template_dir = Path(template_dir).resolve()
+            if not template_dir.is_relative_to(project_root):
+                continue
+            for path in template_dir.rglob("*.html"):
+                try:
+                    engine.get_template(path.relative_to(template_dir).as_posix())
+                except TemplateSyntaxError:
+                    logger.exception("Не удалось скомпилировать шаблон %s", path)
+                else:
+                    compiled += 1
+    return compiled
+
+
+def _connect_databases():
+    """
+    Открываем соединения (и выполняем init_command/PRAGMA) в текущем потоке.
+    Держатся они до первого запроса только при CONN_MAX_AGE > 0.
+    """
+    for conn in connections.all():
+        conn.ensure_connection()
+
+
+def warm_up():
+    """
+    Прогрев воркера до приёма трафика: URL-резолвер, шаблоны, манифест
+    статики, соединения с БД. Возвращает время каждого шага в секундах.
+    Вызывается из wsgi.py/asgi.py при WARMUP_ON_STARTUP.
+    """
+    steps = (
+        ("urls", lambda: _populate_resolver(get_resolver())),
+        ("templates", _compile_templates),
+        ("static_manifest", lambda: staticfiles_storage.location),
+        ("databases", _connect_databases),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+
+    logger.info(
+        "Прогрев завершён: %s",
+        ", ".join(f"{name} {seconds * 1000:.1f} мс" for name, seconds in timings.items()),
+    )
+    return timings